@@ -0,0 +1,235 @@
+"""API HTTP (ASGI) de inferencia, sin Streamlit.
+
+Reutiliza la carga del modelo/scaler de data_utils (vía resource_utils) y la persistencia
+de DatabaseManager. Las peticiones concurrentes se agrupan en una sola llamada a
+model.predict_proba (micro-batching); la respuesta incluye la probabilidad de Smoker
+(calibrada si el modelo trae calibration.json) además de la etiqueta.
+
+Uso (desde src/): uvicorn api:app --host 0.0.0.0 --port 8000
+
+Endpoints:
+    GET  /healthz        proceso vivo
+    GET  /readyz         200 solo cuando el modelo está cargado y calentado (503 con las etapas ya hechas)
+    GET  /schema         JSON schema de las 24 variables
+    GET  /metrics        métricas en formato texto de Prometheus
+    POST /predict        {"features": {...}}
+    POST /predict/batch  {"instances": [{...}, ...]}
+"""
+import asyncio
+import json
+import logging
+import os
+import pandas as pd
+from batch_scoring import score_chunk
+from calibration import Calibration
+from db_utils import prediction_rows
+from feature_schema import FEATURES_SCHEMA, NUM_VARIABLES, feature_order, validate_features, validate_instances
+from metrics_utils import inc, profile_request, registry, timer
+from startup import Startup, warm_up
+
+MAX_BATCH_INSTANCES = 10_000
+ROUTES = ('/healthz', '/readyz', '/schema', '/metrics', '/predict', '/predict/batch')
+
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0):
+        """Agrupa filas de peticiones concurrentes en una sola llamada a `predict_fn`."""
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._task = None
+        self.batches = 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, rows):
+        """Encola las filas de una petición y espera sus predicciones."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            size = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                size += len(item[0])
+            rows = [row for item_rows, _ in items for row in item_rows]
+            try:
+                results = await loop.run_in_executor(None, self.predict_fn, rows)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            offset = 0
+            for item_rows, future in items:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(item_rows)])
+                offset += len(item_rows)
+
+class InferenceAPI:
+    def __init__(self, load_resources, max_batch_size=64, max_wait_ms=5.0):
+        """`load_resources()` devuelve (model, scaler, db[, calibration]); db puede ser None para no persistir."""
+        self.load_resources = load_resources
+        self.model = None
+        self.scaler = None
+        self.db = None
+        self.columns = None
+        self.calibration = Calibration()
+        self.ready = False
+        self.startup_phase = Startup()
+        self.batcher = MicroBatcher(self._predict_rows, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    def _predict_rows(self, rows):
+        df = pd.DataFrame(rows, columns=NUM_VARIABLES)
+        scored = score_chunk(df, self.model, self.scaler, self.columns, self.calibration)
+        labels, probabilities = scored['prediction'].tolist(), scored['probability'].tolist()
+        if self.db is not None:
+            self.db.save_predictions_bulk(prediction_rows(df.to_numpy(), labels, probabilities))
+        inc('predictions', len(rows), source='api')
+        return list(zip(labels, probabilities))
+
+    def _warm_up(self):
+        with self.startup_phase.stage('resources'):
+            resources = self.load_resources()
+            self.model, self.scaler, self.db = resources[:3]
+            if len(resources) > 3:
+                self.calibration = resources[3]
+            self.columns = feature_order(self.scaler, self.model)
+        # Primera inferencia fuera de las peticiones de usuario
+        with self.startup_phase.stage('warm_up'):
+            self.startup_phase.warm_up_rows = warm_up(self.model, self.scaler, self.columns, self.calibration)
+
+    async def startup(self):
+        await asyncio.get_running_loop().run_in_executor(None, self._warm_up)
+        self.batcher.start()
+        self.startup_phase.mark_ready()
+        self.ready = True
+
+    async def shutdown(self):
+        self.ready = False
+        await self.batcher.stop()
+        if self.db is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.db.close)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            with profile_request('api'), timer('http_request', path=scope['path'] if scope['path'] in ROUTES else 'other'):
+                status, body = await self._handle(scope, receive)
+            if isinstance(body, str):
+                content_type, payload = b'text/plain; version=0.0.4', body.encode()
+            else:
+                content_type, payload = b'application/json', json.dumps(body).encode()
+            await send({'type': 'http.response.start', 'status': status,
+                        'headers': [(b'content-type', content_type)]})
+            await send({'type': 'http.response.body', 'body': payload})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logging.error(f"Inference API startup failed: {e}")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_json(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        return json.loads(body or b'null')
+
+    async def _handle(self, scope, receive):
+        method, path = scope['method'], scope['path']
+        if method == 'GET' and path == '/healthz':
+            return 200, {'status': 'ok'}
+        if method == 'GET' and path == '/readyz':
+            if self.ready:
+                return 200, {'status': 'ready'}
+            return 503, {'status': 'warming up', 'stages': dict(self.startup_phase.timings)}
+        if method == 'GET' and path == '/schema':
+            return 200, FEATURES_SCHEMA
+        if method == 'GET' and path == '/metrics':
+            return 200, registry.render_prometheus()
+        if method == 'POST' and path in ('/predict', '/predict/batch'):
+            if not self.ready:
+                return 503, {'error': 'model not ready'}
+            try:
+                payload = await self._read_json(receive)
+                if not isinstance(payload, dict):
+                    raise ValueError("body must be a JSON object")
+                if path == '/predict':
+                    rows = [validate_features(payload.get('features'))]
+                else:
+                    instances = payload.get('instances')
+                    if not isinstance(instances, list) or not instances:
+                        raise ValueError("instances must be a non-empty list")
+                    if len(instances) > MAX_BATCH_INSTANCES:
+                        raise ValueError(f"at most {MAX_BATCH_INSTANCES} instances per request")
+                    rows = validate_instances(instances).tolist()
+            except ValueError as e:
+                return 422, {'error': str(e)}
+            try:
+                results = await self.batcher.submit(rows)
+            except Exception as e:
+                logging.error(f"Prediction error: {e}")
+                return 500, {'error': f"Prediction Error: {e}"}
+            if path == '/predict':
+                return 200, {'prediction': results[0][0], 'probability': results[0][1],
+                             'threshold': self.calibration.threshold}
+            return 200, {'predictions': [label for label, _ in results],
+                         'probabilities': [probability for _, probability in results],
+                         'threshold': self.calibration.threshold}
+        return 404, {'error': 'not found'}
+
+def _load_default_resources():
+    from data_utils import get_base_path, get_file_paths
+    from resource_utils import ensure_assets, get_calibration, get_model_and_scaler, get_database
+    is_aws = 'AWS_REGION' in os.environ or 'AWS_LAMBDA_FUNCTION_NAME' in os.environ
+    is_lambda = 'AWS_LAMBDA_FUNCTION_NAME' in os.environ
+    base_path = os.environ.get('MODEL_BASE_PATH', get_base_path(is_aws, is_lambda))
+    paths = get_file_paths(base_path)
+    ensure_assets(base_path, is_aws, is_lambda)
+    model, scaler = get_model_and_scaler(paths['model'], paths['scaler'])
+    if model is None:
+        raise RuntimeError(f"Model could not be loaded from {base_path}")
+    return model, scaler, get_database(is_aws, is_lambda), get_calibration(paths['model'])
+
+app = InferenceAPI(_load_default_resources)
@@ -1,22 +1,42 @@
+import logging
 import os
 import streamlit as st
-from PIL import Image
-from data_utils import get_file_paths, ensure_files, load_model_and_scaler
-from db_utils import DatabaseManager
+import metrics_utils
+from dashboard import live_dashboard
+from data_utils import get_base_path, get_file_paths
 from prediction import prediction
+from resource_utils import (ensure_assets, get_calibration, get_explainer, get_image_assets, get_model_and_scaler,
+                            get_model_server, get_database, get_feature_order, get_prediction_cache, get_startup,
+                            get_stats)
+
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Environment Detection ---
 IS_AWS = 'AWS_REGION' in os.environ or 'AWS_LAMBDA_FUNCTION_NAME' in os.environ
 IS_LAMBDA = 'AWS_LAMBDA_FUNCTION_NAME' in os.environ
+SHOW_ADMIN_PANEL = os.environ.get('ADMIN_PANEL', '0') == '1'
+# Directorio o s3://bucket/prefijo de model_registry; sin definir se usa el modelo de BASE_PATH
+MODEL_REGISTRY = os.environ.get('MODEL_REGISTRY')
 
 # --- S3 and File Configuration ---
 BUCKET_NAME = 'smoking-body-signals-data-dev'
 REGION_NAME = 'eu-central-1'
-BASE_PATH = '/home/ubuntu/Body_Signals_of_Smoking---AWS-Terraform-testing/src' if IS_AWS and not IS_LAMBDA else '/tmp' if IS_AWS and IS_LAMBDA else '/workspaces/Body_Signals_of_Smoking---AWS-Terraform-testing/src'
+BASE_PATH = get_base_path(IS_AWS, IS_LAMBDA)
 paths = get_file_paths(BASE_PATH)
 
 # --- Sections ---
-def home():
+def show_image(images, key, caption, width=560):
+    """Muestra `paths[key]` con la rendition más pequeña que cubre `width` píxeles (image_assets)."""
+    try:
+        if st.get_option('server.enableStaticServing'):
+            st.markdown(images.picture_html(paths[key], width, caption), unsafe_allow_html=True)
+        else:
+            rendition = images.best(paths[key], width)
+            st.image(rendition.data, caption=caption, output_format=rendition.format)
+    except FileNotFoundError:
+        st.error(f"Image '{os.path.basename(paths[key])}' not found.")
+
+def home(images):
     st.markdown("<div class='header'><h1><i class='fas fa-lungs'></i> Body Signals of Smoking</h1><p class='slogan animate__animated animate__fadeIn'>Empowering Health Awareness</p></div>", unsafe_allow_html=True)
     st.markdown("""
         <style>
@@ -35,36 +55,22 @@ def home():
     """, unsafe_allow_html=True)
     col1, col2 = st.columns([2, 1])
     with col1:
-        try:
-            st.image(Image.open(paths['body_image']), caption="Body Health Overview")
-        except FileNotFoundError:
-            st.error("Image 'body.jpg' not found.")
+        show_image(images, 'body_image', "Body Health Overview", width=800)
 
-def data():
+def data(db, images):
     st.header("Relevant Data Insights")
+    live_dashboard(db)
     st.subheader("Did You Know?")
     cols = st.columns(2)
     with cols[0]:
-        try:
-            st.image(Image.open(paths['gender_smoke']), caption="Men Smoke More")
-        except FileNotFoundError:
-            st.error("Image 'Gender_smoking.png' not found.")
+        show_image(images, 'gender_smoke', "Men Smoke More")
     with cols[1]:
-        try:
-            st.image(Image.open(paths['hemo']), caption="Higher Hemoglobin")
-        except FileNotFoundError:
-            st.error("Image 'hemoglobine_gender.png' not found.")
+        show_image(images, 'hemo', "Higher Hemoglobin")
     cols = st.columns(2)
     with cols[0]:
-        try:
-            st.image(Image.open(paths['gtp']), caption="Elevated GTP")
-        except FileNotFoundError:
-            st.error("Image 'GTP.png' not found.")
+        show_image(images, 'gtp', "Elevated GTP")
     with cols[1]:
-        try:
-            st.image(Image.open(paths['trigly']), caption="Triglycerides")
-        except FileNotFoundError:
-            st.error("Image 'Triglyceride.png' not found.")
+        show_image(images, 'trigly', "Triglycerides")
             
 def limitations_future_improvement():
     st.header("Research Insights")
@@ -87,6 +93,25 @@ def limitations_future_improvement():
             <div style='background: #FFE0B2; padding: 15px; border-radius: 10px; text-align: center; margin-top: 20px;'><p style='color: #EF6C00; font-weight: bold;'><i class='fas fa-shield-alt'></i> For research use only.</p></div>
         """, unsafe_allow_html=True)
 
+def admin_panel(db, model_paths, server=None, startup=None):
+    """Panel de administración en la barra lateral: latencias, contadores, cachés y modelo servido."""
+    with st.sidebar.expander("Admin: metrics"):
+        if not metrics_utils.registry.enabled:
+            st.write("Metrics are disabled (METRICS_ENABLED=0).")
+            return
+        snapshot = metrics_utils.registry.snapshot()
+        st.write(f"Uptime: {snapshot['uptime_seconds']:.0f} s")
+        for name, value in sorted(snapshot['counters'].items()):
+            st.write(f"{name}: {value:,.0f} ({snapshot['rates'][name]:.2f}/s)")
+        if snapshot['timings']:
+            st.dataframe([{'operation': name, **timing} for name, timing in sorted(snapshot['timings'].items())],
+                         hide_index=True)
+        st.json({'resources': get_stats(), 'prediction_cache': get_prediction_cache(*model_paths).stats(),
+                 'images': get_image_assets(BASE_PATH).stats(),
+                 's3_sync': db.sync_stats(), 'model_registry': server.stats() if server else None,
+                 'startup': startup.report() if startup else None}, expanded=False)
+        st.download_button("Prometheus metrics", metrics_utils.registry.render_prometheus(), file_name="metrics.txt")
+
 # --- Main Function ---
 def main():
     st.set_page_config(page_title="Body Signals of Smoking", layout="wide", initial_sidebar_state="expanded")
@@ -117,24 +142,47 @@ def main():
     st.sidebar.title("Menu")
     selection = st.sidebar.radio("Navigation", ["Home", "Relevant Data", "Prediction", "Limitations"], label_visibility="collapsed")
 
-    ensure_files(BASE_PATH, IS_AWS, IS_LAMBDA)
+    # Arranque (startup.py): ya hecho si se lanzó con `python startup.py`; si no, lo paga el primer rerun
     try:
-        db = DatabaseManager(IS_AWS, IS_LAMBDA)
-        model, scaler = load_model_and_scaler(paths['model'], paths['scaler'])
+        with st.spinner("Starting up..."):
+            startup = get_startup(BASE_PATH, IS_AWS, IS_LAMBDA, MODEL_REGISTRY)
     except Exception as e:
         st.error(f"Initialization error: {e}")
         st.stop()
 
+    # Recursos compartidos entre sesiones: solo se cargan en el primer rerun del proceso
+    ensure_assets(BASE_PATH, IS_AWS, IS_LAMBDA)
+    images = get_image_assets(BASE_PATH)
+    try:
+        db = get_database(IS_AWS, IS_LAMBDA)
+        server, shadow = None, None
+        if MODEL_REGISTRY:
+            # Se toma el handle una vez por rerun: modelo y scaler siempre de la misma versión
+            server = get_model_server(MODEL_REGISTRY)
+            handle, shadow = server.current, server.shadow
+            model, scaler, model_paths, columns = handle.model, handle.scaler, handle.paths, handle.columns
+            calibration = handle.calibration
+        else:
+            model, scaler = get_model_and_scaler(paths['model'], paths['scaler'])
+            model_paths = (paths['model'], paths['scaler'])
+            columns = get_feature_order(*model_paths)
+            calibration = get_calibration(paths['model'])
+    except Exception as e:
+        st.error(f"Initialization error: {e}")
+        st.stop()
+
+    if SHOW_ADMIN_PANEL:
+        admin_panel(db, model_paths, server, startup)
+
     if selection == "Home":
-        home()
+        home(images)
     elif selection == "Relevant Data":
-        data()
+        data(db, images)
     elif selection == "Prediction":
-        prediction(db, model, scaler, IS_AWS)
+        prediction(db, model, scaler, IS_AWS, cache=get_prediction_cache(*model_paths), shadow=shadow,
+                   columns=columns, calibration=calibration, explainer=get_explainer(*model_paths, model, scaler))
     elif selection == "Limitations":
         limitations_future_improvement()
 
-    db.close()
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""Scoring por lotes de ficheros CSV/Parquet con el mismo esquema de 24 columnas que NUM_VARIABLES.
+
+El fichero se lee por bloques, cada bloque se valida (feature_schema), se escala y se predice de forma vectorizada
+(opcionalmente en varios procesos) y los resultados se escriben en bloque al fichero de
+salida y a la tabla predictions, de modo que la memoria no depende del tamaño de la entrada.
+La etiqueta sale de la probabilidad (calibrada si hay calibration.json junto al modelo) y del
+umbral de decisión; ambas se escriben en la salida. Con --explain se añade además una
+columna 'contribution_<variable>' por variable (forest_engine.CompiledForest.contributions),
+calculada bloque a bloque.
+
+Uso (desde src/):
+    python batch_scoring.py pacientes.csv resultados.parquet --n-jobs 4 --db predictions.db
+    python batch_scoring.py pacientes.csv explicados.parquet --explain
+"""
+import argparse
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from calibration import Calibration
+from feature_schema import NUM_VARIABLES, encode_features, feature_order
+from forest_engine import explain
+from metrics_utils import inc, timer
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+_worker_model = None
+_worker_scaler = None
+_worker_columns = None
+_worker_calibration = None
+_worker_explainer = None
+
+def _is_parquet(path):
+    return path.lower().endswith(PARQUET_EXTENSIONS)
+
+def iter_chunks(path, chunksize):
+    """Itera el fichero de entrada en DataFrames de como mucho `chunksize` filas."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+def scaler_input(X, columns, scaler):
+    """Matriz ya ordenada como espera el scaler; con nombres solo si se entrenó con ellos."""
+    if getattr(scaler, 'feature_names_in_', None) is not None and not callable(scaler.feature_names_in_):
+        return pd.DataFrame(X, columns=columns)
+    return X
+
+def score_chunk(df, model, scaler, columns=None, calibration=None, explainer=None):
+    """Añade las columnas 'prediction' y 'probability' a un bloque con una sola llamada a transform/predict_proba.
+
+    Las filas que no pasan la validación de feature_schema no se puntúan: quedan con
+    'prediction' vacía, 'probability' NaN y la lista de variables inválidas en la columna
+    'errors' ('' si es válida). Con `explainer` (CompiledForest) se añaden las columnas
+    'contribution_<variable>' (NaN en las filas inválidas).
+    """
+    columns = columns or feature_order(scaler, model)
+    calibration = calibration or Calibration()
+    X, errors = encode_features(df, columns)
+    invalid = errors.any(axis=1)
+    labels = np.full(len(df), None, dtype=object)
+    probabilities = np.full(len(df), np.nan)
+    valid_X = X[~invalid] if invalid.any() else X
+    if len(valid_X):
+        with timer('scaler_transform'):
+            scaled = scaler.transform(scaler_input(valid_X, columns, scaler))
+        with timer('model_predict'):
+            labels[~invalid], probabilities[~invalid] = calibration.predict(model, scaled)
+    if explainer is not None:
+        contributions = np.full((len(df), len(columns)), np.nan)
+        if len(valid_X):
+            with timer('explain'):
+                contributions[~invalid] = explain(explainer, valid_X, columns)[0]
+    messages = np.full(len(df), '', dtype=object)
+    if invalid.any():
+        names = np.asarray(columns)
+        messages[invalid] = [', '.join(names[row]) for row in errors[invalid]]
+        inc('invalid_rows', int(invalid.sum()))
+    df = df.copy()
+    # Tipo string fijo: el esquema del Parquet no depende de si el primer bloque trae errores
+    df['prediction'] = pd.array(labels, dtype='string')
+    df['probability'] = probabilities
+    df['errors'] = pd.array(messages, dtype='string')
+    if explainer is not None:
+        df = pd.concat([df, pd.DataFrame(contributions, columns=[f'contribution_{name}' for name in columns],
+                                         index=df.index)], axis=1)
+    return df
+
+def _init_worker(model, scaler, columns, calibration=None, explainer=None):
+    global _worker_model, _worker_scaler, _worker_columns, _worker_calibration, _worker_explainer
+    _worker_model, _worker_scaler, _worker_columns, _worker_calibration = model, scaler, columns, calibration
+    _worker_explainer = explainer
+    # Cada proceso ya ocupa un núcleo; el bosque no debe lanzar sus propios hilos
+    if hasattr(_worker_model, 'n_jobs'):
+        _worker_model.n_jobs = 1
+
+def _score_in_worker(df):
+    return score_chunk(df, _worker_model, _worker_scaler, _worker_columns, _worker_calibration, _worker_explainer)
+
+class ResultWriter:
+    def __init__(self, path):
+        """Escribe bloques de resultados a CSV o Parquet sin mantenerlos en memoria."""
+        self.path = path
+        self._parquet_writer = None
+        self._header_written = False
+
+    def write(self, df):
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(self.path, mode='a' if self._header_written else 'w', header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+def _db_rows(df):
+    """Filas válidas de un bloque puntuado como tuplas de INSERT_ROW_SQL (variables ya codificadas)."""
+    from db_utils import prediction_rows
+    df = df[df['errors'] == '']
+    X, _ = encode_features(df, NUM_VARIABLES)
+    return prediction_rows(X, df['prediction'].tolist(), df['probability'].to_numpy())
+
+def score_file(input_path, output_path, model, scaler, db=None, chunksize=50_000, n_jobs=1, progress=None,
+               calibration=None, explainer=None):
+    """Puntúa `input_path` y escribe los resultados en `output_path` (y en `db` si se indica).
+
+    Con `n_jobs` > 1 los bloques se reparten entre procesos; como mucho hay 2 * n_jobs
+    bloques en vuelo, así que la memoria queda acotada. Devuelve filas, segundos y filas/s.
+    Con `explainer` la salida incluye las contribuciones por variable (ver score_chunk).
+    """
+    start = time.perf_counter()
+    rows = 0
+    invalid = 0
+    columns = feature_order(scaler, model)
+    writer = ResultWriter(output_path)
+
+    def handle(scored):
+        nonlocal rows, invalid
+        writer.write(scored)
+        chunk_invalid = int((scored['errors'] != '').sum())
+        invalid += chunk_invalid
+        if db is not None:
+            db.save_predictions_bulk(_db_rows(scored))
+        rows += len(scored)
+        inc('predictions', len(scored) - chunk_invalid, source='batch')
+        if progress is not None:
+            progress(rows)
+
+    try:
+        if n_jobs == 1:
+            for chunk in iter_chunks(input_path, chunksize):
+                handle(score_chunk(chunk, model, scaler, columns, calibration, explainer))
+        else:
+            workers = n_jobs if n_jobs > 0 else os.cpu_count()
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model, scaler, columns, calibration, explainer)) as pool:
+                in_flight = deque()
+                for chunk in iter_chunks(input_path, chunksize):
+                    in_flight.append(pool.submit(_score_in_worker, chunk))
+                    if len(in_flight) >= 2 * workers:
+                        handle(in_flight.popleft().result())
+                while in_flight:
+                    handle(in_flight.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    stats = {'rows': rows, 'invalid_rows': invalid, 'seconds': elapsed,
+             'rows_per_sec': rows / elapsed if elapsed > 0 else 0.0}
+    logging.info(f"Scored {rows} rows ({invalid} invalid) in {elapsed:.2f}s ({stats['rows_per_sec']:.0f} rows/s)")
+    return stats
+
+def main():
+    from calibration import load_calibration
+    from data_utils import get_file_paths, load_model_and_scaler
+    from db_utils import DatabaseManager
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='fichero CSV o Parquet de entrada')
+    parser.add_argument('output', help='fichero CSV o Parquet de salida')
+    parser.add_argument('--base-path', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='directorio con random_forest_model_Default.pkl, scaler.pkl y calibration.json (opcional)')
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--n-jobs', type=int, default=1, help='procesos de scoring (-1 = todos los núcleos)')
+    parser.add_argument('--db', help='ruta de predictions.db donde guardar los resultados')
+    parser.add_argument('--threshold', type=float, help='umbral de decisión (por defecto DECISION_THRESHOLD o el de la calibración)')
+    parser.add_argument('--compiled', action='store_true', default=os.environ.get('COMPILED_FOREST', '0') == '1',
+                        help='bosque compilado mapeado en memoria, compartido por todos los workers')
+    parser.add_argument('--explain', action='store_true', help="añade las columnas 'contribution_<variable>'")
+    args = parser.parse_args()
+
+    paths = get_file_paths(args.base_path)
+    if args.compiled:
+        from forest_engine import load_compiled
+        model, scaler = load_compiled(paths['model'], paths['scaler'])
+    else:
+        model, scaler = load_model_and_scaler(paths['model'], paths['scaler'])
+    explainer = None
+    if args.explain:
+        from forest_engine import CompiledForest, load_compiled
+        # Los workers reciben el bosque mapeado como su ruta (CompiledForest.__reduce__)
+        explainer = model if isinstance(model, CompiledForest) else load_compiled(paths['model'], paths['scaler'])[0]
+    db = DatabaseManager(False, False, local_db_path=args.db) if args.db else None
+    try:
+        stats = score_file(args.input, args.output, model, scaler, db=db, chunksize=args.chunksize, n_jobs=args.n_jobs,
+                           calibration=load_calibration(paths['model'], args.threshold), explainer=explainer)
+    finally:
+        if db is not None:
+            db.close()
+    print(f"Scored {stats['rows']} rows ({stats['invalid_rows']} invalid) in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_sec']:.0f} rows/s)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark de escritura en predictions.db con 1, 8 y 32 escritores concurrentes.
+
+Compara el esquema anterior (una conexión y un commit por fila, journal por defecto)
+con el pool WAL de DatabaseManager, fila a fila y con save_predictions_bulk().
+
+Uso (desde src/): python -m benchmarks.bench_db_writes --rows 2000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from db_utils import DatabaseManager, CREATE_TABLE_SQL, INSERT_SQL
+
+ROW = ('M', 15.0, 'Smoker')
+
+def legacy_insert(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    c = conn.cursor()
+    c.execute(INSERT_SQL, ROW)
+    conn.commit()
+    conn.close()
+
+def run_writers(n_writers, rows_per_writer, write_fn):
+    def worker():
+        for _ in range(rows_per_writer):
+            write_fn()
+    threads = [threading.Thread(target=worker) for _ in range(n_writers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return n_writers * rows_per_writer / elapsed
+
+def bench(n_writers, total_rows, batch_size, workdir):
+    rows_per_writer = max(1, total_rows // n_writers)
+    results = {}
+
+    legacy_path = os.path.join(workdir, f'legacy_{n_writers}.db')
+    conn = sqlite3.connect(legacy_path)
+    conn.execute(CREATE_TABLE_SQL)
+    conn.close()
+    results['legacy'] = run_writers(n_writers, rows_per_writer, lambda: legacy_insert(legacy_path))
+
+    db = DatabaseManager(False, False, local_db_path=os.path.join(workdir, f'pooled_{n_writers}.db'))
+    results['pooled'] = run_writers(n_writers, rows_per_writer, lambda: db.save_prediction(*ROW, False))
+    db.close()
+
+    db = DatabaseManager(False, False, local_db_path=os.path.join(workdir, f'bulk_{n_writers}.db'))
+    batches = max(1, rows_per_writer // batch_size)
+    rate = run_writers(n_writers, batches, lambda: db.save_predictions_bulk([ROW] * batch_size))
+    results['bulk'] = rate * batch_size
+    db.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000, help='filas totales por escenario')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    print(f"{'writers':>8} {'legacy/s':>12} {'pooled/s':>12} {'bulk/s':>12}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_writers in args.writers:
+            r = bench(n_writers, args.rows, args.batch_size, workdir)
+            print(f"{n_writers:>8} {r['legacy']:>12.0f} {r['pooled']:>12.0f} {r['bulk']:>12.0f}")
+
+if __name__ == '__main__':
+    main()
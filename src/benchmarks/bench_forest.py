@@ -0,0 +1,77 @@
+"""Latencia de inferencia: sklearn (scaler.transform + model.predict) frente a forest_engine.
+
+Con --base-path usa random_forest_model_Default.pkl y scaler.pkl reales; si no, entrena
+un bosque de 100 árboles sobre datos sintéticos con el mismo esquema.
+
+Uso (desde src/): python -m benchmarks.bench_forest --base-path . --rows 10000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from forest_engine import compile_model
+from feature_schema import FEATURE_SPECS, NUM_VARIABLES
+
+def synthetic_patients(n, seed=0):
+    """Pacientes sintéticos que pasan la validación de feature_schema."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(100.0, 30.0, size=(n, len(NUM_VARIABLES))), columns=NUM_VARIABLES)
+    df['hemoglobin'] = rng.uniform(7.4, 18.7, n)
+    for name, spec in FEATURE_SPECS.items():
+        if spec['dtype'] == 'category':
+            df[name] = rng.choice(sorted(set(spec['encoding'].values())), n)
+        else:
+            df[name] = df[name].clip(spec['min'], spec['max'])
+            if spec['dtype'] == 'int':
+                df[name] = df[name].round()
+    return df
+
+def synthetic_model(n_estimators=100, n_samples=5000):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    X = synthetic_patients(n_samples)
+    y = ((X['hemoglobin'] > 14) | (X['Gtp'] > 120)).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=n_estimators, random_state=42).fit(scaler.transform(X), y)
+    return model, scaler
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def bench(model, scaler, rows, repeat=20):
+    compiled, identity = compile_model(model, scaler)
+    single = synthetic_patients(1, seed=1)
+    batch = synthetic_patients(rows, seed=2)
+    assert np.array_equal(compiled.predict(identity.transform(batch)), model.predict(scaler.transform(batch)))
+    return {
+        'sklearn_single_ms': best_of(lambda: model.predict(scaler.transform(single)), repeat) * 1000,
+        'compiled_single_ms': best_of(lambda: compiled.predict(identity.transform(single)), repeat) * 1000,
+        'sklearn_batch_ms': best_of(lambda: model.predict(scaler.transform(batch)), max(1, repeat // 5)) * 1000,
+        'compiled_batch_ms': best_of(lambda: compiled.predict(identity.transform(batch)), max(1, repeat // 5)) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-path', help='directorio con el modelo y el scaler reales')
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.base_path:
+        from data_utils import get_file_paths, load_model_and_scaler
+        paths = get_file_paths(args.base_path)
+        model, scaler = load_model_and_scaler(paths['model'], paths['scaler'])
+    else:
+        model, scaler = synthetic_model()
+    r = bench(model, scaler, args.rows, args.repeat)
+    print(f"{'':>10} {'sklearn':>12} {'compiled':>12}")
+    print(f"{'1 row':>10} {r['sklearn_single_ms']:>10.2f}ms {r['compiled_single_ms']:>10.2f}ms")
+    print(f"{args.rows:>6} rows {r['sklearn_batch_ms']:>10.2f}ms {r['compiled_batch_ms']:>10.2f}ms")
+
+if __name__ == '__main__':
+    main()
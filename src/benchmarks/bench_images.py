@@ -0,0 +1,78 @@
+"""Benchmark de imágenes por vista de las páginas Home y Relevant Data: bytes enviados y tiempo de render.
+
+Reproduce lo que hace st.image en cada rerun (streamlit.elements.image) sin servidor:
+- before: PIL.Image.open del original, que Streamlit vuelve a codificar (JPEG a calidad 100).
+- st.image: la rendition PNG/JPEG de image_assets, que Streamlit envía sin tocar.
+- static: el <picture> de image_assets; el navegador descarga la rendition WebP del ancho
+  mostrado una sola vez (URL con hash de contenido) y solo la pide en la primera vista.
+
+Uso (desde src/): python -m benchmarks.bench_images --views 20
+"""
+import argparse
+import tempfile
+import time
+from PIL import Image
+from streamlit.elements.image import _PIL_to_bytes, _ensure_image_size_and_format, _validate_image_format_string
+from data_utils import get_file_paths
+from image_assets import ImageAssets
+
+# Imagen y ancho mostrado (app.show_image) de cada página
+PAGES = {
+    'home': (('body_image', 800),),
+    'data': (('gender_smoke', 560), ('hemo', 560), ('gtp', 560), ('trigly', 560)),
+}
+
+def _streamlit_bytes(image, output_format='auto'):
+    """Bytes que st.image envía al navegador (image_to_url sin MediaFileManager)."""
+    if isinstance(image, bytes):
+        image_format = _validate_image_format_string(image, output_format)
+        return _ensure_image_size_and_format(image, -1, image_format)
+    image_format = _validate_image_format_string(image, output_format)
+    data = _PIL_to_bytes(image, image_format)
+    return _ensure_image_size_and_format(data, -1, image_format)
+
+def view(strategy, images, paths, page):
+    sent = 0
+    for key, width in PAGES[page]:
+        if strategy == 'before':
+            sent += len(_streamlit_bytes(Image.open(paths[key])))
+        elif strategy == 'st.image':
+            rendition = images.best(paths[key], width)
+            sent += len(_streamlit_bytes(rendition.data, rendition.format))
+        else:
+            images.picture_html(paths[key], width)
+            sent += len(images.best(paths[key], width, formats=('WEBP',)).data)
+    return sent
+
+def bench(views, base_path='.'):
+    paths = get_file_paths(base_path)
+    results = {}
+    with tempfile.TemporaryDirectory() as static_dir:
+        images = ImageAssets(static_dir=static_dir)
+        start = time.perf_counter()
+        images.warm(paths[key] for page in PAGES.values() for key, _ in page)
+        results['warm_seconds'] = time.perf_counter() - start
+        for page in PAGES:
+            for strategy in ('before', 'st.image', 'static'):
+                start = time.perf_counter()
+                sent = [view(strategy, images, paths, page) for _ in range(views)]
+                elapsed = (time.perf_counter() - start) / views
+                # Con URLs estáticas inmutables solo la primera vista descarga las imágenes
+                total = sent[0] if strategy == 'static' else sum(sent)
+                results[(page, strategy)] = (sent[0], total / views, elapsed * 1000)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--views', type=int, default=20)
+    parser.add_argument('--base-path', default='.', help='directorio con body.jpg y los PNG')
+    args = parser.parse_args()
+
+    r = bench(args.views, args.base_path)
+    print(f"renditions built in {r.pop('warm_seconds'):.2f}s (once per process)")
+    print(f"{'page':>6} {'strategy':>10} {'KiB first view':>15} {'KiB/view':>10} {'ms/view':>9}")
+    for (page, strategy), (first, per_view, ms) in r.items():
+        print(f"{page:>6} {strategy:>10} {first / 1024:>15.1f} {per_view / 1024:>10.1f} {ms:>9.2f}")
+
+if __name__ == '__main__':
+    main()
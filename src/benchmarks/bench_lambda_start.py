@@ -0,0 +1,79 @@
+"""Arranque en frío frente a invocaciones "warm" de lambda_handler, medido en local.
+
+Cada ejecución lanza un proceso Python nuevo (equivalente a un contenedor Lambda nuevo):
+mide el import del handler, la primera invocación (que carga modelo/scaler/DB) y
+después --warm invocaciones en el mismo proceso. Con --importtime muestra además los
+módulos más lentos de importar según `python -X importtime`.
+
+Uso (desde src/):
+    MODEL_BASE_PATH=/ruta/al/modelo python -m benchmarks.bench_lambda_start --runs 3 --importtime
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import numpy as np
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import json, time
+t0 = time.perf_counter()
+import lambda_handler
+t1 = time.perf_counter()
+event = {"features": %(features)s}
+lambda_handler.handler(event)
+t2 = time.perf_counter()
+warm = []
+for _ in range(%(warm)d):
+    s = time.perf_counter()
+    lambda_handler.handler(event)
+    warm.append(time.perf_counter() - s)
+print(json.dumps({"import": t1 - t0, "first_invoke": t2 - t1,
+                  "init": lambda_handler._state["init_seconds"], "warm": warm}))
+'''
+
+def run_child(code, extra_args=()):
+    env = dict(os.environ)
+    env.setdefault('SAVE_PREDICTIONS', '0')
+    return subprocess.run([sys.executable, *extra_args, '-c', code], cwd=SRC_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+def import_profile(code, top=20):
+    """Top de módulos por tiempo acumulado de import (microsegundos) y total."""
+    result = run_child(code, ('-X', 'importtime'))
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)', line)
+        # Solo módulos de primer nivel (sin sangría) para no contar dos veces
+        if match and not match.group(3):
+            rows.append((int(match.group(2)), match.group(4)))
+    rows.sort(reverse=True)
+    return rows[:top], sum(us for us, _ in rows)
+
+def main():
+    from benchmarks.load_test_api import DEFAULT_FEATURES
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='procesos nuevos (arranques en frío)')
+    parser.add_argument('--warm', type=int, default=50, help='invocaciones warm por proceso')
+    parser.add_argument('--importtime', action='store_true')
+    args = parser.parse_args()
+
+    code = CHILD % {'features': json.dumps(DEFAULT_FEATURES), 'warm': args.warm}
+    if args.importtime:
+        top, total = import_profile(code)
+        print(f"Top-level imports ({total / 1000:.0f} ms total):")
+        for us, name in top:
+            print(f"  {us / 1000:>8.1f} ms  {name}")
+
+    print(f"{'run':>4} {'import':>10} {'1st call':>10} {'init':>10} {'warm p50':>10} {'warm p99':>10}")
+    for run in range(args.runs):
+        r = json.loads(run_child(code).stdout.strip().splitlines()[-1])
+        warm_ms = np.array(r['warm']) * 1000
+        print(f"{run:>4} {r['import'] * 1000:>8.1f}ms {r['first_invoke'] * 1000:>8.1f}ms {r['init'] * 1000:>8.1f}ms "
+              f"{np.percentile(warm_ms, 50):>8.2f}ms {np.percentile(warm_ms, 99):>8.2f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Memoria por worker con N procesos sirviendo el mismo modelo: pickle frente a mmap.
+
+Cada worker carga el modelo (joblib, o el bosque compilado de forest_engine abierto con
+mmap_mode='r'), puntúa una fila, recorre todos los nodos para que sus páginas estén
+residentes y se queda vivo hasta que el resto termina, de modo que el PSS reparte las
+páginas compartidas entre todos.
+Se informa RSS (lo que ve `ps`/`top`) y PSS/privada de /proc/<pid>/smaps_rollup, que es
+lo que de verdad cuesta cada réplica; 'baseline' es un worker que solo importa (sklearn incluido).
+
+Uso (desde src/):
+    python -m benchmarks.bench_memory --workers 4
+    python -m benchmarks.bench_memory --base-path . --workers 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+MODES = ('baseline', 'pickle', 'mmap')
+SMAPS_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Private_Clean', 'Private_Dirty')
+
+def memory_mb(pid='self'):
+    """Campos de smaps_rollup en MiB (Linux >= 4.14)."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if key in SMAPS_FIELDS:
+                values[key.lower()] = int(rest.split()[0]) / 1024
+    return values
+
+def worker(mode, base_path):
+    import numpy as np
+    import sklearn.ensemble  # noqa: F401  Mismas importaciones en todos los modos: la diferencia es el modelo
+    from benchmarks.bench_forest import synthetic_patients
+    from data_utils import get_file_paths, load_model_and_scaler
+    from forest_engine import ARRAYS, load_compiled
+    paths = get_file_paths(base_path)
+    row = synthetic_patients(1, seed=3)
+    if mode == 'pickle':
+        model, scaler = load_model_and_scaler(paths['model'], paths['scaler'])
+        model.predict(scaler.transform(row))
+    elif mode == 'mmap':
+        model, scaler = load_compiled(paths['model'], paths['scaler'])
+        model.predict(scaler.transform(row))
+        # Recorre todos los nodos, como haría el tráfico real tras un rato
+        for name in ARRAYS:
+            np.asarray(getattr(model, name)).sum()
+    print(json.dumps(memory_mb()), flush=True)
+    sys.stdin.read()  # Vivo hasta que el padre haya medido a todos los workers
+
+def measure(mode, base_path, workers):
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    procs = [subprocess.Popen([sys.executable, '-m', 'benchmarks.bench_memory', '--worker', mode, '--base-path', base_path],
+                              cwd=src, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    try:
+        for p in procs:
+            p.stdout.readline()  # Cargado
+        # Se mide con todos vivos para que el PSS reparta las páginas compartidas
+        samples = [memory_mb(p.pid) for p in procs]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+    totals = {key: sum(s[key] for s in samples) for key in samples[0]}
+    return {'per_worker': {key: value / workers for key, value in totals.items()}, 'total': totals}
+
+def prepare(base_path, trees, samples):
+    """Directorio con modelo y scaler: el de --base-path o uno sintético de `trees` árboles."""
+    if base_path:
+        return base_path
+    import joblib
+    from benchmarks.bench_forest import synthetic_model
+    workdir = tempfile.mkdtemp(prefix='bench-memory-')
+    model, scaler = synthetic_model(n_estimators=trees, n_samples=samples)
+    joblib.dump(model, os.path.join(workdir, 'random_forest_model_Default.pkl'))
+    joblib.dump(scaler, os.path.join(workdir, 'scaler.pkl'))
+    return workdir
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-path', help='directorio con el modelo y el scaler reales')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--trees', type=int, default=100, help='árboles del modelo sintético')
+    parser.add_argument('--samples', type=int, default=40_000, help='filas de entrenamiento del modelo sintético')
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.base_path)
+        return
+    base_path = prepare(args.base_path, args.trees, args.samples)
+    # El primer load_compiled escribe <modelo>.forest/; los workers solo lo mapean
+    from forest_engine import compiled_path, load_compiled
+    from data_utils import get_file_paths
+    paths = get_file_paths(base_path)
+    load_compiled(paths['model'], paths['scaler'])
+    compiled_dir = compiled_path(paths['model'])
+    compiled_mb = sum(os.path.getsize(os.path.join(compiled_dir, f)) for f in os.listdir(compiled_dir)) / 2**20
+    print(f"Model: {os.path.getsize(paths['model']) / 2**20:.1f} MiB pickle, {compiled_mb:.1f} MiB compiled forest")
+
+    print(f"{'mode':>8} {'RSS/worker':>11} {'PSS/worker':>11} {'private':>9} {'PSS total':>10}  (MiB, {args.workers} workers)")
+    for mode in MODES:
+        r = measure(mode, base_path, args.workers)
+        w = r['per_worker']
+        print(f"{mode:>8} {w['rss']:>11.1f} {w['pss']:>11.1f} {w['private_clean'] + w['private_dirty']:>9.1f} "
+              f"{r['total']['pss']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
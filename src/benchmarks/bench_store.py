@@ -0,0 +1,89 @@
+"""Benchmark de archivado en S3 y consultas por rango: predictions.db frente a segment_store.
+
+Simula `--days` días de `--rows-per-day` predicciones con todas las columnas tipadas y una
+sincronización con S3 al final de cada día. Compara los bytes subidos en cada sincronización
+(copia completa de predictions.db frente a solo los segmentos nuevos) y la latencia de
+leer el último día (get_predictions(start=...)) con cada almacenamiento.
+
+Uso (desde src/): python -m benchmarks.bench_store --days 30 --rows-per-day 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from db_utils import DatabaseManager, prediction_rows
+from feature_schema import NUM_VARIABLES
+from segment_store import SegmentStore
+from tests.conftest import FakeS3Client, make_patients
+
+START = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+
+def _rows(n, seed):
+    X = make_patients(n, seed=seed)[NUM_VARIABLES].to_numpy(dtype=float)
+    probabilities = np.random.default_rng(seed).random(n)
+    labels = np.where(probabilities > 0.5, 'Smoker', 'Non-Smoker').tolist()
+    return prediction_rows(X, labels, probabilities.tolist())
+
+def _query_ms(store, start, repeat):
+    timings = []
+    for _ in range(repeat):
+        began = time.perf_counter()
+        rows = len(store.get_predictions(start=start))
+        timings.append((time.perf_counter() - began) * 1000)
+    return float(np.median(timings)), rows
+
+def bench(days, rows_per_day, workdir, repeat=5):
+    s3 = FakeS3Client()
+    clock_now = [START.timestamp()]
+    db = DatabaseManager(False, False, local_db_path=os.path.join(workdir, 'predictions.db'))
+    store = SegmentStore(os.path.join(workdir, 'segments'), s3_client=s3, bucket='bench', background=False,
+                         clock=lambda: clock_now[0])
+    sqlite_bytes, segment_bytes = [], []
+    for day in range(days):
+        rows = _rows(rows_per_day, seed=day)
+        db.save_predictions_bulk(rows)
+        # DatabaseManager sube la base completa (S3SyncWorker.snapshot) en cada sincronización
+        snapshot_path = os.path.join(workdir, 'snapshot.db')
+        db.snapshot(snapshot_path)
+        sqlite_bytes.append(os.path.getsize(snapshot_path))
+        os.remove(snapshot_path)
+        before = store.bytes_uploaded
+        store.save_predictions_bulk(rows)
+        store.flush()
+        segment_bytes.append(store.bytes_uploaded - before)
+        clock_now[0] += 86_400
+
+    last_day = (START + timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    # SQLite guarda CURRENT_TIMESTAMP: el último día simulado es, para él, todo el historial
+    sqlite_ms, sqlite_rows = _query_ms(db, '1970-01-01', repeat)
+    segment_ms, segment_rows = _query_ms(store, last_day, repeat)
+    full_ms, _ = _query_ms(store, '1970-01-01', repeat)
+    db.close()
+    store.close()
+    return {
+        'sqlite_upload_last_kb': sqlite_bytes[-1] / 1024, 'sqlite_upload_total_kb': sum(sqlite_bytes) / 1024,
+        'segment_upload_last_kb': segment_bytes[-1] / 1024, 'segment_upload_total_kb': sum(segment_bytes) / 1024,
+        'sqlite_scan_ms': sqlite_ms, 'sqlite_scan_rows': sqlite_rows,
+        'segment_last_day_ms': segment_ms, 'segment_last_day_rows': segment_rows, 'segment_scan_ms': full_ms,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--rows-per-day', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        r = bench(args.days, args.rows_per_day, workdir, args.repeat)
+    print(f"{'':>28} {'sqlite':>12} {'segments':>12}")
+    print(f"{'upload, last sync (KiB)':>28} {r['sqlite_upload_last_kb']:>12.0f} {r['segment_upload_last_kb']:>12.0f}")
+    print(f"{'upload, all syncs (KiB)':>28} {r['sqlite_upload_total_kb']:>12.0f} {r['segment_upload_total_kb']:>12.0f}")
+    print(f"{'full scan (ms)':>28} {r['sqlite_scan_ms']:>12.1f} {r['segment_scan_ms']:>12.1f}")
+    print(f"{'last day (ms)':>28} {'':>12} {r['segment_last_day_ms']:>12.1f}"
+          f"  ({r['segment_last_day_rows']} of {r['sqlite_scan_rows']} rows)")
+
+if __name__ == '__main__':
+    main()
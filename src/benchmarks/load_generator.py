@@ -0,0 +1,122 @@
+"""Generador de carga de usuarios concurrentes sobre el camino de scoring del formulario.
+
+Cada petición hace lo mismo que un envío del formulario: busca el vector en la caché de
+predicciones (o puntúa con score_features) y guarda el resultado con save_prediction.
+Las llegadas son de bucle abierto a --rps fijas: la latencia se mide desde el instante
+programado de cada petición, así que la espera en cola por saturación también cuenta.
+
+Uso (desde src/):
+    python -m benchmarks.load_generator --rps 200 --duration 10 --users 8
+    python -m benchmarks.load_generator --base-path . --rps 50 --distinct 100   # modelo real
+"""
+import argparse
+import queue
+import tempfile
+import threading
+import time
+import numpy as np
+
+def scoring_target(model, scaler, db, cache=None, distinct=1000, seed=0):
+    """Devuelve `fn()` que puntúa y guarda un paciente elegido entre `distinct` perfiles."""
+    from benchmarks.bench_forest import synthetic_patients
+    from prediction import score_features
+    patients = synthetic_patients(distinct, seed=seed)
+    rng = np.random.default_rng(seed)
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            i = int(rng.integers(distinct))
+        row = patients.iloc[[i]]
+        if cache is not None:
+            label, probability = cache.get_or_compute(row.iloc[0].tolist(), lambda: score_features(model, scaler, row))
+        else:
+            label, probability = score_features(model, scaler, row)
+        features = row.iloc[0].to_dict()
+        db.save_prediction('M' if features['gender'] == 1 else 'F', float(features['hemoglobin']), label, False,
+                           probability=probability, features=features)
+    return request
+
+def run_load(target, rps, duration, users=8):
+    """Lanza `target()` a `rps` peticiones/s durante `duration` segundos con `users` hilos."""
+    schedule = queue.Queue()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def user():
+        local_latencies, local_errors = [], 0
+        while True:
+            due = schedule.get()
+            if due is None:
+                break
+            try:
+                target()
+            except Exception:
+                local_errors += 1
+            local_latencies.append(time.perf_counter() - due)
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(users)]
+    for t in threads:
+        t.start()
+    start = time.perf_counter()
+    total = int(rps * duration)
+    for i in range(total):
+        due = start + i / rps
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        schedule.put(due)
+    for _ in threads:
+        schedule.put(None)
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'target_rps': rps,
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'achieved_rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+def main():
+    from db_utils import DatabaseManager
+    from prediction_cache import PredictionCache
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rps', type=float, default=100.0, help='peticiones por segundo objetivo')
+    parser.add_argument('--duration', type=float, default=10.0, help='segundos de carga')
+    parser.add_argument('--users', type=int, default=8, help='usuarios (hilos) concurrentes')
+    parser.add_argument('--distinct', type=int, default=1000, help='perfiles de paciente distintos')
+    parser.add_argument('--no-cache', action='store_true', help='puntuar siempre, sin caché de predicciones')
+    parser.add_argument('--base-path', help='directorio con el modelo y el scaler reales')
+    args = parser.parse_args()
+
+    if args.base_path:
+        from data_utils import get_file_paths, load_model_and_scaler
+        paths = get_file_paths(args.base_path)
+        model, scaler = load_model_and_scaler(paths['model'], paths['scaler'])
+    else:
+        from benchmarks.bench_forest import synthetic_model
+        model, scaler = synthetic_model()
+    cache = None if args.no_cache else PredictionCache()
+    with tempfile.TemporaryDirectory() as workdir:
+        db = DatabaseManager(False, False, local_db_path=f'{workdir}/load.db')
+        try:
+            target = scoring_target(model, scaler, db, cache=cache, distinct=args.distinct)
+            r = run_load(target, args.rps, args.duration, args.users)
+        finally:
+            db.close()
+    print(f"{r['requests']} requests at {r['achieved_rps']:.0f}/{r['target_rps']:.0f} req/s, {r['errors']} errors, "
+          f"p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms")
+    if cache is not None:
+        print(f"Prediction cache hit rate {cache.stats()['hit_rate']:.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Prueba de carga de la API de inferencia (api.py): latencia p50/p99 y peticiones/s.
+
+Uso (desde src/, con la API levantada):
+    python -m benchmarks.load_test_api --url http://localhost:8000 --concurrency 16 --requests 2000
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+import numpy as np
+from feature_schema import NUM_VARIABLES
+
+DEFAULT_FEATURES = {
+    'gender': 1, 'Gtp': 100.0, 'hemoglobin': 15.0, 'height(cm)': 170.0, 'triglyceride': 150.0,
+    'waist(cm)': 90.0, 'LDL': 100.0, 'HDL': 50.0, 'Cholesterol': 200.0, 'ALT': 20.0,
+    'fasting blood sugar': 90.0, 'systolic': 120.0, 'AST': 25.0, 'relaxation': 80.0, 'weight(kg)': 70.0,
+    'age': 30.0, 'serum creatinine': 1.0, 'eyesight(left)': 1.0, 'eyesight(right)': 1.0, 'tartar': 0,
+    'dental caries': 0, 'Urine protein': 1.0, 'hearing(left)': 1, 'hearing(right)': 1,
+}
+assert set(DEFAULT_FEATURES) == set(NUM_VARIABLES)
+
+def run_load(url, concurrency, total_requests, batch_size=1):
+    parsed = urlparse(url)
+    if batch_size == 1:
+        path, body = '/predict', json.dumps({'features': DEFAULT_FEATURES})
+    else:
+        path, body = '/predict/batch', json.dumps({'instances': [DEFAULT_FEATURES] * batch_size})
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_worker = total_requests // concurrency
+
+    def worker():
+        conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=30)
+        local = []
+        for _ in range(per_worker):
+            start = time.perf_counter()
+            conn.request('POST', path, body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            local.append(time.perf_counter() - start)
+            if response.status != 200:
+                with lock:
+                    errors.append(response.status)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=1, help='filas por petición (>1 usa /predict/batch)')
+    args = parser.parse_args()
+    r = run_load(args.url, args.concurrency, args.requests, args.batch_size)
+    print(f"{r['requests']} requests, {r['errors']} errors, {r['rps']:.0f} req/s, "
+          f"p50 {r['p50_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""Suite de benchmarks de rendimiento con resultados en JSON para comparar commits.
+
+Casos (con --quick se reducen los tamaños para usarla como smoke test):
+    model_load        deserializar modelo y scaler con load_model_and_scaler
+    predict_single    score_features sobre una fila (camino del formulario)
+    predict_batch     score_chunk sobre un bloque de filas
+    save_prediction   filas/s con save_prediction fila a fila
+    get_predictions   leer toda la tabla (1M filas) con get_predictions
+    export_predictions  volcar la misma tabla a CSV por páginas (memoria Python pico en params)
+    s3_sync           snapshot + subida de predictions.db a un bucket local falso
+
+Uso (desde src/):
+    python -m benchmarks.suite run                          # guarda benchmarks/results/<commit>.json
+    python -m benchmarks.suite run --quick --only predict_single predict_batch
+    python -m benchmarks.suite compare results/base.json results/head.json --threshold 0.10
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+CASES = {}
+
+def case(name, unit='s', higher_is_better=False):
+    """Registra una función `fn(ctx) -> (muestras, parámetros)` como caso de la suite."""
+    def register(fn):
+        CASES[name] = {'fn': fn, 'unit': unit, 'higher_is_better': higher_is_better}
+        return fn
+    return register
+
+def sample(fn, repeat):
+    """Tiempos de `repeat` ejecuciones de `fn` en segundos."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+class LocalBucket:
+    def __init__(self, root):
+        """Cliente S3 mínimo que guarda los objetos en un directorio local."""
+        self.root = root
+
+    def upload_file(self, filename, bucket, key, **kwargs):
+        dest = os.path.join(self.root, bucket, key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copyfile(filename, dest)
+
+class BenchContext:
+    def __init__(self, workdir, quick=False):
+        """Modelo sintético, rutas temporales y tamaños de los casos."""
+        self.workdir = workdir
+        self.quick = quick
+        self.repeat = 3 if quick else 10
+        self.batch_rows = 1_000 if quick else 10_000
+        self.write_rows = 200 if quick else 2_000
+        self.table_rows = 20_000 if quick else 1_000_000
+        self._model = None
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def model(self):
+        if self._model is None:
+            import joblib
+            from benchmarks.bench_forest import synthetic_model
+            self._model = synthetic_model(n_estimators=20 if self.quick else 100)
+            joblib.dump(self._model[0], self.path('random_forest_model_Default.pkl'))
+            joblib.dump(self._model[1], self.path('scaler.pkl'))
+        return self._model
+
+    def patients(self, n, seed=0):
+        from benchmarks.bench_forest import synthetic_patients
+        return synthetic_patients(n, seed=seed)
+
+    def database(self, name, rows=0):
+        from db_utils import DatabaseManager
+        db = DatabaseManager(False, False, local_db_path=self.path(name))
+        for start in range(0, rows, 50_000):
+            db.save_predictions_bulk([('M', 15.0, 'Smoker')] * min(50_000, rows - start))
+        return db
+
+@case('model_load')
+def bench_model_load(ctx):
+    from data_utils import get_file_paths, load_model_and_scaler
+    ctx.model()
+    paths = get_file_paths(ctx.workdir)
+    return sample(lambda: load_model_and_scaler(paths['model'], paths['scaler']), ctx.repeat), {}
+
+@case('predict_single')
+def bench_predict_single(ctx):
+    from prediction import score_features
+    model, scaler = ctx.model()
+    row = ctx.patients(1, seed=1)
+    return sample(lambda: score_features(model, scaler, row), ctx.repeat * 10), {}
+
+@case('predict_batch')
+def bench_predict_batch(ctx):
+    from batch_scoring import score_chunk
+    model, scaler = ctx.model()
+    batch = ctx.patients(ctx.batch_rows, seed=2)
+    return sample(lambda: score_chunk(batch, model, scaler), ctx.repeat), {'rows': ctx.batch_rows}
+
+@case('explain_single')
+def bench_explain_single(ctx):
+    from forest_engine import explainer_for
+    model, scaler = ctx.model()
+    explainer = explainer_for(model, scaler)
+    row = ctx.patients(1, seed=1).to_numpy(dtype=float)
+    return sample(lambda: explainer.contributions(row), ctx.repeat * 10), {}
+
+@case('explain_batch', unit='rows/s', higher_is_better=True)
+def bench_explain_batch(ctx):
+    import tracemalloc
+    from forest_engine import explainer_for
+    model, scaler = ctx.model()
+    explainer = explainer_for(model, scaler)
+    rows = ctx.batch_rows * 10
+    X = ctx.patients(rows, seed=2).to_numpy(dtype=float)
+    tracemalloc.start()
+    times = sample(lambda: explainer.contributions(X), max(1, ctx.repeat // 5))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    # El pico por encima de la salida (rows x variables) es el de un bloque de CHUNK_ROWS filas
+    return [rows / t for t in times], {'rows': rows, 'peak_python_mb': peak / 2**20}
+
+@case('save_prediction', unit='rows/s', higher_is_better=True)
+def bench_save_prediction(ctx):
+    from feature_schema import default_features
+    db = ctx.database('writes.db')
+    features = default_features()
+    try:
+        def write():
+            for _ in range(ctx.write_rows):
+                db.save_prediction('M', 15.0, 'Smoker', False, probability=0.8, features=features)
+        return [ctx.write_rows / t for t in sample(write, ctx.repeat)], {'rows': ctx.write_rows}
+    finally:
+        db.close()
+
+@case('get_predictions')
+def bench_get_predictions(ctx):
+    db = ctx.database('reads.db', rows=ctx.table_rows)
+    try:
+        return sample(db.get_predictions, max(1, ctx.repeat // 2)), {'rows': ctx.table_rows}
+    finally:
+        db.close()
+
+@case('export_predictions', unit='rows/s', higher_is_better=True)
+def bench_export_predictions(ctx):
+    import tracemalloc
+    db = ctx.database('export.db', rows=ctx.table_rows)
+    try:
+        tracemalloc.start()
+        times = sample(lambda: db.export_predictions(ctx.path('export.csv')), max(1, ctx.repeat // 2))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return [ctx.table_rows / t for t in times], {'rows': ctx.table_rows, 'peak_python_mb': peak / 2**20}
+    finally:
+        db.close()
+
+@case('s3_sync')
+def bench_s3_sync(ctx):
+    from sync_utils import S3SyncWorker
+    db = ctx.database('sync.db', rows=ctx.table_rows // 10)
+    worker = S3SyncWorker(db.snapshot, LocalBucket(ctx.path('bucket')), 'bench', 'predictions.db',
+                          max_pending=sys.maxsize, max_delay=3600.0)
+    try:
+        def sync():
+            worker.mark_dirty()
+            worker.flush()
+        times = sample(sync, ctx.repeat)
+        return times, {'rows': ctx.table_rows // 10, 'bytes': worker.bytes_uploaded // worker.uploads}
+    finally:
+        worker.stop(flush=False)
+        db.close()
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(names=None, quick=False):
+    """Ejecuta los casos indicados (o todos) y devuelve el documento de resultados."""
+    names = names or list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark cases: {unknown}")
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        ctx = BenchContext(workdir, quick=quick)
+        for name in names:
+            spec = CASES[name]
+            samples, params = spec['fn'](ctx)
+            best = max(samples) if spec['higher_is_better'] else min(samples)
+            results[name] = {
+                'value': best,
+                'median': statistics.median(samples),
+                'unit': spec['unit'],
+                'higher_is_better': spec['higher_is_better'],
+                'samples': len(samples),
+                'params': params,
+            }
+    return {
+        'meta': {
+            'commit': _git('rev-parse', '--short', 'HEAD'),
+            'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'quick': quick,
+        },
+        'results': results,
+    }
+
+def compare(base, head, threshold=0.10):
+    """Cambio relativo por caso; un caso es regresión si empeora más de `threshold`."""
+    rows = []
+    for name, new in head['results'].items():
+        old = base['results'].get(name)
+        if old is None or old['value'] == 0:
+            continue
+        change = (new['value'] - old['value']) / old['value']
+        worse = -change if new['higher_is_better'] else change
+        rows.append({'case': name, 'base': old['value'], 'head': new['value'], 'unit': new['unit'],
+                     'change': change, 'regression': worse > threshold})
+    return rows
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run', help='ejecuta la suite y guarda los resultados en JSON')
+    run_parser.add_argument('--quick', action='store_true', help='tamaños reducidos')
+    run_parser.add_argument('--only', nargs='+', choices=sorted(CASES), help='casos a ejecutar')
+    run_parser.add_argument('--output', help='fichero JSON (por defecto benchmarks/results/<commit>.json)')
+    compare_parser = sub.add_parser('compare', help='compara dos ficheros de resultados')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='empeoramiento relativo tolerado')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        document = run_suite(args.only, quick=args.quick)
+        output = args.output or os.path.join(RESULTS_DIR, f"{document['meta']['commit'] or 'local'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(document, f, indent=2)
+        for name, r in document['results'].items():
+            print(f"{name:>16} {r['value']:>14.6g} {r['unit']:<7} (median {r['median']:.6g})")
+        print(f"Results written to {output}")
+    else:
+        rows = compare(_load(args.base), _load(args.head), args.threshold)
+        for r in rows:
+            flag = 'REGRESSION' if r['regression'] else ''
+            print(f"{r['case']:>16} {r['base']:>12.6g} -> {r['head']:>12.6g} {r['unit']:<7} {r['change']:>+8.1%} {flag}")
+        sys.exit(1 if any(r['regression'] for r in rows) else 0)
+
+if __name__ == '__main__':
+    main()
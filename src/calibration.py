@@ -0,0 +1,153 @@
+"""Probabilidad calibrada y umbral de decisión precalculados al entrenar.
+
+train.py ajusta una regresión isotónica sobre las probabilidades out-of-bag del bosque y
+guarda en calibration.json, junto al modelo, los puntos de la curva, la curva de fiabilidad
+y una tabla de precisión/recall/F1 por umbral. Al servir basta np.interp sobre la salida de
+predict_proba: la calibración no añade otra pasada por el modelo.
+
+Sin calibration.json la probabilidad es la del bosque y el umbral 0.5, que equivale a
+model.predict. DECISION_THRESHOLD fija el umbral sin reentrenar.
+"""
+import json
+import logging
+import os
+import numpy as np
+from feature_schema import CLASS_DICT
+
+CALIBRATION_NAME = 'calibration.json'
+DEFAULT_THRESHOLD = 0.5
+# Umbrales de la tabla (0.05, 0.10, ..., 0.95) y número de tramos de la curva de fiabilidad
+THRESHOLDS = tuple(round(t, 2) for t in np.arange(0.05, 0.951, 0.05))
+CURVE_BINS = 10
+
+def positive_proba(model, X):
+    """P(Smoker) de cada fila con una sola llamada a predict_proba."""
+    probabilities = np.asarray(model.predict_proba(X))
+    positive = int(np.flatnonzero(np.asarray(model.classes_).astype(str) == '1')[0])
+    return probabilities[:, positive]
+
+def label_probabilities(probabilities, threshold):
+    """Etiquetas de CLASS_DICT; estrictamente mayor para que 0.5 empate como argmax (Non-Smoker)."""
+    return np.where(np.asarray(probabilities) > threshold, CLASS_DICT['1'], CLASS_DICT['0']).astype(object)
+
+class Calibration:
+    def __init__(self, knots=None, values=None, threshold=DEFAULT_THRESHOLD, table=(), curve=(), info=None):
+        """Curva isotónica (knots -> values) y umbral; sin knots la probabilidad no se modifica."""
+        self.knots = None if knots is None else np.asarray(knots, dtype=np.float64)
+        self.values = None if values is None else np.asarray(values, dtype=np.float64)
+        self.threshold = _check_threshold(threshold)
+        self.table = list(table)
+        self.curve = list(curve)
+        self.info = dict(info or {})
+
+    @property
+    def calibrated(self):
+        return self.knots is not None
+
+    def transform(self, probabilities):
+        """Probabilidad calibrada; fuera de la curva se recorta a sus extremos."""
+        if self.knots is None:
+            return np.asarray(probabilities, dtype=np.float64)
+        return np.interp(probabilities, self.knots, self.values)
+
+    def predict(self, model, X, threshold=None):
+        """(etiquetas, P(Smoker) calibrada) de una matriz ya escalada."""
+        probabilities = self.transform(positive_proba(model, X))
+        return label_probabilities(probabilities, self.threshold if threshold is None else threshold), probabilities
+
+    def with_threshold(self, threshold):
+        return Calibration(self.knots, self.values, threshold, self.table, self.curve, self.info)
+
+    def to_dict(self):
+        return {
+            'method': 'isotonic' if self.calibrated else 'none',
+            'knots': None if self.knots is None else self.knots.tolist(),
+            'values': None if self.values is None else self.values.tolist(),
+            'threshold': self.threshold,
+            'thresholds': self.table,
+            'curve': self.curve,
+            **self.info,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        known = ('method', 'knots', 'values', 'threshold', 'thresholds', 'curve')
+        return cls(data.get('knots'), data.get('values'), data.get('threshold', DEFAULT_THRESHOLD),
+                   data.get('thresholds', ()), data.get('curve', ()),
+                   {key: value for key, value in data.items() if key not in known})
+
+def _check_threshold(threshold):
+    threshold = float(threshold)
+    if not 0.0 < threshold < 1.0:
+        raise ValueError(f"Decision threshold must be between 0 and 1, got {threshold}")
+    return threshold
+
+def calibration_path(model_path):
+    return os.path.join(os.path.dirname(model_path), CALIBRATION_NAME)
+
+def load_calibration(model_path, threshold=None):
+    """Calibración del modelo de `model_path` (calibration.json a su lado) o la identidad.
+
+    El umbral es `threshold`, DECISION_THRESHOLD o el guardado en el fichero, en ese orden.
+    """
+    path = calibration_path(model_path)
+    calibration = Calibration()
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                calibration = Calibration.from_dict(json.load(f))
+        except (OSError, ValueError) as e:
+            logging.error(f"Ignoring unreadable calibration {path}: {e}")
+    threshold = threshold if threshold is not None else os.environ.get('DECISION_THRESHOLD')
+    return calibration if threshold is None else calibration.with_threshold(threshold)
+
+def threshold_table(probabilities, y, thresholds=THRESHOLDS):
+    """Precisión, recall y F1 de Smoker, accuracy y tasa de positivos para cada umbral."""
+    y = np.asarray(y).astype(bool)
+    predicted = np.asarray(probabilities)[None, :] > np.asarray(thresholds)[:, None]
+    tp = (predicted & y).sum(axis=1)
+    fp = (predicted & ~y).sum(axis=1)
+    fn = (~predicted & y).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        precision = np.nan_to_num(tp / (tp + fp))
+        recall = np.nan_to_num(tp / (tp + fn))
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    accuracy = (predicted == y).mean(axis=1)
+    return [{'threshold': float(t), 'precision': float(p), 'recall': float(r), 'f1': float(f),
+             'accuracy': float(a), 'positive_rate': float(rate)}
+            for t, p, r, f, a, rate in zip(thresholds, precision, recall, f1, accuracy, predicted.mean(axis=1))]
+
+def reliability_curve(probabilities, y, bins=CURVE_BINS):
+    """Probabilidad media predicha frente a frecuencia observada por tramos iguales de [0, 1]."""
+    probabilities, y = np.asarray(probabilities), np.asarray(y, dtype=np.float64)
+    index = np.minimum((probabilities * bins).astype(int), bins - 1)
+    counts = np.bincount(index, minlength=bins)
+    predicted = np.bincount(index, weights=probabilities, minlength=bins)
+    observed = np.bincount(index, weights=y, minlength=bins)
+    return [{'bin': i, 'count': int(n), 'predicted': float(p / n), 'observed': float(o / n)}
+            for i, (n, p, o) in enumerate(zip(counts, predicted, observed)) if n]
+
+def fit_calibration(fit_proba, y_fit, test_proba, y_test, threshold=DEFAULT_THRESHOLD):
+    """Ajusta la curva con (fit_proba, y_fit) y evalúa curva y umbrales con el conjunto de test.
+
+    `threshold='f1'` elige el umbral de mayor F1 sobre los datos de ajuste, no sobre test.
+    """
+    from sklearn.isotonic import IsotonicRegression
+    fit_proba, y_fit = np.asarray(fit_proba), np.asarray(y_fit)
+    finite = np.isfinite(fit_proba)  # Filas que no quedaron fuera de ningún árbol
+    isotonic = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip').fit(fit_proba[finite], y_fit[finite])
+    calibration = Calibration(isotonic.X_thresholds_, isotonic.y_thresholds_)
+    if threshold == 'f1':
+        candidates = threshold_table(calibration.transform(fit_proba[finite]), y_fit[finite])
+        threshold = max(candidates, key=lambda row: row['f1'])['threshold']
+    calibrated = calibration.transform(test_proba)
+    y_test = np.asarray(y_test)
+    return Calibration(calibration.knots, calibration.values, threshold,
+                       threshold_table(calibrated, y_test), reliability_curve(calibrated, y_test),
+                       {'brier_raw': float(np.mean((np.asarray(test_proba) - y_test) ** 2)),
+                        'brier_calibrated': float(np.mean((calibrated - y_test) ** 2)),
+                        'fit_rows': int(finite.sum())})
+
+def save_calibration(calibration, path):
+    with open(path, 'w') as f:
+        json.dump(calibration.to_dict(), f, indent=2)
@@ -0,0 +1,74 @@
+"""Panel en vivo de la página "Relevant Data", calculado desde el resumen prediction_rollup.
+
+Las figuras se construyen a partir de unas pocas filas por día y se guardan en memoria
+junto con la versión del resumen (DatabaseManager.rollup_version); solo se rehacen cuando
+entra una predicción nueva.
+"""
+import threading
+import altair as alt
+import streamlit as st
+
+_lock = threading.Lock()
+_figures = {}
+
+def build_figures(rollup):
+    """Métricas y gráficos Altair a partir del DataFrame de DatabaseManager.get_rollup()."""
+    total = int(rollup['count'].sum())
+    smokers = int(rollup.loc[rollup['prediction'] == 'Smoker', 'count'].sum())
+    daily = rollup.groupby(['day', 'prediction'], as_index=False)['count'].sum()
+    by_gender = rollup.groupby(['gender', 'prediction'], as_index=False)['count'].sum()
+    by_gender['share'] = by_gender['count'] / by_gender.groupby('gender')['count'].transform('sum')
+    hemo = rollup.groupby('gender', as_index=False)[['hemoglobin_count', 'hemoglobin_sum', 'hemoglobin_sumsq']].sum()
+    hemo['mean'] = hemo['hemoglobin_sum'] / hemo['hemoglobin_count']
+    hemo['std'] = (hemo['hemoglobin_sumsq'] / hemo['hemoglobin_count'] - hemo['mean'] ** 2).clip(lower=0) ** 0.5
+    hemo['low'], hemo['high'] = hemo['mean'] - hemo['std'], hemo['mean'] + hemo['std']
+
+    color = alt.Color('prediction:N', title='Prediction')
+    return {
+        'total': total,
+        'smoker_rate': smokers / total if total else 0.0,
+        'days': int(rollup['day'].nunique()),
+        'daily': alt.Chart(daily).mark_bar().encode(
+            x=alt.X('day:T', title='Day'), y=alt.Y('count:Q', title='Predictions'), color=color),
+        'gender': alt.Chart(by_gender).mark_bar().encode(
+            x=alt.X('gender:N', title='Gender'), y=alt.Y('share:Q', title='Share', axis=alt.Axis(format='%')),
+            color=color),
+        'hemoglobin': alt.Chart(hemo).mark_point(filled=True, size=80).encode(
+            x=alt.X('gender:N', title='Gender'), y=alt.Y('mean:Q', title='Hemoglobin (mean ± std)',
+                                                           scale=alt.Scale(zero=False)))
+        + alt.Chart(hemo).mark_rule().encode(x='gender:N', y='low:Q', y2='high:Q'),
+    }
+
+def get_figures(db):
+    """Figuras en caché para la versión actual del resumen; se recalculan solo si cambió."""
+    version = db.rollup_version()
+    with _lock:
+        cached = _figures.get(db.local_db_path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    figures = build_figures(db.get_rollup())
+    with _lock:
+        _figures[db.local_db_path] = (version, figures)
+    return figures
+
+def live_dashboard(db):
+    """Sección de analítica de las predicciones guardadas."""
+    st.subheader("Live Prediction Analytics")
+    try:
+        figures = get_figures(db)
+    except Exception as e:
+        st.error(f"Analytics unavailable: {e}")
+        return
+    if not figures['total']:
+        st.info("No predictions stored yet.")
+        return
+    cols = st.columns(3)
+    cols[0].metric("Predictions", f"{figures['total']:,}")
+    cols[1].metric("Predicted smokers", f"{figures['smoker_rate']:.1%}")
+    cols[2].metric("Active days", figures['days'])
+    st.altair_chart(figures['daily'], use_container_width=True)
+    cols = st.columns(2)
+    with cols[0]:
+        st.altair_chart(figures['gender'], use_container_width=True)
+    with cols[1]:
+        st.altair_chart(figures['hemoglobin'], use_container_width=True)
@@ -1,10 +1,47 @@
 import os
+import sys
+import json
+import hashlib
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 from joblib import load
-import streamlit as st
 import logging
+from metrics_utils import inc, timed
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+S3_ASSETS = [
+    ('model', 'src/random_forest_model_Default.pkl'),
+    ('scaler', 'src/scaler.pkl'),
+    ('body_image', 'src/body.jpg'),
+    ('gender_smoke', 'src/Gender_smoking.png'),
+    ('gtp', 'src/GTP.png'),
+    ('hemo', 'src/hemoglobine_gender.png'),
+    ('trigly', 'src/Triglyceride.png')
+]
+MANIFEST_NAME = '.asset_manifest.json'
+
+def _stop_with_error(message):
+    """Registra el error; en un script de Streamlit además lo muestra en la UI y lo detiene.
+
+    Fuera de Streamlit (API, Lambda, arranque) lanza RuntimeError con el mismo mensaje.
+    """
+    logging.error(message)
+    if _in_streamlit_script():
+        import streamlit as st
+        st.error(message)
+        st.stop()
+    raise RuntimeError(message)
+
+def _in_streamlit_script():
+    # Sin streamlit importado no hay script en marcha: no se carga solo para comprobarlo
+    if 'streamlit' not in sys.modules:
+        return False
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    return get_script_run_ctx(suppress_warning=True) is not None
+
+def get_base_path(is_aws, is_lambda):
+    return '/home/ubuntu/Body_Signals_of_Smoking---AWS-Terraform-testing/src' if is_aws and not is_lambda else '/tmp' if is_aws and is_lambda else '/workspaces/Body_Signals_of_Smoking---AWS-Terraform-testing/src'
 
 def get_file_paths(base_path):
     return {
@@ -17,37 +54,93 @@ def get_file_paths(base_path):
         'trigly': os.path.join(base_path, 'Triglyceride.png')
     }
 
-def ensure_files(base_path, is_aws, is_lambda, bucket_name='smoking-body-signals-data-dev'):
+def _md5(path):
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _atomic_write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.manifest-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def load_manifest(base_path):
+    path = os.path.join(base_path, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
     try:
-        s3 = boto3.client('s3') if is_aws and not is_lambda else None
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logging.warning(f"Ignoring unreadable asset manifest {path}")
+        return {}
+
+def _is_current(local_path, entry, etag, size):
+    """True si la copia local corresponde al objeto S3 (ETag/tamaño del manifiesto o MD5 local)."""
+    if not os.path.exists(local_path) or os.path.getsize(local_path) != size:
+        return False
+    if entry is not None and entry.get('etag') == etag and entry.get('size') == size:
+        return True
+    # Sin manifiesto (p. ej. ficheros copiados a mano): el ETag de una subida simple es el MD5
+    return '-' not in etag and _md5(local_path) == etag
+
+def fetch_asset(s3, bucket_name, s3_key, local_path, entry=None):
+    """Descarga `s3_key` solo si cambió; escribe a un temporal y lo renombra de forma atómica."""
+    head = s3.head_object(Bucket=bucket_name, Key=s3_key)
+    etag = head['ETag'].strip('"')
+    size = head['ContentLength']
+    new_entry = {'etag': etag, 'size': size}
+    if _is_current(local_path, entry, etag, size):
+        return new_entry, False
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(local_path), prefix='.' + os.path.basename(local_path) + '.part-')
+    os.close(fd)
+    try:
+        logging.debug(f"Downloading {s3_key} to {local_path}")
+        s3.download_file(bucket_name, s3_key, tmp_path)
+        if os.path.getsize(tmp_path) != size:
+            raise IOError(f"Incomplete download of {s3_key}: {os.path.getsize(tmp_path)} of {size} bytes")
+        os.replace(tmp_path, local_path)
+        inc('s3_bytes', size, direction='download')
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return new_entry, True
+
+def fetch_assets(s3, base_path, bucket_name='smoking-body-signals-data-dev', max_workers=8):
+    """Sincroniza en paralelo los ficheros de S3_ASSETS con `base_path` usando el manifiesto local."""
+    paths = get_file_paths(base_path)
+    manifest = load_manifest(base_path)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {s3_key: pool.submit(fetch_asset, s3, bucket_name, s3_key, paths[key], manifest.get(s3_key))
+                   for key, s3_key in S3_ASSETS}
+        results = {s3_key: future.result() for s3_key, future in futures.items()}
+    downloaded = [s3_key for s3_key, (_, was_downloaded) in results.items() if was_downloaded]
+    _atomic_write_json(os.path.join(base_path, MANIFEST_NAME), {s3_key: entry for s3_key, (entry, _) in results.items()})
+    elapsed = time.perf_counter() - start
+    logging.info(f"Assets checked in {elapsed:.2f}s, downloaded {len(downloaded)} of {len(S3_ASSETS)}")
+    return {'downloaded': downloaded, 'seconds': elapsed}
+
+@timed('ensure_files')
+def ensure_files(base_path, is_aws, is_lambda, bucket_name='smoking-body-signals-data-dev', s3_client=None):
+    try:
+        s3 = (s3_client or boto3.client('s3')) if is_aws and not is_lambda else None
         paths = get_file_paths(base_path)
         os.makedirs(base_path, exist_ok=True)
         if is_aws and not is_lambda:
-            for key, s3_key in [
-                ('model', 'src/random_forest_model_Default.pkl'),
-                ('scaler', 'src/scaler.pkl'),
-                ('body_image', 'src/body.jpg'),
-                ('gender_smoke', 'src/Gender_smoking.png'),
-                ('gtp', 'src/GTP.png'),
-                ('hemo', 'src/hemoglobine_gender.png'),
-                ('trigly', 'src/Triglyceride.png')
-            ]:
-                local_path = paths[key]
-                if not os.path.exists(local_path):
-                    logging.debug(f"Attempting to download {s3_key} to {local_path}")
-                    s3.download_file(bucket_name, s3_key, local_path)
-                    logging.debug(f"Downloaded {s3_key} to {local_path}")
+            return fetch_assets(s3, base_path, bucket_name)
         else:
             for key, local_path in paths.items():
                 if not os.path.exists(local_path):
-                    logging.error(f"File not found: {local_path}. Place it in {base_path}")
-                    st.error(f"File not found: {local_path}. Place it in {base_path}")
-                    st.stop()
+                    _stop_with_error(f"File not found: {local_path}. Place it in {base_path}")
     except Exception as e:
-        logging.error(f"File handling error: {e}")
-        st.error(f"File handling error: {e}")
-        st.stop()
+        _stop_with_error(f"File handling error: {e}")
 
+@timed('load_model_and_scaler')
 def load_model_and_scaler(model_path, scaler_path):
     try:
         logging.debug(f"Loading model from {model_path}")
@@ -59,10 +152,6 @@ def load_model_and_scaler(model_path, scaler_path):
         logging.debug("Model and scaler loaded successfully")
         return model, scaler
     except FileNotFoundError as e:
-        logging.error(f"Error loading model or scaler: {e}")
-        st.error(f"Error loading model or scaler: {e}")
-        st.stop()
+        _stop_with_error(f"Error loading model or scaler: {e}")
     except Exception as e:
-        logging.error(f"Unexpected error loading model or scaler: {e}")
-        st.error(f"Unexpected error loading model or scaler: {e}")
-        st.stop()
\ No newline at end of file
+        _stop_with_error(f"Unexpected error loading model or scaler: {e}")
\ No newline at end of file
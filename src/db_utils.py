@@ -1,81 +1,723 @@
 import os
+import queue
+import re
 import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 import boto3
-import pandas as pd
-from botocore.exceptions import ClientError
 import logging
+import numpy as np
+from feature_schema import FEATURE_SPECS, NUM_VARIABLES
+from metrics_utils import inc, timed
+from sync_utils import S3SyncWorker, key_lock, put_versioned, remote_generation
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+try:
+    import fcntl
+except ImportError:  # Windows: sin cerrojo entre procesos sobre predictions.db
+    fcntl = None
+
+CREATE_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS predictions (
+                     id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     gender TEXT,
+                     hemoglobin REAL,
+                     prediction TEXT,
+                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)'''
+# gender y hemoglobin ya estaban en la tabla; el resto de variables se guarda codificado en una
+# columna tipada por variable (INTEGER para categóricas y enteras, REAL para el resto), que
+# _ensure_schema añade con ALTER TABLE tanto a bases nuevas como antiguas
+FEATURE_COLUMNS = {name: (re.sub(r'[^0-9a-z]+', '_', name.lower()).strip('_'),
+                          'REAL' if spec['dtype'] == 'float' else 'INTEGER')
+                   for name, spec in FEATURE_SPECS.items() if name not in ('gender', 'hemoglobin')}
+EXTRA_COLUMNS = (('probability', 'REAL'),) + tuple(FEATURE_COLUMNS.values())
+INSERT_SQL = "INSERT INTO predictions (gender, hemoglobin, prediction) VALUES (?, ?, ?)"
+INSERT_ROW_SQL = (f"INSERT INTO predictions (gender, hemoglobin, prediction, {', '.join(c for c, _ in EXTRA_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * (3 + len(EXTRA_COLUMNS)))})")
+SELECT_ALL_SQL = "SELECT * FROM predictions"
+COLUMNS = ('id', 'gender', 'hemoglobin', 'prediction', 'timestamp') + tuple(c for c, _ in EXTRA_COLUMNS)
+# Los filtros combinan una columna de igualdad con un rango de tiempo
+INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_predictions_gender_timestamp ON predictions (gender, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_predictions_prediction_timestamp ON predictions (prediction, timestamp)",
+)
+
+# Resumen diario por género y etiqueta mantenido por un trigger en cada INSERT: los paneles
+# leen unas pocas filas por día en lugar de agregar toda la tabla de predicciones
+ROLLUP_TABLE_SQL = '''CREATE TABLE IF NOT EXISTS prediction_rollup (
+                      day TEXT NOT NULL,
+                      gender TEXT NOT NULL,
+                      prediction TEXT NOT NULL,
+                      count INTEGER NOT NULL,
+                      hemoglobin_count INTEGER NOT NULL,
+                      hemoglobin_sum REAL NOT NULL,
+                      hemoglobin_sumsq REAL NOT NULL,
+                      hemoglobin_min REAL,
+                      hemoglobin_max REAL,
+                      PRIMARY KEY (day, gender, prediction)) WITHOUT ROWID'''
+ROLLUP_TRIGGER_SQL = '''CREATE TRIGGER IF NOT EXISTS predictions_rollup_insert AFTER INSERT ON predictions
+                        BEGIN
+                          INSERT INTO prediction_rollup VALUES (
+                            date(NEW.timestamp), coalesce(NEW.gender, ''), coalesce(NEW.prediction, ''), 1,
+                            NEW.hemoglobin IS NOT NULL, coalesce(NEW.hemoglobin, 0),
+                            coalesce(NEW.hemoglobin * NEW.hemoglobin, 0), NEW.hemoglobin, NEW.hemoglobin)
+                          ON CONFLICT (day, gender, prediction) DO UPDATE SET
+                            count = count + 1,
+                            hemoglobin_count = hemoglobin_count + excluded.hemoglobin_count,
+                            hemoglobin_sum = hemoglobin_sum + excluded.hemoglobin_sum,
+                            hemoglobin_sumsq = hemoglobin_sumsq + excluded.hemoglobin_sumsq,
+                            hemoglobin_min = coalesce(min(hemoglobin_min, excluded.hemoglobin_min), hemoglobin_min, excluded.hemoglobin_min),
+                            hemoglobin_max = coalesce(max(hemoglobin_max, excluded.hemoglobin_max), hemoglobin_max, excluded.hemoglobin_max);
+                        END'''
+ROLLUP_BACKFILL_SQL = '''INSERT INTO prediction_rollup
+                         SELECT date(timestamp), coalesce(gender, ''), coalesce(prediction, ''), COUNT(*),
+                                COUNT(hemoglobin), coalesce(SUM(hemoglobin), 0), coalesce(SUM(hemoglobin * hemoglobin), 0),
+                                MIN(hemoglobin), MAX(hemoglobin)
+                         FROM predictions GROUP BY 1, 2, 3'''
+
+# Qué copia de S3 tiene incorporada la base local: 'generation' (metadato del objeto en S3) y
+# 'synced_id' (las filas con id <= synced_id están en esa copia con el mismo id); durante una
+# subida, 'pending_generation'/'pending_id' son los valores que tendrán si termina bien
+SYNC_STATE_SQL = "CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value INTEGER)"
+
+# WAL permite lecturas concurrentes con un escritor; synchronous=NORMAL es seguro en WAL
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+)
+
+def prediction_row(gender, hemoglobin, prediction, probability=None, features=None):
+    """Tupla de INSERT_ROW_SQL; `features` son las variables codificadas (sin ellas quedan a NULL)."""
+    features = features or {}
+    return (gender, hemoglobin, prediction, probability) + tuple(features.get(name) for name in FEATURE_COLUMNS)
+
+def prediction_rows(X, labels, probabilities, columns=None):
+    """Tuplas de INSERT_ROW_SQL para una matriz ya validada y codificada (orden `columns`)."""
+    X = np.asarray(X, dtype=np.float64)
+    index = {name: i for i, name in enumerate(columns or NUM_VARIABLES)}
+    values = [np.where(X[:, index['gender']] == 1, 'M', 'F').tolist(), X[:, index['hemoglobin']].tolist(),
+              list(labels), np.asarray(probabilities, dtype=np.float64).tolist()]
+    # SQLite guarda 1.0 como entero en columnas INTEGER: no hace falta convertir
+    values += [X[:, index[name]].tolist() for name in FEATURE_COLUMNS]
+    return list(zip(*values))
+
+def arrow_schema():
+    """Esquema Arrow de COLUMNS: enteros pequeños para las categóricas, float64 para el resto."""
+    import pyarrow as pa
+    return pa.schema([('id', pa.int64()), ('gender', pa.string()), ('hemoglobin', pa.float64()),
+                      ('prediction', pa.string()), ('timestamp', pa.string())] +
+                     [(column, pa.float64() if sql_type == 'REAL' else pa.int8()) for column, sql_type in EXTRA_COLUMNS])
+
+def export_pages(pages, path):
+    """Escribe páginas de tuplas (COLUMNS) a CSV o Parquet sin juntarlas en memoria; devuelve las filas."""
+    rows_written = 0
+    if path.lower().endswith(('.parquet', '.pq')):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = arrow_schema()
+        with pq.ParquetWriter(path, schema) as writer:
+            for page in pages:
+                writer.write_table(pa.Table.from_arrays([list(col) for col in zip(*page)], schema=schema))
+                rows_written += len(page)
+    else:
+        import csv
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for page in pages:
+                writer.writerows(page)
+                rows_written += len(page)
+    return rows_written
+
+class SQLitePool:
+    def __init__(self, path, max_size=8):
+        """Pool de conexiones SQLite reutilizables entre hilos (una conexión por hilo a la vez)."""
+        self.path = path
+        self.max_size = max_size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _new_connection(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, cached_statements=64)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.max_size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._new_connection()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def close(self):
+        """Cierra las conexiones libres; las que estén en uso se cierran al devolverse."""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+class SQLiteWriter:
+    def __init__(self, pool, max_batch=512):
+        """Hilo escritor único: aplica en orden las escrituras de todas las sesiones.
+
+        `submit(write)` encola `write(conn)` y espera a que se confirme, así que al volver la
+        fila ya está en la base. Lo que se acumula mientras se confirma una transacción va
+        en la siguiente (group commit); si un lote falla se repite escritura a escritura y
+        solo recibe el error la que lo provocó.
+        """
+        self.pool = pool
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.transactions = 0
+        self.writes = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, write):
+        future = Future()
+        self._queue.put((write, future))
+        self.start()
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            items = [item for item in batch if item is not None]
+            if items:
+                self._commit(items)
+            if len(items) < len(batch):
+                # Parada pedida: solo se sale si no quedan escrituras (si no, submit no arrancaría otro hilo)
+                with self._lock:
+                    if self._queue.empty():
+                        self._thread = None
+                        return
+
+    def _commit(self, items):
+        try:
+            with self.pool.connection() as conn:
+                for write, _ in items:
+                    write(conn)
+                conn.commit()
+        except Exception as e:
+            if len(items) == 1:
+                items[0][1].set_exception(e)
+            else:
+                for item in items:
+                    self._commit([item])
+            return
+        self.transactions += 1
+        self.writes += len(items)
+        for _, future in items:
+            future.set_result(None)
+
+    def stop(self):
+        """Aplica las escrituras encoladas y detiene el hilo."""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+class DatabaseFileLock:
+    def __init__(self, path):
+        """flock sobre `path` (<db>.lock): exclusivo para reemplazar la base, compartido mientras se usa."""
+        self._fd = None
+        if fcntl is not None:
+            try:
+                self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError as e:
+                logging.warning(f"Database lock unavailable at {path}: {e}")
+
+    def acquire_exclusive(self):
+        """True si ningún otro gestor (de este u otro proceso) tiene la base abierta."""
+        if self._fd is None:
+            return True
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def acquire_shared(self):
+        """Espera a que termine quien la esté reemplazando y la marca como en uso."""
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_SH)
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+def last_row_id(path):
+    """Último id asignado en una copia de predictions.db (0 si no tiene filas, -1 si no existe)."""
+    if not os.path.exists(path):
+        return -1
+    conn = sqlite3.connect(path)
+    try:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'predictions'").fetchone()
+    except sqlite3.OperationalError:  # Base sin filas todavía: no hay sqlite_sequence
+        row = None
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+def read_rows(path):
+    """Filas (COLUMNS, por id) de otra copia de predictions.db; las columnas que no tenga quedan a NULL."""
+    conn = sqlite3.connect(path)
+    try:
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(predictions)")}
+        if not existing:
+            return []
+        select = ', '.join(column if column in existing else 'NULL' for column in COLUMNS)
+        return conn.execute(f"SELECT {select} FROM predictions ORDER BY id").fetchall()
+    finally:
+        conn.close()
+
+def _set_sync_state(conn, **state):
+    conn.executemany("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)", state.items())
+
+def _sql_time(value):
+    # CURRENT_TIMESTAMP guarda 'YYYY-MM-DD HH:MM:SS' en UTC; las cadenas se comparan tal cual
+    return value.strftime('%Y-%m-%d %H:%M:%S') if hasattr(value, 'strftime') else value
+
+def _where(gender=None, label=None, start=None, end=None, after_id=None):
+    """Cláusula WHERE y parámetros de los filtros; `after_id` va siempre el último."""
+    clauses, params = [], []
+    if gender is not None:
+        clauses.append("gender = ?")
+        params.append(gender)
+    if label is not None:
+        clauses.append("prediction = ?")
+        params.append(label)
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(_sql_time(start))
+    if end is not None:
+        clauses.append("timestamp < ?")
+        params.append(_sql_time(end))
+    if after_id is not None:
+        clauses.append("id > ?")
+        params.append(after_id)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
 
 class DatabaseManager:
-    def __init__(self, is_aws, is_lambda):
+    def __init__(self, is_aws, is_lambda, s3_client=None, local_db_path=None, sync_max_pending=25, sync_max_delay=30.0,
+                 pool_size=8):
         """Inicializa la conexión a la base de datos según el entorno."""
         self.is_aws = is_aws
         self.is_lambda = is_lambda
-        self.local_db_path = '/home/ubuntu/Body_Signals_of_Smoking---AWS-Terraform-testing/src/predictions.db' if is_aws and not is_lambda else '/tmp/predictions.db' if is_aws and is_lambda else 'predictions.db'
+        self.local_db_path = local_db_path or ('/home/ubuntu/Body_Signals_of_Smoking---AWS-Terraform-testing/src/predictions.db' if is_aws and not is_lambda else '/tmp/predictions.db' if is_aws and is_lambda else 'predictions.db')
+        self._s3 = s3_client
+        self.sync = None
+        self.file_lock = None
+        self._schema_ready = False
+        self.rebases = 0
+        self.pool = SQLitePool(self.local_db_path, max_size=pool_size)
+        # Todas las escrituras de las sesiones de Streamlit pasan por un único hilo
+        self.writer = SQLiteWriter(self.pool)
         
         if is_aws:
             self.s3_bucket = 'smoking-body-signals-data-dev'
             self.s3_key = 'src/predictions.db'
+            if not is_lambda:
+                # Las predicciones se suben en segundo plano, agrupadas y versionadas, no una a una
+                self.sync = S3SyncWorker(self.snapshot, self.s3_client, self.s3_bucket, self.s3_key,
+                                         max_pending=sync_max_pending, max_delay=sync_max_delay,
+                                         upload_fn=self._sync_to_s3)
+            self.file_lock = DatabaseFileLock(self.local_db_path + '.lock')
             self.setup_aws_db()
         else:
             self.setup_local_db()
     
+    @property
+    def s3_client(self):
+        if self._s3 is None:
+            self._s3 = boto3.client('s3')
+        return self._s3
+    
+    @timed('setup_aws_db')
     def setup_aws_db(self):
-        s3 = boto3.client('s3')
+        """Prepara predictions.db a partir de la copia de S3 sin perder filas de ninguna de las dos.
+
+        El fichero local solo se reemplaza con el cerrojo exclusivo de <db>.lock, es decir, si
+        ningún otro gestor lo tiene abierto, y solo si no tiene filas. Si las tiene, se
+        sincroniza con S3 (_sync_to_s3): se incorporan las filas remotas que falten y se
+        suben las locales.
+        """
+        if not self.file_lock.acquire_exclusive():
+            self.file_lock.acquire_shared()
+            self.setup_local_db()
+            return
         try:
-            s3.download_file(self.s3_bucket, self.s3_key, self.local_db_path)
-        except ClientError as e:
-            if e.response['Error']['Code'] == '404':
-                self.create_db()
-                if not self.is_lambda:
-                    self.upload_to_s3()
-            else:
-                logging.error(f"AWS S3 error: {e}")
+            self._restore_from_s3()
+        finally:
+            self.file_lock.acquire_shared()
+    
+    def _restore_from_s3(self):
+        remote = remote_generation(self.s3_client, self.s3_bucket, self.s3_key)
+        if remote is not None and last_row_id(self.local_db_path) <= 0:
+            download_path = self.local_db_path + '.download'
+            self.s3_client.download_file(self.s3_bucket, self.s3_key, download_path)
+            inc('s3_bytes', os.path.getsize(download_path), direction='download')
+            # Un WAL huérfano de una ejecución anterior no corresponde a la copia descargada
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(self.local_db_path + suffix):
+                    os.remove(self.local_db_path + suffix)
+            os.replace(download_path, self.local_db_path)
+            self._ensure_schema()
+            synced_id = last_row_id(self.local_db_path)
+            self.writer.submit(lambda conn: _set_sync_state(conn, generation=remote, synced_id=synced_id))
+            return
+        if not os.path.exists(self.local_db_path):
+            self.create_db()
+        if not self.is_lambda:
+            self.upload_to_s3()
+    
+    def _sync_state(self, remote):
+        """(generación de S3 incorporada o None si nunca se sincronizó, synced_id) respecto a `remote`."""
+        self._ensure_schema()
+        with self.pool.connection() as conn:
+            state = dict(conn.execute("SELECT name, value FROM sync_state").fetchall())
+        if remote is not None and remote == state.get('pending_generation'):
+            # Subida que terminó sin que llegara a apuntarse (caída entre put_versioned y sync_state)
+            return remote, state['pending_id']
+        return state.get('generation'), state.get('synced_id', 0)
+    
+    def _sync_to_s3(self, path):
+        """Sube un snapshot a `path` y después a S3 como la generación siguiente; False si S3 ya tenía todo.
+
+        Va entero bajo key_lock, así que dentro del proceso nadie más lee ni reemplaza el
+        objeto. Si S3 tiene una generación que la copia local no ha incorporado (la subió
+        otro host), antes se rebasa la copia local sobre ella (_rebase_on_remote): la subida
+        reemplaza el objeto, así que nunca se sube una copia a la que le falten filas remotas.
+        Entre hosts la comprobación y la subida no son atómicas (boto3 1.28 no tiene IfMatch).
+        """
+        with key_lock(self.s3_bucket, self.s3_key):
+            remote = remote_generation(self.s3_client, self.s3_bucket, self.s3_key)
+            generation, synced_id = self._sync_state(remote)
+            # Una copia remota sin generación no se sabe si es más nueva: se incorpora
+            if remote is not None and (generation is None or remote > generation or remote < 0 <= generation):
+                generation, synced_id = self._rebase_on_remote(remote, generation, synced_id)
+            self.snapshot(path)
+            last_id = last_row_id(path)
+            if remote is not None and remote == generation and last_id == synced_id:
+                return False
+            generation = max(generation if generation is not None else 0, remote or 0) + 1
+            self.writer.submit(lambda conn: _set_sync_state(conn, pending_generation=generation, pending_id=last_id))
+            try:
+                put_versioned(self.s3_client, self.s3_bucket, self.s3_key, path, generation)
+            except Exception:
+                self.writer.submit(lambda conn: _set_sync_state(conn, pending_generation=None, pending_id=None))
                 raise
+            self.writer.submit(lambda conn: _set_sync_state(conn, generation=generation, synced_id=last_id,
+                                                            pending_generation=None, pending_id=None))
+            return True
+    
+    def _rebase_on_remote(self, remote, generation, synced_id):
+        """Reescribe la base local como la copia de S3 más las filas locales que S3 no tiene.
+
+        Las filas remotas conservan su id; las locales con id > synced_id (las que nunca se
+        subieron) se vuelven a insertar detrás con ids nuevos, conservando su timestamp. Sin
+        estado de sincronización (base anterior a sync_state o copia remota sin generación)
+        synced_id es el prefijo de filas idénticas en ambas copias. Todo es una transacción
+        del hilo escritor: las lecturas concurrentes ven la copia anterior o la nueva.
+        Devuelve el nuevo (generation, synced_id).
+        """
+        download_path = self.local_db_path + '.merge'
+        self.s3_client.download_file(self.s3_bucket, self.s3_key, download_path)
+        try:
+            inc('s3_bytes', os.path.getsize(download_path), direction='download')
+            remote_rows = read_rows(download_path)
+        finally:
+            os.remove(download_path)
+        if generation is None or remote < 0:
+            synced_id = self._common_prefix(remote_rows)
+        remote_last = remote_rows[-1][0] if remote_rows else 0
+        fields = ', '.join(COLUMNS[1:])
+
+        def rebase(conn):
+            local_rows = conn.execute(f"SELECT {fields} FROM predictions WHERE id > ? ORDER BY id",
+                                      (synced_id,)).fetchall()
+            conn.execute("DELETE FROM predictions")
+            conn.executemany(f"INSERT INTO predictions ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                             remote_rows)
+            conn.executemany(f"INSERT INTO predictions ({fields}) VALUES ({', '.join('?' * (len(COLUMNS) - 1))})",
+                             local_rows)
+            # El trigger ya contó las filas insertadas, pero no las borradas: se rehace el resumen
+            conn.execute("DELETE FROM prediction_rollup")
+            conn.execute(ROLLUP_BACKFILL_SQL)
+            _set_sync_state(conn, generation=remote, synced_id=remote_last)
+
+        self._ensure_schema()
+        self.writer.submit(rebase)
+        self.rebases += 1
+        logging.warning(f"s3://{self.s3_bucket}/{self.s3_key} generation {remote} was newer than the local copy "
+                        f"({generation}): merged {len(remote_rows)} remote rows before uploading")
+        return remote, remote_last
+    
+    def _common_prefix(self, remote_rows):
+        """Mayor id hasta el que la base local y `remote_rows` tienen exactamente las mismas filas."""
+        with self.pool.connection() as conn:
+            local_rows = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM predictions ORDER BY id").fetchall()
+        prefix = 0
+        for mine, theirs in zip(local_rows, remote_rows):
+            if mine != theirs:
+                break
+            prefix = mine[0]
+        return prefix
     
     def setup_local_db(self):
         if not os.path.exists(self.local_db_path):
             self.create_db()
     
     def create_db(self):
-        conn = sqlite3.connect(self.local_db_path)
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS predictions (
-                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     gender TEXT,
-                     hemoglobin REAL,
-                     prediction TEXT,
-                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-        conn.commit()
-        conn.close()
+        with self.pool.connection() as conn:
+            c = conn.cursor()
+            c.execute(CREATE_TABLE_SQL)
+            conn.commit()
+        self._ensure_schema()
     
-    def save_prediction(self, gender, hemoglobin, prediction, is_aws):
-        """Guarda una predicción en la base de datos."""
-        conn = sqlite3.connect(self.local_db_path)
-        c = conn.cursor()
-        c.execute("INSERT INTO predictions (gender, hemoglobin, prediction) VALUES (?, ?, ?)", 
-                  (gender, hemoglobin, prediction))
-        conn.commit()
-        conn.close()
+    def _ensure_schema(self):
+        """Columnas tipadas, índices y resumen incremental; en bases antiguas se crean en el primer acceso.
+
+        El resumen se rellena con las filas existentes y el trigger se crea en la misma
+        transacción (BEGIN IMMEDIATE), así que ninguna inserción concurrente se pierde ni se
+        cuenta dos veces.
+        """
+        if self._schema_ready:
+            return
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(predictions)")}
+            for column, sql_type in EXTRA_COLUMNS:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE predictions ADD COLUMN {column} {sql_type}")
+            for sql in INDEX_SQL:
+                conn.execute(sql)
+            conn.execute(SYNC_STATE_SQL)
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'predictions_rollup_insert'").fetchone()
+            if not exists:
+                conn.execute(ROLLUP_TABLE_SQL)
+                conn.execute("DELETE FROM prediction_rollup")
+                conn.execute(ROLLUP_BACKFILL_SQL)
+                conn.execute(ROLLUP_TRIGGER_SQL)
+            conn.commit()
+        self._schema_ready = True
+    
+    def _insert(self, write):
+        """Aplica `write(conn)` en el hilo escritor; una base antigua sin las columnas nuevas se migra y se reintenta."""
+        try:
+            self.writer.submit(write)
+        except sqlite3.OperationalError as e:
+            if self._schema_ready or 'no column' not in str(e):
+                raise
+            self._ensure_schema()
+            self.writer.submit(write)
+    
+    @timed('save_prediction')
+    def save_prediction(self, gender, hemoglobin, prediction, is_aws, probability=None, features=None):
+        """Guarda una predicción con su probabilidad y las variables codificadas (`features`, por nombre)."""
+        row = prediction_row(gender, hemoglobin, prediction, probability, features)
+        self._insert(lambda conn: conn.cursor().execute(INSERT_ROW_SQL, row))
+        inc('db_writes')
         
-        if is_aws and not self.is_lambda:
-            self.upload_to_s3()
+        if is_aws and self.sync is not None:
+            self.sync.mark_dirty()
     
-    def upload_to_s3(self):
-        s3 = boto3.client('s3')
+    def save_predictions_bulk(self, rows):
+        """Guarda muchas predicciones en una sola transacción.
+
+        Cada fila es una tupla de prediction_rows/prediction_row o solo (gender, hemoglobin, prediction).
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        width = 3 + len(EXTRA_COLUMNS)
+        rows = [row if len(row) == width else tuple(row) + (None,) * (width - len(row)) for row in rows]
+        self._insert(lambda conn: conn.executemany(INSERT_ROW_SQL, rows))
+        inc('db_writes', len(rows))
+        
+        if self.sync is not None:
+            self.sync.mark_dirty(len(rows))
+        return len(rows)
+    
+    def snapshot(self, dest_path):
+        """Copia consistente de la base de datos (incluido el WAL) con la API de backup de SQLite."""
+        dst = sqlite3.connect(dest_path)
         try:
-            s3.upload_file(self.local_db_path, self.s3_bucket, self.s3_key)
-            logging.info("Database uploaded to S3 successfully")
-        except Exception as e:
-            logging.error(f"Failed to upload to S3: {e}")
+            with self.pool.connection() as conn:
+                conn.backup(dst)
+        finally:
+            dst.close()
     
-    def get_predictions(self):
-        conn = sqlite3.connect(self.local_db_path)
-        df = pd.read_sql_query("SELECT * FROM predictions", conn)
-        conn.close()
-        return df
+    @timed('upload_to_s3')
+    def upload_to_s3(self):
+        """Sube ya un snapshot completo, tras incorporar las filas que solo estén en S3 (_sync_to_s3)."""
+        # Con WAL el fichero principal puede no tener las últimas filas: se sube un snapshot
+        sync = self.sync or S3SyncWorker(self.snapshot, self.s3_client, self.s3_bucket, self.s3_key,
+                                         upload_fn=self._sync_to_s3)
+        return sync.flush(force=True)
+    
+    def sync_stats(self):
+        if self.sync is None:
+            return None
+        return dict(self.sync.stats(), rebases=self.rebases)
+    
+    def flush(self):
+        """Sube ya las escrituras pendientes (solo con sincronización S3 en segundo plano)."""
+        if self.sync is not None:
+            self.sync.flush()
+    
+    def get_predictions(self, limit=None, **filters):
+        """DataFrame con las predicciones que cumplen `filters`; sin `limit` lee todas (ver iter_predictions)."""
+        import pandas as pd  # Import diferido: solo las lecturas necesitan pandas
+        self._ensure_schema()
+        where, params = _where(**filters)
+        sql = f"{SELECT_ALL_SQL}{where} ORDER BY id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self.pool.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+    
+    def iter_predictions(self, batch_size=10_000, after_id=0, **filters):
+        """Itera las predicciones en páginas de `batch_size` tuplas (COLUMNS) por keyset sobre id.
+
+        Cada página es una consulta independiente (`id > último id visto`), así que la
+        memoria no depende del tamaño de la tabla y los escritores no quedan bloqueados.
+        """
+        self._ensure_schema()
+        after_id = after_id or 0  # None (sin cursor) empieza por el principio; id > ? va siempre el último
+        where, params = _where(after_id=after_id, **filters)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM predictions{where} ORDER BY id LIMIT ?"
+        while True:
+            params[-1] = after_id
+            with self.pool.connection() as conn:
+                rows = conn.execute(sql, params + [batch_size]).fetchall()
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1][0]
+    
+    def query_predictions(self, limit=100, after_id=0, **filters):
+        """Una página de resultados y el cursor (`after_id`) de la siguiente, o None si no hay más."""
+        page = next(self.iter_predictions(batch_size=limit, after_id=after_id, **filters), [])
+        next_after_id = page[-1][0] if len(page) == limit else None
+        return [dict(zip(COLUMNS, row)) for row in page], next_after_id
+    
+    def export_predictions(self, path, batch_size=50_000, **filters):
+        """Vuelca las predicciones a CSV o Parquet página a página; devuelve las filas escritas."""
+        return export_pages(self.iter_predictions(batch_size=batch_size, **filters), path)
+    
+    def _aggregate(self, sql, params):
+        import pandas as pd
+        self._ensure_schema()
+        with self.pool.connection() as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+    
+    def rollup_version(self):
+        """Último id insertado: cambia si y solo si cambia el resumen (la tabla solo crece)."""
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'predictions'").fetchone()
+        return row[0] if row else 0
+    
+    def get_rollup(self):
+        """Resumen diario completo (día, género, etiqueta) desde prediction_rollup."""
+        return self._aggregate("SELECT * FROM prediction_rollup ORDER BY day, gender, prediction", [])
+    
+    def daily_label_counts(self, **filters):
+        """Número de predicciones por día y etiqueta; sin rango de tiempo sale del resumen incremental."""
+        if filters.get('start') is None and filters.get('end') is None:
+            where, params = _where(gender=filters.get('gender'), label=filters.get('label'))
+            return self._aggregate(
+                f"SELECT day, prediction, SUM(count) AS count FROM prediction_rollup{where} "
+                "GROUP BY day, prediction ORDER BY day, prediction", params)
+        where, params = _where(**filters)
+        return self._aggregate(
+            f"SELECT date(timestamp) AS day, prediction, COUNT(*) AS count FROM predictions{where} "
+            "GROUP BY day, prediction ORDER BY day, prediction", params)
+    
+    def hemoglobin_stats_by_gender(self, **filters):
+        """count/mean/std/min/max de hemoglobina por género; sin rango de tiempo sale del resumen."""
+        if filters.get('start') is None and filters.get('end') is None:
+            where, params = _where(gender=filters.get('gender'), label=filters.get('label'))
+            sql = ("SELECT gender, SUM(hemoglobin_count) AS count, SUM(hemoglobin_sum) AS total, "
+                   "SUM(hemoglobin_sumsq) AS total_sq, MIN(hemoglobin_min) AS min, MAX(hemoglobin_max) AS max "
+                   f"FROM prediction_rollup{where} GROUP BY gender ORDER BY gender")
+        else:
+            where, params = _where(**filters)
+            sql = ("SELECT gender, COUNT(hemoglobin) AS count, SUM(hemoglobin) AS total, "
+                   "SUM(hemoglobin * hemoglobin) AS total_sq, MIN(hemoglobin) AS min, MAX(hemoglobin) AS max "
+                   f"FROM predictions{where} GROUP BY gender ORDER BY gender")
+        stats = self._aggregate(sql, params)
+        total, total_sq = stats.pop('total'), stats.pop('total_sq')
+        stats.insert(2, 'mean', total / stats['count'])
+        # SQLite no tiene STDDEV: varianza = E[x²] - E[x]²
+        stats.insert(3, 'std', (total_sq / stats['count'] - stats['mean'] ** 2).clip(lower=0) ** 0.5)
+        return stats
     
     def close(self):
-        if self.is_aws and not self.is_lambda:
-            self.upload_to_s3()
\ No newline at end of file
+        """Aplica las escrituras encoladas, vacía la cola de sincronización y cierra las conexiones."""
+        # La última subida todavía escribe en la base (sync_state): el escritor se detiene después
+        if self.sync is not None:
+            self.sync.stop(flush=True)
+        self.writer.stop()
+        self.pool.close()
+        if self.file_lock is not None:
+            self.file_lock.release()
+
+def open_prediction_store(is_aws, is_lambda, kind=None):
+    """DatabaseManager (predictions.db) o, con PREDICTION_STORE=segments, segment_store.SegmentStore."""
+    kind = kind or os.environ.get('PREDICTION_STORE', 'sqlite')
+    if kind == 'segments':
+        from segment_store import SegmentStore
+        return SegmentStore.for_environment(is_aws, is_lambda)
+    if kind != 'sqlite':
+        raise ValueError(f"Unknown PREDICTION_STORE {kind!r}: expected 'sqlite' or 'segments'")
+    return DatabaseManager(is_aws, is_lambda)
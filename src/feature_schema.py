@@ -0,0 +1,186 @@
+"""Esquema de las 24 variables de entrada compartido por la UI, el scoring por lotes y la API.
+
+FEATURE_SPECS declara una sola vez el tipo, el rango válido, la codificación de las
+categóricas y el slider del formulario de cada variable. encode_features valida y codifica
+columnas enteras con NumPy (un DataFrame de 1M filas se valida en una pasada, no fila a
+fila) y devuelve, además de la matriz, una máscara de errores por fila y variable.
+
+Este módulo no importa Streamlit ni pandas para que las rutas sin UI (API, Lambda) lo carguen rápido.
+"""
+import numpy as np
+
+CLASS_DICT = {"0": "Non-Smoker", "1": "Smoker"}
+NUM_VARIABLES = ['gender', 'Gtp', 'hemoglobin', 'height(cm)', 'triglyceride', 'waist(cm)', 'LDL', 'HDL',
+                 'Cholesterol', 'ALT', 'fasting blood sugar', 'systolic', 'AST', 'relaxation', 'weight(kg)',
+                 'age', 'serum creatinine', 'eyesight(left)', 'eyesight(right)', 'tartar', 'dental caries',
+                 'Urine protein', 'hearing(left)', 'hearing(right)']
+
+def _number(label, lo, hi, slider, dtype='float'):
+    return {'dtype': dtype, 'label': label, 'min': lo, 'max': hi, 'slider': slider}
+
+def _category(label, encoding):
+    return {'dtype': 'category', 'label': label, 'encoding': encoding}
+
+# 'min'/'max' es el rango válido: cubre los valores del dataset de entrenamiento, por eso es
+# más amplio que algunos sliders. 'slider' es (mínimo, máximo, valor inicial) del formulario.
+# Las categóricas aceptan la etiqueta del formulario o el código ya codificado.
+FEATURE_SPECS = {
+    'gender': _category("Gender", {'F': 0, 'M': 1}),
+    'Gtp': _number("Gtp", 1.0, 999.0, (1.0, 996.0, 100.0)),
+    'hemoglobin': _number("Hemoglobin", 4.0, 22.0, (7.4, 18.7, 12.0)),
+    'height(cm)': _number("Height (cm)", 100.0, 230.0, (100.0, 230.0, 170.0)),
+    'triglyceride': _number("Triglycerides", 8.0, 1029.0, (31.0, 1029.0, 150.0)),
+    'waist(cm)': _number("Waist (cm)", 50.0, 150.0, (80.0, 102.0, 90.0)),
+    'LDL': _number("LDL", 1.0, 2000.0, (70.0, 300.0, 100.0)),
+    'HDL': _number("HDL", 1.0, 700.0, (20.0, 300.0, 50.0)),
+    'Cholesterol': _number("Cholesterol", 50.0, 700.0, (70.0, 700.0, 200.0)),
+    'ALT': _number("ALT", 1.0, 3000.0, (1.0, 996.0, 20.0)),
+    'fasting blood sugar': _number("Fasting Blood Sugar", 0.0, 600.0, (0.0, 126.0, 90.0)),
+    'systolic': _number("Systolic", 0.0, 260.0, (0.0, 140.0, 120.0)),
+    'AST': _number("AST", 1.0, 1600.0, (10.0, 1543.0, 25.0)),
+    'relaxation': _number("Relaxation", 0.0, 160.0, (0.0, 120.0, 80.0)),
+    'weight(kg)': _number("Weight (kg)", 20.0, 300.0, (35.0, 300.0, 70.0)),
+    'age': _number("Age", 0.0, 120.0, (0.0, 100.0, 30.0)),
+    'serum creatinine': _number("Serum Creatinine", 0.1, 12.0, (0.27, 6.81, 1.0)),
+    'eyesight(left)': _number("Eyesight (Left)", 0.0, 10.0, (0.0, 2.0, 1.0)),
+    'eyesight(right)': _number("Eyesight (Right)", 0.0, 10.0, (0.0, 2.0, 1.0)),
+    'tartar': _category("Tartar", {'No': 0, 'Yes': 1}),
+    'dental caries': _category("Dental Caries", {'No': 0, 'Yes': 1}),
+    'Urine protein': _number("Urine Protein", 1.0, 6.0, (1.0, 6.0, 1.0), dtype='int'),
+    'hearing(left)': _category("Hearing (Left)", {'Normal': 1, 'Difficulty': 2}),
+    'hearing(right)': _category("Hearing (Right)", {'Normal': 1, 'Difficulty': 2}),
+}
+
+FEATURES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        name: ({"enum": sorted(set(spec['encoding'].values()))} if spec['dtype'] == 'category'
+               else {"type": "integer" if spec['dtype'] == 'int' else "number", "minimum": spec['min'], "maximum": spec['max']})
+        for name, spec in FEATURE_SPECS.items()
+    },
+    "required": list(NUM_VARIABLES),
+    "additionalProperties": False,
+}
+
+def default_features():
+    """Valores iniciales del formulario, ya codificados (calentamiento y ejemplos)."""
+    return {name: float(next(iter(spec['encoding'].values()))) if spec['dtype'] == 'category' else spec['slider'][2]
+            for name, spec in FEATURE_SPECS.items()}
+
+def feature_order(*estimators):
+    """Orden de columnas del primer estimador entrenado con nombres (feature_names_in_).
+
+    Se calcula una vez al cargar el modelo; sin nombres se asume NUM_VARIABLES.
+    """
+    for estimator in estimators:
+        names = getattr(estimator, 'feature_names_in_', None)
+        if not isinstance(names, (list, tuple, np.ndarray)):
+            continue
+        names = [str(name) for name in names]
+        if sorted(names) != sorted(NUM_VARIABLES):
+            raise ValueError(f"Model features do not match the schema: {sorted(set(names) ^ set(NUM_VARIABLES))}")
+        return names
+    return list(NUM_VARIABLES)
+
+def _to_float(values):
+    """Array float64; lo que no es un número (texto, None, bool) pasa a NaN."""
+    if values.dtype.kind in 'iuf':
+        return values.astype(np.float64)
+    if values.dtype.kind != 'O':
+        return np.full(values.shape, np.nan)
+    return np.fromiter((v if isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)) else np.nan
+                        for v in values), dtype=np.float64, count=len(values))
+
+def _encode_column(values, spec):
+    values = np.asarray(values)
+    out = _to_float(values)
+    if spec['dtype'] == 'category':
+        if values.dtype.kind in 'OUS':
+            for label, code in spec['encoding'].items():
+                out[values == label] = code
+        ok = np.zeros(out.shape, dtype=bool)
+        for code in set(spec['encoding'].values()):
+            ok |= out == code
+        bad = ~ok
+    else:
+        bad = ~((out >= spec['min']) & (out <= spec['max']))  # NaN también es inválido
+        if spec['dtype'] == 'int':
+            bad |= out != np.floor(out)
+    out[bad] = np.nan
+    return out, bad
+
+def encode_features(data, columns=None):
+    """Valida y codifica columnas completas.
+
+    `data` es un DataFrame o un dict columna -> secuencia. Devuelve (X, errors): X es float64
+    de forma (filas, variables) en el orden de `columns` (por defecto NUM_VARIABLES), y errors
+    una máscara booleana de la misma forma; una fila es válida si errors[i].any() es False.
+    """
+    columns = list(columns or NUM_VARIABLES)
+    missing = [name for name in columns if name not in data]
+    if missing:
+        raise ValueError(f"Missing columns: {missing}")
+    n = len(data[columns[0]])
+    X = np.empty((n, len(columns)), dtype=np.float64)
+    errors = np.empty((n, len(columns)), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        for j, name in enumerate(columns):
+            X[:, j], errors[:, j] = _encode_column(data[name], FEATURE_SPECS[name])
+    return X, errors
+
+def describe_errors(record, error_row, columns=None):
+    """Mensajes de error de una fila (`record`, dict original) a partir de su máscara."""
+    messages = []
+    for name, bad in zip(columns or NUM_VARIABLES, error_row):
+        if not bad:
+            continue
+        spec = FEATURE_SPECS[name]
+        value = record.get(name)
+        if spec['dtype'] == 'category':
+            messages.append(f"{name} must be one of {list(spec['encoding']) + sorted(set(spec['encoding'].values()))}")
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            messages.append(f"{name} must be a number")
+        elif spec['dtype'] == 'int' and spec['min'] <= value <= spec['max'] and not float(value).is_integer():
+            messages.append(f"{name} must be an integer")
+        else:
+            messages.append(f"{name} must be between {spec['min']:g} and {spec['max']:g}")
+    return messages
+
+def validate_instances(instances, columns=None):
+    """Valida una lista de objetos JSON y devuelve la matriz codificada (filas x variables).
+
+    Lanza ValueError con los problemas de las primeras filas inválidas.
+    """
+    if not isinstance(instances, list) or not all(isinstance(features, dict) for features in instances):
+        raise ValueError("features must be an object")
+    for i, features in enumerate(instances):
+        if features.keys() != FEATURE_SPECS.keys():
+            missing = [name for name in NUM_VARIABLES if name not in features]
+            unknown = [name for name in features if name not in FEATURE_SPECS]
+            problems = ([f"missing features: {missing}"] if missing else []) + ([f"unknown features: {unknown}"] if unknown else [])
+            if problems:
+                raise ValueError(_prefix(i, len(instances)) + "; ".join(problems))
+    columns = list(columns or NUM_VARIABLES)
+    data = {}
+    for name in columns:
+        values = [features[name] for features in instances]
+        if set(map(type, values)) <= {int, float}:
+            data[name] = np.array(values, dtype=np.float64)  # Caso habitual: solo números
+        else:
+            data[name] = np.empty(len(values), dtype=object)
+            data[name][:] = values
+    X, errors = encode_features(data, columns)
+    invalid = np.flatnonzero(errors.any(axis=1))
+    if invalid.size:
+        raise ValueError(" | ".join(_prefix(i, len(instances)) + "; ".join(describe_errors(instances[i], errors[i], columns))
+                                   for i in invalid[:5]))
+    return X
+
+def _prefix(i, n):
+    return f"instance {i}: " if n > 1 else ""
+
+def validate_features(features):
+    """Valida un objeto de variables contra FEATURES_SCHEMA y devuelve la fila en orden NUM_VARIABLES."""
+    if not isinstance(features, dict):
+        raise ValueError("features must be an object")
+    return validate_instances([features])[0].tolist()
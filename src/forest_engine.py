@@ -0,0 +1,330 @@
+"""Motor de inferencia del random forest sobre arrays NumPy contiguos.
+
+El RandomForestClassifier de sklearn se aplana una sola vez (al cargar) en arrays
+feature/threshold/left/right/value con todos los árboles, y se evalúa de forma
+vectorizada sobre el lote completo: sin validación por llamada ni despacho por árbol.
+El StandardScaler puede plegarse en los umbrales, así que la entrada son las variables
+sin escalar y el paso de transform desaparece. Sobre los mismos arrays, contributions()
+descompone cada probabilidad por variable siguiendo el camino de la fila en cada árbol.
+
+Los arrays se guardan como .npy sin pickle en `<modelo>.forest/` y se abren con
+np.load(mmap_mode='r'): todos los procesos (réplicas de Streamlit, workers de batch)
+comparten una única copia en la page cache en lugar de deserializar cada uno el bosque.
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import numpy as np
+
+CHUNK_ROWS = 8192
+FORMAT_VERSION = 1
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'is_leaf')
+
+def _scaled_le(x, mean, scale, t):
+    # Misma aritmética que StandardScaler.transform + el cast a float32 de los árboles de sklearn
+    return ((x - mean) / scale).astype(np.float32) <= t
+
+def fold_thresholds(threshold, mean, scale):
+    """Umbral en espacio sin escalar T tal que x <= T  <=>  float32((x - mean) / scale) <= threshold."""
+    approx = threshold * scale + mean
+    width = np.abs(np.spacing(threshold.astype(np.float32)).astype(np.float64)) * scale * 4 + np.abs(np.spacing(approx)) * 4
+    lo, hi = approx - width, approx + width
+    # Ampliar el intervalo hasta que contenga el punto de corte
+    for _ in range(64):
+        bad = ~_scaled_le(lo, mean, scale, threshold) | _scaled_le(hi, mean, scale, threshold)
+        if not bad.any():
+            break
+        width = np.where(bad, width * 2, width)
+        lo, hi = approx - width, approx + width
+    # Bisección vectorizada sobre float64 hasta que lo y hi sean consecutivos
+    for _ in range(200):
+        mid = lo + (hi - lo) / 2
+        active = (mid > lo) & (mid < hi)
+        if not active.any():
+            break
+        go_up = _scaled_le(mid, mean, scale, threshold)
+        lo = np.where(active & go_up, mid, lo)
+        hi = np.where(active & ~go_up, mid, hi)
+    return lo
+
+class CompiledForest:
+    def __init__(self, feature, threshold, left, right, value, roots, classes, n_features, max_depth, is_leaf=None,
+                 feature_names=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.max_depth = max_depth
+        self.is_leaf = left == np.arange(left.shape[0]) if is_leaf is None else is_leaf
+        self.path = None
+        self._node_values = {}  # índice de clase -> columna contigua de value
+        self._expected = {}
+        # Orden de columnas de la entrada (el del scaler plegado); feature_schema.feature_order lo usa
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object) if feature_names is not None else None
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        """Aplana un RandomForestClassifier ya entrenado; con `scaler`, pliega el StandardScaler."""
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests are supported")
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            idx = np.arange(n) + offset
+            # Las hojas apuntan a sí mismas y tienen umbral infinito
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, idx, tree.children_left + offset))
+            rights.append(np.where(is_leaf, idx, tree.children_right + offset))
+            proba = tree.value[:, 0, :].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        feature = np.concatenate(features).astype(np.intp)
+        threshold = np.concatenate(thresholds).astype(np.float64)
+        if scaler is not None:
+            mean = getattr(scaler, 'mean_', None)
+            scale = getattr(scaler, 'scale_', None)
+            mean = np.zeros(model.n_features_in_) if mean is None else np.asarray(mean, dtype=np.float64)
+            scale = np.ones(model.n_features_in_) if scale is None else np.asarray(scale, dtype=np.float64)
+            split = np.isfinite(threshold)
+            threshold[split] = fold_thresholds(threshold[split], mean[feature[split]], scale[feature[split]])
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(model.classes_),
+            n_features=model.n_features_in_,
+            max_depth=max_depth,
+            feature_names=_feature_names(scaler, model),
+        )
+
+    def save(self, path, source=None):
+        """Escribe los arrays como .npy en el directorio `path` (se sustituye de forma atómica)."""
+        parent = os.path.dirname(os.path.abspath(path))
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.' + os.path.basename(path) + '.tmp-')
+        try:
+            for name in ARRAYS:
+                np.save(os.path.join(tmp_dir, name + '.npy'), np.ascontiguousarray(getattr(self, name)))
+            meta = {'format': FORMAT_VERSION, 'classes': self.classes_.tolist(), 'n_features': int(self.n_features_in_),
+                    'max_depth': int(self.max_depth), 'source': source,
+                    'feature_names': None if self.feature_names_in_ is None else self.feature_names_in_.tolist()}
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump(meta, f, indent=2)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.rename(tmp_dir, path)
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Abre un bosque guardado con save(); con mmap_mode='r' los arrays no se copian a memoria."""
+        meta = read_meta(path)
+        if meta is None or meta.get('format') != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a compiled forest (format {FORMAT_VERSION})")
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+                  for name in ARRAYS}
+        forest = cls(classes=np.asarray(meta['classes']), n_features=meta['n_features'], max_depth=meta['max_depth'],
+                     feature_names=meta.get('feature_names'), **arrays)
+        forest.path = path if mmap_mode else None
+        return forest
+
+    def __reduce__(self):
+        # Un bosque mapeado viaja a otros procesos como su ruta: cada uno mapea los mismos ficheros
+        if self.path is not None:
+            return (type(self).load, (self.path,))
+        return (_rebuild, (type(self), {name: getattr(self, name) for name in ARRAYS},
+                           self.classes_, self.n_features_in_, self.max_depth, self.feature_names_in_))
+
+    def prefault(self):
+        """Lee un byte de cada página de los arrays: un bosque mapeado queda entero en memoria."""
+        touched = 0
+        for name in ARRAYS:
+            data = np.ascontiguousarray(getattr(self, name)).reshape(-1).view(np.uint8)
+            touched += int(data[::mmap.PAGESIZE].sum(dtype=np.int64))
+        return touched
+
+    def leaves(self, X):
+        """Índice de hoja (global) de cada fila en cada árbol, shape (n_rows, n_trees)."""
+        n, n_trees = X.shape[0], self.roots.shape[0]
+        x_flat = np.ascontiguousarray(X).ravel()
+        nodes = np.tile(self.roots, n)
+        row_offset = np.repeat(np.arange(n, dtype=np.intp) * X.shape[1], n_trees)
+        # Solo se avanzan los pares (fila, árbol) que aún no han llegado a una hoja
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            go_left = x_flat[row_offset[active] + self.feature[current]] <= self.threshold[current]
+            nxt = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = nxt
+            active = active[~self.is_leaf[nxt]]
+        return nodes.reshape(n, n_trees)
+
+    def _as_array(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, expected {self.n_features_in_}")
+        return X
+
+    def predict_proba(self, X):
+        X = self._as_array(X)
+        out = np.empty((X.shape[0], self.value.shape[1]))
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            nodes = self.leaves(X[start:start + CHUNK_ROWS])
+            # Se acumula árbol a árbol, en el mismo orden que sklearn, para obtener los mismos empates
+            proba = self.value[nodes[:, 0]].copy()
+            for t in range(1, nodes.shape[1]):
+                proba += self.value[nodes[:, t]]
+            out[start:start + CHUNK_ROWS] = proba / nodes.shape[1]
+        return out
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    def class_index(self, label='1'):
+        """Columna de predict_proba de la clase `label` (la última si no existe)."""
+        matches = np.flatnonzero(self.classes_.astype(str) == str(label))
+        return int(matches[0]) if matches.size else self.value.shape[1] - 1
+
+    def _node_value(self, k):
+        if k not in self._node_values:
+            self._node_values[k] = np.ascontiguousarray(self.value[:, k])
+        return self._node_values[k]
+
+    def expected_value(self, k=None):
+        """Probabilidad media de las raíces: la línea base de contributions(), calculada una vez."""
+        k = self.class_index() if k is None else k
+        if k not in self._expected:
+            self._expected[k] = float(self._node_value(k)[self.roots].mean())
+        return self._expected[k]
+
+    def contributions(self, X, k=None):
+        """Contribución de cada variable a la probabilidad de la clase `k` (por defecto '1'), shape (n_rows, n_features).
+
+        Descomposición por caminos: cada nodo de decisión atribuye a su variable el cambio de
+        probabilidad entre el nodo y el hijo por el que baja la fila. Por construcción,
+        expected_value(k) + contributions(X, k).sum(axis=1) == predict_proba(X)[:, k].
+        Se recorre por bloques de CHUNK_ROWS filas con el mismo avance vectorizado que leaves().
+        """
+        X = self._as_array(X)
+        k = self.class_index() if k is None else k
+        node_value = self._node_value(k)
+        n_features, n_trees = self.n_features_in_, self.roots.shape[0]
+        out = np.empty((X.shape[0], n_features))
+        for start in range(0, X.shape[0], CHUNK_ROWS):
+            chunk = np.ascontiguousarray(X[start:start + CHUNK_ROWS])
+            n = chunk.shape[0]
+            x_flat = chunk.ravel()
+            nodes = np.tile(self.roots, n)
+            row_offset = np.repeat(np.arange(n, dtype=np.intp) * n_features, n_trees)
+            totals = np.zeros(n * n_features)
+            active = np.flatnonzero(~self.is_leaf[nodes])
+            while active.size:
+                current = nodes[active]
+                cell = row_offset[active] + self.feature[current]
+                go_left = x_flat[cell] <= self.threshold[current]
+                nxt = np.where(go_left, self.left[current], self.right[current])
+                totals += np.bincount(cell, weights=node_value[nxt] - node_value[current], minlength=totals.shape[0])
+                nodes[active] = nxt
+                active = active[~self.is_leaf[nxt]]
+            out[start:start + n] = totals.reshape(n, n_features) / n_trees
+        return out
+
+def _rebuild(cls, arrays, classes, n_features, max_depth, feature_names=None):
+    return cls(classes=classes, n_features=n_features, max_depth=max_depth, feature_names=feature_names, **arrays)
+
+def _feature_names(*estimators):
+    for estimator in estimators:
+        names = getattr(estimator, 'feature_names_in_', None)
+        if names is not None:
+            return [str(name) for name in names]
+    return None
+
+def read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+class IdentityScaler:
+    """Sustituye al StandardScaler cuando ya está plegado en los umbrales del bosque."""
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64)
+
+def explain(forest, X, columns):
+    """(contributions, expected_value) de P(clase '1') para X con columnas en el orden `columns`."""
+    names = forest.feature_names_in_
+    if names is None or list(names) == list(columns):
+        return forest.contributions(X), forest.expected_value()
+    # El bosque espera otro orden: se reordena la entrada y se devuelve en el de `columns`
+    position = {name: i for i, name in enumerate(columns)}
+    order = np.asarray([position[name] for name in names])
+    contributions = np.empty((len(X), len(columns)))
+    contributions[:, order] = forest.contributions(np.asarray(X)[:, order])
+    return contributions, forest.expected_value()
+
+def explainer_for(model, scaler):
+    """CompiledForest sobre el que calcular contributions(): el propio modelo si ya está compilado."""
+    if isinstance(model, CompiledForest):
+        return model
+    return CompiledForest.from_sklearn(model, scaler)
+
+def compile_model(model, scaler):
+    """Devuelve un par (modelo, scaler) equivalente que usa el motor compilado."""
+    return CompiledForest.from_sklearn(model, scaler), IdentityScaler()
+
+def compiled_path(model_path):
+    """Directorio del bosque compilado que acompaña a un .pkl."""
+    return os.path.splitext(model_path)[0] + '.forest'
+
+def _source_key(model_path, scaler_path):
+    # Tamaño y mtime bastan para detectar un .pkl nuevo sin leerlo entero en cada arranque
+    return {os.path.basename(p): [os.stat(p).st_size, os.stat(p).st_mtime_ns] for p in (model_path, scaler_path)}
+
+def load_compiled(model_path, scaler_path, mmap_mode='r'):
+    """Par (CompiledForest mapeado, IdentityScaler) para un modelo y scaler pickle.
+
+    Si `<modelo>.forest/` no existe o es de otro .pkl, se compila una vez y se guarda; los
+    demás procesos lo abren directamente. Sin permiso de escritura se sirve en memoria.
+    """
+    path = compiled_path(model_path)
+    source = _source_key(model_path, scaler_path)
+    meta = read_meta(path)
+    if meta is None or meta.get('format') != FORMAT_VERSION or meta.get('source') != source:
+        from data_utils import load_model_and_scaler
+        resources = load_model_and_scaler(model_path, scaler_path)
+        if resources is None:
+            return None
+        forest, identity = compile_model(*resources)
+        try:
+            forest.save(path, source=source)
+            logging.info(f"Compiled forest written to {path}")
+        except OSError as e:
+            # Otro proceso pudo adelantarse con el mismo .pkl; si no, se sirve desde memoria
+            if (read_meta(path) or {}).get('source') != source:
+                logging.warning(f"Could not write compiled forest to {path}, serving it from memory: {e}")
+                return forest, identity
+    return CompiledForest.load(path, mmap_mode=mmap_mode), IdentityScaler()
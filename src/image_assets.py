@@ -0,0 +1,178 @@
+"""Renditions redimensionadas y comprimidas de las imágenes de las páginas Home y Relevant Data.
+
+Cada imagen se decodifica una sola vez por contenido (clave: sha256 del fichero) y se
+codifica a WebP y a PNG/JPEG en los anchos de WIDTHS, sin pasar nunca del ancho original.
+Un PNG con alfa opaco se convierte a RGB y se cuantiza a 256 colores. Las páginas piden
+la rendition más pequeña que cubre el ancho mostrado.
+
+Streamlit 1.28 vuelve a codificar en st.image todo lo que no sea JPEG/PNG. Por eso:
+- Con static serving (server.enableStaticServing), las renditions se escriben en
+  static/renditions/<hash>-<ancho>.<ext>. Se sirven con un <picture> con srcset WebP y el
+  navegador elige el ancho; la URL cambia con el contenido, así que se cachea sin caducar.
+- Sin static serving, st.image recibe los bytes PNG/JPEG ya codificados y los sirve tal
+  cual.
+"""
+import hashlib
+import html
+import io
+import logging
+import os
+import threading
+import time
+from PIL import Image
+
+WIDTHS = (320, 640, 960)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'renditions')
+STATIC_URL = 'app/static/renditions'
+EXTENSIONS = {'WEBP': 'webp', 'PNG': 'png', 'JPEG': 'jpg'}
+
+class Rendition:
+    __slots__ = ('width', 'height', 'format', 'data', 'name')
+
+    def __init__(self, width, height, format, data, name):
+        self.width = width
+        self.height = height
+        self.format = format
+        self.data = data
+        self.name = name  # <hash>-<ancho>.<ext>: nombre del fichero estático
+
+    @property
+    def mimetype(self):
+        return f"image/{self.format.lower()}"
+
+def _encode(image, format):
+    buffer = io.BytesIO()
+    if format == 'WEBP':
+        image.save(buffer, format='WEBP', quality=WEBP_QUALITY, method=6)
+    elif format == 'JPEG':
+        image.convert('RGB').save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        # Gráficos: 256 colores bastan y reducen el PNG a la mitad o menos
+        palette = image.quantize(256) if image.mode == 'RGB' else image.quantize(256, method=Image.Quantize.FASTOCTREE)
+        palette.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def build_renditions(data, digest, widths=WIDTHS):
+    """Renditions WebP y PNG/JPEG (según el original) de una imagen codificada, de menor a mayor ancho."""
+    image = Image.open(io.BytesIO(data))
+    fallback = 'JPEG' if image.format == 'JPEG' else 'PNG'
+    image.load()
+    if image.mode == 'RGBA' and image.getextrema()[3][0] == 255:
+        image = image.convert('RGB')  # Canal alfa sin transparencias
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    renditions = []
+    for width in sorted({w for w in widths if w < image.width} | {image.width}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for format in ('WEBP', fallback):
+            renditions.append(Rendition(width, height, format, _encode(resized, format),
+                                        f"{digest}-{width}.{EXTENSIONS[format]}"))
+    return renditions
+
+class ImageAssets:
+    def __init__(self, widths=WIDTHS, static_dir=STATIC_DIR, static_url=STATIC_URL):
+        """Caché en memoria de renditions por contenido, compartida por todas las sesiones."""
+        self.widths = tuple(widths)
+        self.static_dir = static_dir
+        self.static_url = static_url
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._files = {}       # ruta -> ((mtime_ns, tamaño), hash)
+        self._renditions = {}  # hash -> renditions
+        self._written = set()  # hashes ya escritos en static_dir
+        self.builds = 0
+        self.hits = 0
+        self.build_seconds = 0.0
+
+    def _digest(self, path):
+        st = os.stat(path)
+        fingerprint = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._files.get(path)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1], None
+        with open(path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        with self._lock:
+            self._files[path] = (fingerprint, digest)
+        return digest, data
+
+    def renditions(self, path):
+        """Renditions del contenido actual de `path`; solo se generan si el contenido es nuevo."""
+        digest, data = self._digest(path)
+        with self._lock:
+            renditions = self._renditions.get(digest)
+            if renditions is not None:
+                self.hits += 1
+                return renditions
+        with self._build_lock:
+            with self._lock:
+                if digest in self._renditions:
+                    return self._renditions[digest]
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            start = time.perf_counter()
+            renditions = build_renditions(data, digest, self.widths)
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._renditions[digest] = renditions
+                self.builds += 1
+                self.build_seconds += elapsed
+        logging.info(f"Built {len(renditions)} renditions of {os.path.basename(path)} in {elapsed:.3f}s")
+        return renditions
+
+    def best(self, path, width, formats=('PNG', 'JPEG')):
+        """La rendition más pequeña de `formats` que cubre `width` píxeles (o la mayor, si ninguna llega)."""
+        candidates = [r for r in self.renditions(path) if r.format in formats]
+        return next((r for r in candidates if r.width >= width), candidates[-1])
+
+    def write_static(self, path):
+        """Escribe (una vez por contenido) las renditions de `path` en static_dir y las devuelve."""
+        renditions = self.renditions(path)
+        digest = renditions[0].name.split('-')[0]
+        with self._build_lock:
+            if digest not in self._written:
+                os.makedirs(self.static_dir, exist_ok=True)
+                for rendition in renditions:
+                    target = os.path.join(self.static_dir, rendition.name)
+                    if not os.path.exists(target):
+                        with open(target + '.tmp', 'wb') as f:
+                            f.write(rendition.data)
+                        os.replace(target + '.tmp', target)
+                self._written.add(digest)
+        return renditions
+
+    def picture_html(self, path, width, caption=''):
+        """<figure> con un <picture>: srcset WebP de todos los anchos y PNG/JPEG de respaldo."""
+        renditions = self.write_static(path)
+        fallback = self.best(path, width)
+        url = lambda r: f"{self.static_url}/{r.name}?v={r.name.split('-')[0]}"  # ?v=: caché sin caducidad
+        srcset = ', '.join(f"{url(r)} {r.width}w" for r in renditions if r.format == 'WEBP')
+        sizes = f"(max-width: {width}px) 100vw, {width}px"
+        caption = html.escape(caption)
+        return (f"<figure style='margin: 0 0 1rem 0; max-width: {width}px'>"
+                f"<picture><source type='image/webp' srcset='{srcset}' sizes='{sizes}'>"
+                f"<img src='{url(fallback)}' width='{fallback.width}' height='{fallback.height}' alt='{caption}' "
+                f"loading='lazy' style='width: 100%; height: auto'></picture>"
+                f"<figcaption style='text-align: center; color: rgba(49, 51, 63, 0.6); font-size: 14px'>{caption}"
+                f"</figcaption></figure>")
+
+    def warm(self, paths):
+        """Genera ya las renditions de `paths` (arranque); los ficheros que falten se ignoran."""
+        for path in paths:
+            try:
+                self.renditions(path)
+            except FileNotFoundError:
+                logging.warning(f"Image not found: {path}")
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {'images': len(self._renditions), 'builds': self.builds, 'hits': self.hits,
+                    'build_seconds': self.build_seconds,
+                    'bytes': sum(len(r.data) for rs in self._renditions.values() for r in rs)}
@@ -0,0 +1,111 @@
+"""Punto de entrada de AWS Lambda para scoring (sin Streamlit, PIL ni pandas).
+
+Solo se importa lo que necesita el scoring y de forma diferida. Modelo, scaler y base de
+datos se inicializan una vez por contenedor, en el ámbito del módulo, y se reutilizan en
+las invocaciones "warm". En Lambda el modelo y el scaler se descargan de S3 a /tmp con
+data_utils.fetch_asset (solo si cambiaron); en local se leen de MODEL_BASE_PATH.
+
+Con el registro por defecto (predictions.db) en Lambda no se sube nada: las predicciones
+quedan en /tmp/predictions.db y se pierden al reciclarse el contenedor. Con
+PREDICTION_STORE=segments, cada invocación compacta y sube sus filas al responder: el
+contenedor puede congelarse o reciclarse sin aviso, así que no se acumulan entre
+invocaciones. Cada petición deja su propio segmento Parquet (de 1 fila con "features") en
+s3://.../src/predictions/, y un host EC2 nuevo descarga y registra cada uno al abrir.
+
+Eventos aceptados (invocación directa o proxy de API Gateway en "body"):
+    {"features": {...}}          una fila con las 24 variables
+    {"instances": [{...}, ...]}  varias filas
+
+Handler: lambda_handler.handler
+"""
+import json
+import os
+import time
+
+IS_LAMBDA = 'AWS_LAMBDA_FUNCTION_NAME' in os.environ
+BUCKET_NAME = 'smoking-body-signals-data-dev'
+MODEL_ASSETS = (('model', 'src/random_forest_model_Default.pkl'), ('scaler', 'src/scaler.pkl'))
+
+# Estado del contenedor: sobrevive entre invocaciones mientras el entorno siga caliente
+_state = {}
+
+def _init():
+    """Carga modelo, scaler y DB una sola vez por contenedor y devuelve el estado."""
+    if _state:
+        return _state
+    start = time.perf_counter()
+    import warnings
+    from data_utils import fetch_asset, get_base_path, get_file_paths, load_model_and_scaler, load_manifest
+    # Las filas llegan como arrays sin nombres de columna; el aviso de sklearn no aporta nada aquí
+    warnings.filterwarnings("ignore", category=UserWarning, module="sklearn.base")
+
+    base_path = os.environ.get('MODEL_BASE_PATH', get_base_path(IS_LAMBDA, IS_LAMBDA))
+    paths = get_file_paths(base_path)
+    if IS_LAMBDA:
+        import boto3
+        s3 = boto3.client('s3')
+        manifest = load_manifest(base_path)
+        for key, s3_key in MODEL_ASSETS:
+            fetch_asset(s3, BUCKET_NAME, s3_key, paths[key], manifest.get(s3_key))
+    model, scaler = load_model_and_scaler(paths['model'], paths['scaler'])
+    if model is None:
+        raise RuntimeError(f"Model could not be loaded from {base_path}")
+
+    db = None
+    if os.environ.get('SAVE_PREDICTIONS', '1') == '1':
+        from db_utils import open_prediction_store
+        db = open_prediction_store(IS_LAMBDA, IS_LAMBDA)
+
+    from calibration import load_calibration
+    from feature_schema import NUM_VARIABLES, feature_order
+    # Posición en NUM_VARIABLES de cada columna que espera el modelo; se calcula una sola vez
+    order = [NUM_VARIABLES.index(name) for name in feature_order(scaler, model)]
+    # calibration.json junto al modelo (opcional): sin él, probabilidad del bosque y umbral 0.5
+    # Solo hay algo que subir al responder si el registro sincroniza con S3 (en Lambda, solo segments)
+    flush = db is not None and db.sync_stats() is not None
+    _state.update(model=model, scaler=scaler, db=db, flush=flush, order=order, calibration=load_calibration(paths['model']),
+                  init_seconds=time.perf_counter() - start)
+    return _state
+
+def _parse_event(event):
+    payload = event
+    if isinstance(event, dict) and 'body' in event:
+        payload = json.loads(event['body'] or 'null')
+    if not isinstance(payload, dict):
+        raise ValueError("event must be a JSON object")
+    if 'features' in payload:
+        return [payload['features']], True
+    instances = payload.get('instances')
+    if not isinstance(instances, list) or not instances:
+        raise ValueError("event needs 'features' or a non-empty 'instances' list")
+    return instances, False
+
+def _response(status, body):
+    return {'statusCode': status, 'headers': {'Content-Type': 'application/json'}, 'body': json.dumps(body)}
+
+def handler(event, context=None):
+    from feature_schema import validate_instances
+    cold = not _state
+    try:
+        instances, single = _parse_event(event)
+        X = validate_instances(instances)
+    except ValueError as e:
+        return _response(400, {'error': str(e)})
+
+    state = _init()
+    calibration = state['calibration']
+    labels, probabilities = calibration.predict(state['model'], state['scaler'].transform(X[:, state['order']]))
+    labels, probabilities = labels.tolist(), probabilities.tolist()
+    if state['db'] is not None:
+        from db_utils import prediction_rows
+        state['db'].save_predictions_bulk(prediction_rows(X, labels, probabilities))
+        if state['flush']:
+            state['db'].flush()  # El contenedor puede congelarse al responder: se sube ya
+
+    if single:
+        body = {'prediction': labels[0], 'probability': probabilities[0]}
+    else:
+        body = {'predictions': labels, 'probabilities': probabilities}
+    body['threshold'] = calibration.threshold
+    body['cold_start'] = cold
+    return _response(200, body)
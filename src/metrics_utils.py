@@ -0,0 +1,193 @@
+"""Métricas de proceso (contadores e histogramas de latencia) en formato texto de Prometheus.
+
+Con METRICS_ENABLED=0 los timers y contadores no hacen nada más que comprobar una bandera.
+PROFILE_SAMPLE_RATE (0..1) activa cProfile en esa fracción de peticiones y guarda los
+.prof en PROFILE_DIR (se abren con `python -m pstats` o snakeviz). Para muestreo externo
+sin tocar el código basta con `py-spy record --pid <pid>`; los hilos propios tienen nombre.
+"""
+import bisect
+import cProfile
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = 'smoking_'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimación del cuantil `q` como el límite superior del bucket que lo contiene."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(LATENCY_BUCKETS + (float('inf'),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float('inf')
+
+class MetricsRegistry:
+    def __init__(self, enabled=True):
+        """Contadores y histogramas con etiquetas, seguros entre hilos."""
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._histograms.setdefault(name, {}).setdefault(key, _Histogram()).observe(seconds)
+
+    def timer(self, name, **labels):
+        """Context manager que registra la duración del bloque en el histograma `name`."""
+        return _Timer(self, name, labels) if self.enabled else _NULL_TIMER
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """Resumen para el panel de administración: totales, tasas y p50/p99 por operación."""
+        with self._lock:
+            uptime = max(time.time() - self.started, 1e-9)
+            counters = {name: sum(series.values()) for name, series in self._counters.items()}
+            timings = {}
+            for name, series in self._histograms.items():
+                for key, h in series.items():
+                    timings[name + _format_labels(key)] = {
+                        'count': h.count,
+                        'mean_ms': h.total / h.count * 1000 if h.count else 0.0,
+                        'p50_ms': h.quantile(0.5) * 1000,
+                        'p99_ms': h.quantile(0.99) * 1000,
+                    }
+        return {
+            'uptime_seconds': uptime,
+            'counters': counters,
+            'rates': {name: value / uptime for name, value in counters.items()},
+            'timings': timings,
+        }
+
+    def render_prometheus(self):
+        """Exposición en formato texto de Prometheus (versión 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                metric = f'{PREFIX}{name}_total'
+                lines.append(f'# TYPE {metric} counter')
+                for key, value in series.items():
+                    lines.append(f'{metric}{_format_labels(key)} {value}')
+            for name, series in sorted(self._histograms.items()):
+                metric = f'{PREFIX}{name}_seconds'
+                lines.append(f'# TYPE {metric} histogram')
+                for key, h in series.items():
+                    cumulative = 0
+                    for bound, n in zip(LATENCY_BUCKETS, h.counts):
+                        cumulative += n
+                        lines.append(f'{metric}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+                    lines.append(f'{metric}_bucket{_format_labels(key, [("le", "+Inf")])} {h.count}')
+                    lines.append(f'{metric}_sum{_format_labels(key)} {h.total}')
+                    lines.append(f'{metric}_count{_format_labels(key)} {h.count}')
+        lines.append(f'# TYPE {PREFIX}uptime_seconds gauge')
+        lines.append(f'{PREFIX}uptime_seconds {time.time() - self.started}')
+        return '\n'.join(lines) + '\n'
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+registry = MetricsRegistry(enabled=os.environ.get('METRICS_ENABLED', '1') == '1')
+
+def inc(name, value=1, **labels):
+    registry.inc(name, value, **labels)
+
+def timer(name, **labels):
+    return registry.timer(name, **labels)
+
+def timed(name, **labels):
+    """Decorador: registra la duración de cada llamada en el histograma `name`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            with _Timer(registry, name, labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def profile_request(name, sample_rate=None, profile_dir=None):
+    """Perfila con cProfile una fracción `sample_rate` de peticiones y guarda el .prof."""
+    rate = float(os.environ.get('PROFILE_SAMPLE_RATE', '0')) if sample_rate is None else sample_rate
+    if rate <= 0 or random.random() >= rate:
+        yield None
+        return
+    profile_dir = profile_dir or os.environ.get('PROFILE_DIR', 'profiles')
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(profile_dir, f'{name}-{time.time_ns()}.prof'))
+        registry.inc('profiles_written', route=name)
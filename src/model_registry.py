@@ -0,0 +1,337 @@
+"""Registro de modelos con versión activa, recarga en caliente y scoring en sombra.
+
+Los bundles de train.py (random_forest_model_Default.pkl, scaler.pkl, calibration.json y
+bundle.json) viven en un directorio local (models/<versión>/) o bajo un prefijo S3
+(s3://bucket/prefijo/<versión>/).
+El fichero active.json de la raíz indica la versión activa y, opcionalmente, una candidata
+que se puntúa en sombra.
+
+ModelServer consulta el puntero cada `poll_interval` segundos y, si cambió, carga el nuevo
+par modelo/scaler en segundo plano y lo sustituye con una sola asignación: las peticiones en
+curso terminan con el par anterior y ninguna ve un modelo con el scaler de otra versión.
+
+Uso (desde src/; MODEL_REGISTRY=../models o MODEL_REGISTRY=s3://bucket/prefijo):
+    python model_registry.py list
+    python model_registry.py activate <versión> [--shadow <versión>]
+    python model_registry.py publish ../models/<versión>
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from calibration import load_calibration
+from feature_schema import feature_order
+from metrics_utils import inc
+
+POINTER_NAME = 'active.json'
+BUNDLE_NAME = 'bundle.json'
+
+class ModelHandle:
+    def __init__(self, version, model, scaler, bundle, path):
+        """Par modelo/scaler de una versión; nunca se modifica una vez creado."""
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.bundle = bundle
+        self.path = path
+        self.columns = feature_order(scaler, model)
+        self.calibration = load_calibration(self.paths[0])
+
+    @property
+    def paths(self):
+        return tuple(os.path.join(self.path, name) for name in ('random_forest_model_Default.pkl', 'scaler.pkl'))
+
+class ModelRegistry:
+    def __init__(self, location, s3_client=None, cache_dir=None):
+        """`location` es un directorio local o s3://bucket/prefijo."""
+        self.location = location
+        self._s3 = s3_client
+        if location.startswith('s3://'):
+            self.bucket, _, prefix = location[len('s3://'):].partition('/')
+            self.prefix = prefix.strip('/')
+            self.root = cache_dir or os.path.join(tempfile.gettempdir(), 'model_registry', self.bucket, self.prefix)
+        else:
+            self.bucket = None
+            self.root = location
+
+    @property
+    def is_s3(self):
+        return self.bucket is not None
+
+    @property
+    def s3_client(self):
+        if self._s3 is None:
+            import boto3
+            self._s3 = boto3.client('s3')
+        return self._s3
+
+    def _key(self, *parts):
+        return '/'.join(part for part in (self.prefix,) + parts if part)
+
+    def read_pointer(self):
+        """Contenido de active.json ({'active': ..., 'shadow': ...}) o {} si no existe."""
+        if self.is_s3:
+            from botocore.exceptions import ClientError
+            try:
+                body = self.s3_client.get_object(Bucket=self.bucket, Key=self._key(POINTER_NAME))['Body'].read()
+            except ClientError as e:
+                if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                    return {}
+                raise
+            return json.loads(body)
+        try:
+            with open(os.path.join(self.root, POINTER_NAME)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def set_active(self, version, shadow=None):
+        """Cambia la versión activa (y la candidata en sombra) de forma atómica."""
+        available = self.list_versions()
+        for v in filter(None, (version, shadow)):
+            if v not in available:
+                raise ValueError(f"Unknown model version {v}")
+        pointer = {'active': version, 'shadow': shadow, 'updated_at': time.time()}
+        if self.is_s3:
+            self.s3_client.put_object(Bucket=self.bucket, Key=self._key(POINTER_NAME), Body=json.dumps(pointer).encode())
+        else:
+            from data_utils import _atomic_write_json
+            _atomic_write_json(os.path.join(self.root, POINTER_NAME), pointer)
+        logging.info(f"Model registry {self.location}: active={version} shadow={shadow}")
+
+    def list_versions(self):
+        if self.is_s3:
+            prefix = f'{self.prefix}/' if self.prefix else ''
+            response = self.s3_client.list_objects_v2(Bucket=self.bucket, Prefix=prefix, Delimiter='/')
+            return sorted(p['Prefix'].rstrip('/').rsplit('/', 1)[-1] for p in response.get('CommonPrefixes', []))
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isfile(os.path.join(self.root, name, BUNDLE_NAME)))
+
+    def fetch(self, version):
+        """Directorio local con el bundle; en S3 solo se descargan los ficheros que cambiaron."""
+        path = os.path.join(self.root, version)
+        if not self.is_s3:
+            return path
+        from data_utils import fetch_asset
+        os.makedirs(path, exist_ok=True)
+        fetch_asset(self.s3_client, self.bucket, self._key(version, BUNDLE_NAME), os.path.join(path, BUNDLE_NAME))
+        with open(os.path.join(path, BUNDLE_NAME)) as f:
+            files = json.load(f)['files']
+        for name in files:
+            fetch_asset(self.s3_client, self.bucket, self._key(version, name), os.path.join(path, name))
+        return path
+
+    def load(self, version):
+        """Descarga (si hace falta), verifica los SHA-256 del bundle y deserializa el par."""
+        import joblib
+        from train import file_sha256
+        path = self.fetch(version)
+        with open(os.path.join(path, BUNDLE_NAME)) as f:
+            bundle = json.load(f)
+        for name, digest in bundle['files'].items():
+            if file_sha256(os.path.join(path, name)) != digest:
+                raise ValueError(f"Checksum mismatch for {name} in model version {version}")
+        model = joblib.load(os.path.join(path, 'random_forest_model_Default.pkl'))
+        scaler = joblib.load(os.path.join(path, 'scaler.pkl'))
+        return ModelHandle(version, model, scaler, bundle, path)
+
+    def publish(self, bundle_dir):
+        """Añade un bundle de train.py al registro; devuelve su versión."""
+        with open(os.path.join(bundle_dir, BUNDLE_NAME)) as f:
+            bundle = json.load(f)
+        version = bundle['version']
+        if self.is_s3:
+            # bundle.json al final: una versión solo aparece completa
+            for name in list(bundle['files']) + [BUNDLE_NAME]:
+                self.s3_client.upload_file(os.path.join(bundle_dir, name), self.bucket, self._key(version, name))
+        elif os.path.abspath(bundle_dir) != os.path.abspath(os.path.join(self.root, version)):
+            shutil.copytree(bundle_dir, os.path.join(self.root, version), dirs_exist_ok=True)
+        return version
+
+class ShadowScorer:
+    def __init__(self, candidate, max_queue=1000, log_every=100):
+        """Puntúa en un hilo aparte con la versión candidata y cuenta los desacuerdos.
+
+        submit() solo encola (put_nowait); si la cola está llena la petición se descarta
+        del análisis, así que el scoring en sombra nunca retrasa la predicción del usuario.
+        """
+        self.candidate = candidate
+        self.log_every = log_every
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.compared = 0
+        self.disagreements = 0
+        self.dropped = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name='shadow-scorer', daemon=True)
+        self._thread.start()
+
+    def submit(self, features, primary_label):
+        try:
+            self._queue.put_nowait((features, primary_label))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._compare(*item)
+            finally:
+                self._queue.task_done()
+
+    def _compare(self, features, primary_label):
+        try:
+            # La candidata puede haberse entrenado con otro orden de columnas
+            X = self.candidate.scaler.transform(features[self.candidate.columns])
+            # Con la calibración y el umbral de la candidata, como puntuaría si se activase
+            label = self.candidate.calibration.predict(self.candidate.model, X)[0][0]
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logging.error(f"Shadow scoring with {self.candidate.version} failed: {e}")
+            return
+        with self._lock:
+            self.compared += 1
+            self.disagreements += label != primary_label
+            compared, disagreements = self.compared, self.disagreements
+        inc('shadow_comparisons', version=self.candidate.version)
+        if label != primary_label:
+            inc('shadow_disagreements', version=self.candidate.version)
+        if compared % self.log_every == 0:
+            logging.info(f"Shadow {self.candidate.version}: {disagreements / compared:.2%} disagreement "
+                         f"over {compared} requests")
+
+    def drain(self, timeout=10.0):
+        """Espera a que se procese la cola (tests y apagado ordenado)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def stop(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.candidate.version,
+                'compared': self.compared,
+                'disagreements': self.disagreements,
+                'disagreement_rate': self.disagreements / self.compared if self.compared else 0.0,
+                'dropped': self.dropped,
+                'errors': self.errors,
+            }
+
+class ModelServer:
+    def __init__(self, registry, poll_interval=30.0):
+        """Mantiene cargada la versión activa del registro y la cambia en caliente."""
+        self.registry = registry
+        self.poll_interval = poll_interval
+        self.current = None
+        self.shadow = None
+        self.swaps = 0
+        self.poll_errors = 0
+        self.last_poll = None
+        self._poll_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self):
+        """Relee el puntero y cambia de versión si hace falta. Devuelve True si hubo cambio."""
+        with self._poll_lock:
+            pointer = self.registry.read_pointer()
+            self.last_poll = time.time()
+            active = pointer.get('active')
+            if not active:
+                if self.current is None:
+                    raise RuntimeError(f"No active model version in {self.registry.location}")
+                return False
+            swapped = False
+            if self.current is None or self.current.version != active:
+                handle = self.registry.load(active)
+                previous, self.current = self.current, handle  # Una sola asignación: cambio atómico
+                self.swaps += 1
+                swapped = True
+                logging.info(f"Serving model {active}" + (f" (was {previous.version})" if previous else ""))
+            self._update_shadow(pointer.get('shadow'))
+            return swapped
+
+    def _update_shadow(self, version):
+        if version == (self.shadow.candidate.version if self.shadow else None):
+            return
+        previous = self.shadow
+        self.shadow = ShadowScorer(self.registry.load(version)) if version else None
+        if previous is not None:
+            previous.stop()
+
+    def start(self):
+        """Carga la versión activa y arranca el sondeo en segundo plano."""
+        self.poll_once()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='model-registry-poll', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll_once()
+            except Exception as e:
+                # Se sigue sirviendo la versión cargada hasta el siguiente sondeo
+                self.poll_errors += 1
+                logging.error(f"Model registry poll failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self.shadow is not None:
+            self.shadow.stop()
+
+    def stats(self):
+        return {
+            'version': self.current.version if self.current else None,
+            'swaps': self.swaps,
+            'poll_errors': self.poll_errors,
+            'last_poll': self.last_poll,
+            'shadow': self.shadow.stats() if self.shadow else None,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--registry', default=os.environ.get('MODEL_REGISTRY', os.path.join('..', 'models')))
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='versiones disponibles y puntero activo')
+    activate = sub.add_parser('activate', help='cambia la versión activa')
+    activate.add_argument('version')
+    activate.add_argument('--shadow', help='versión candidata a puntuar en sombra')
+    publish = sub.add_parser('publish', help='añade un bundle de train.py al registro')
+    publish.add_argument('bundle_dir')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'list':
+        pointer = registry.read_pointer()
+        for version in registry.list_versions():
+            marks = [m for m, v in (('active', pointer.get('active')), ('shadow', pointer.get('shadow'))) if v == version]
+            print(f"{version} {' '.join(marks)}")
+    elif args.command == 'activate':
+        registry.set_active(args.version, shadow=args.shadow)
+    else:
+        print(registry.publish(args.bundle_dir))
+
+if __name__ == '__main__':
+    main()
@@ -1,103 +1,155 @@
+import os
+import tempfile
+import numpy as np
 import streamlit as st
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 import warnings
+from calibration import Calibration
+from feature_schema import FEATURE_SPECS, NUM_VARIABLES, describe_errors, encode_features, feature_order
+from forest_engine import explain
+from metrics_utils import inc, profile_request, timer
 warnings.filterwarnings("ignore", category=UserWarning, module="sklearn.base")  # Suprime el warning
 
-def prediction(db, model, scaler, is_aws):
-    """Maneja la sección de predicción de fumadores."""
+def score_features(model, scaler, df, calibration=None):
+    """Etiqueta y P(Smoker) (calibrada si hay calibración) de una fila con una sola pasada por el bosque."""
+    calibration = calibration or Calibration()
+    with timer('scaler_transform'):
+        X = scaler.transform(df)
+    with timer('model_predict'):
+        labels, probabilities = calibration.predict(model, X)
+    return labels[0], float(probabilities[0])
+
+# Disposición del formulario: (columna, variables); None = ancho completo
+FORM_LAYOUT = (
+    (0, ('gender', 'Gtp', 'hemoglobin', 'height(cm)')),
+    (1, ('triglyceride', 'waist(cm)', 'LDL')),
+    (0, ('HDL', 'Cholesterol', 'ALT')),
+    (1, ('fasting blood sugar', 'systolic', 'AST')),
+    (0, ('relaxation', 'weight(kg)', 'age')),
+    (1, ('serum creatinine', 'eyesight(left)', 'eyesight(right)', 'Urine protein')),
+    (None, ('hearing(left)', 'hearing(right)', 'tartar', 'dental caries')),
+)
+
+def _feature_input(spec):
+    """Selectbox o slider de una variable según su especificación en FEATURE_SPECS."""
+    if spec['dtype'] == 'category':
+        return st.selectbox(spec['label'], list(spec['encoding']))
+    low, high, default = spec['slider']
+    if spec['dtype'] == 'int':
+        return st.slider(spec['label'], low, high, default, step=1.0)
+    return st.slider(spec['label'], low, high, default)
+
+def explanation_chart(contributions, columns, top=8):
+    """Barras horizontales de las `top` variables con más peso, ordenadas por |contribución|."""
+    import altair as alt
+    order = np.argsort(-np.abs(contributions))[:top]
+    df = pd.DataFrame({
+        'feature': [FEATURE_SPECS[columns[i]]['label'] for i in order],
+        'contribution': contributions[order],
+        'direction': np.where(contributions[order] >= 0, 'Towards Smoker', 'Towards Non-Smoker'),
+    })
+    return alt.Chart(df).mark_bar().encode(
+        x=alt.X('contribution:Q', title='Contribution to smoking probability', axis=alt.Axis(format='+%')),
+        y=alt.Y('feature:N', title=None, sort=None),
+        color=alt.Color('direction:N', title=None, scale=alt.Scale(domain=['Towards Smoker', 'Towards Non-Smoker'],
+                                                                   range=['#E74C3C', '#2ECC71'])),
+        tooltip=['feature', alt.Tooltip('contribution:Q', format='+.1%')])
+
+def _show_explanation(explainer, X, columns):
+    try:
+        with timer('explain'):
+            contributions, baseline = explain(explainer, X, columns)
+    except Exception as e:
+        st.warning(f"Explanation unavailable: {e}")
+        return
+    st.markdown("**What drove this prediction**")
+    st.altair_chart(explanation_chart(contributions[0], columns), use_container_width=True)
+    # Las contribuciones explican la probabilidad del bosque, antes de la calibración
+    st.caption(f"Average forest probability {baseline:.0%}; the contributions of all biomarkers add up to this "
+               f"patient's uncalibrated forest probability of {baseline + contributions[0].sum():.0%}.")
+
+def _score_form(db, model, scaler, is_aws, cache, shadow, answers, X, columns, calibration, explainer=None):
+    """Puntúa la fila ya validada del formulario, la muestra y la guarda."""
+    df_scaled = pd.DataFrame(X, columns=columns)
+
+    try:
+        with profile_request('form'):
+            if cache is not None:
+                result_text, probability = cache.get_or_compute(
+                    X[0].tolist(), lambda: score_features(model, scaler, df_scaled, calibration))
+            else:
+                result_text, probability = score_features(model, scaler, df_scaled, calibration)
+            st.success(f"Prediction: **{result_text}**")
+            kind = "Calibrated smoking probability" if calibration.calibrated else "Smoking probability"
+            st.progress(probability, text=f"{kind}: {probability:.0%} (decision threshold {calibration.threshold:.0%})")
+            if explainer is not None:
+                _show_explanation(explainer, X, columns)
+            if shadow is not None:
+                shadow.submit(df_scaled, result_text)  # Solo encola: no añade latencia
+            db.save_prediction(answers['gender'], answers['hemoglobin'], result_text, is_aws,
+                               probability=probability, features=dict(zip(columns, X[0].tolist())))
+        inc('predictions', source='form')
+        st.session_state.predictions = st.session_state.get('predictions', 0) + 1
+        st.metric("Total Predictions", st.session_state.predictions)
+    except Exception as e:
+        st.error(f"Prediction Error: {e}")
+
+def prediction(db, model, scaler, is_aws, cache=None, shadow=None, columns=None, calibration=None, explainer=None):
+    """Maneja la sección de predicción de fumadores; `shadow` (ShadowScorer) recibe cada petición.
+
+    `columns` es el orden de variables del modelo (feature_order) y `calibration` su
+    calibración y umbral (calibration.load_calibration), ambos calculados al cargarlo.
+    Con `explainer` (forest_engine.CompiledForest) se muestran las contribuciones de cada variable.
+    """
     st.header("Smoking Prediction :no_smoking:")
     st.subheader("Enter Your Data for Analysis")
     st.markdown('<div class="medical-badge">PATIENT ASSESSMENT</div>', unsafe_allow_html=True)
-    
+    columns = columns or feature_order(scaler, model)
+    calibration = calibration or Calibration()
+
     with st.container():
         st.write("Enter patient biomarkers for smoking status prediction:")
-        
-        class_dict = {"0": "Non-Smoker", "1": "Smoker"}
-        num_variables = ['gender', 'Gtp', 'hemoglobin', 'height(cm)', 'triglyceride', 'waist(cm)', 'LDL', 'HDL',
-                         'Cholesterol', 'ALT', 'fasting blood sugar', 'systolic', 'AST', 'relaxation', 'weight(kg)',
-                         'age', 'serum creatinine', 'eyesight(left)', 'eyesight(right)', 'tartar', 'dental caries',
-                         'Urine protein', 'hearing(left)', 'hearing(right)']
 
         with st.form(key='prediction_form'):
-            col1, col2 = st.columns(2)
-            with col1:
-                gender = st.selectbox("Gender", ["F", "M"])
-                val2 = st.slider("Gtp", 1.0, 996.0, 100.0)
-                val3 = st.slider("Hemoglobin", 7.4, 18.7, 12.0)
-                val4 = st.slider("Height (cm)", 100.0, 230.0, 170.0)
-            with col2:
-                val5 = st.slider("Triglycerides", 31.0, 1029.0, 150.0)
-                val6 = st.slider("Waist (cm)", 80.0, 102.0, 90.0)
-                val7 = st.slider("LDL", 70.0, 300.0, 100.0)
-            with col1:
-                val8 = st.slider("HDL", 20.0, 300.0, 50.0)
-                val9 = st.slider("Cholesterol", 300.0, 700.0, 200.0)
-                val10 = st.slider("ALT", 1.0, 996.0, 20.0)
-            with col2:
-                val11 = st.slider("Fasting Blood Sugar", 0.0, 126.0, 90.0)
-                val12 = st.slider("Systolic", 0.0, 140.0, 120.0)
-                val13 = st.slider("AST", 10.0, 1543.0, 25.0)
-            with col1:
-                val14 = st.slider("Relaxation", 0.0, 120.0, 80.0)
-                val15 = st.slider("Weight (kg)", 35.0, 300.0, 70.0)
-                val16 = st.slider("Age", 0.0, 100.0, 30.0)
-            with col2:
-                val17 = st.slider("Serum Creatinine", 0.27, 6.81, 1.0)
-                val18 = st.slider("Eyesight (Left)", 0.0, 2.0, 1.0)
-                val19 = st.slider("Eyesight (Right)", 0.0, 2.0, 1.0)
-                val20 = st.slider("Urine Protein", 1.0, 6.0, 1.0)
-
-            hearing_left = st.selectbox("Hearing (Left)", ["Normal", "Difficulty"])
-            hearing_right = st.selectbox("Hearing (Right)", ["Normal", "Difficulty"])
-            tartar = st.selectbox("Tartar", ["No", "Yes"])
-            dental_caries = st.selectbox("Dental Caries", ["No", "Yes"])
+            form_columns = st.columns(2)
+            answers = {}
+            for position, names in FORM_LAYOUT:
+                with form_columns[position] if position is not None else st.container():
+                    for name in names:
+                        answers[name] = _feature_input(FEATURE_SPECS[name])
 
             if st.form_submit_button("Predict"):
-                gender_value = 1 if gender == "M" else 0
-                hearing_left_value = 1 if hearing_left == "Normal" else 2
-                hearing_right_value = 1 if hearing_right == "Normal" else 2
-                tartar_value = 0 if tartar == "No" else 1
-                dental_caries_value = 0 if dental_caries == "No" else 1
+                X, errors = encode_features({name: [value] for name, value in answers.items()}, columns)
+                if errors.any():
+                    st.error("Invalid input: " + "; ".join(describe_errors(answers, errors[0], columns)))
+                else:
+                    _score_form(db, model, scaler, is_aws, cache, shadow, answers, X, columns, calibration, explainer)
+
+    batch_prediction(db, model, scaler, calibration)
 
-                data = {
-                    "gender": [gender_value],
-                    "Gtp": [val2],
-                    "hemoglobin": [val3],
-                    "height(cm)": [val4],
-                    "triglyceride": [val5],
-                    "waist(cm)": [val6],
-                    "LDL": [val7],
-                    "HDL": [val8],
-                    "Cholesterol": [val9],
-                    "ALT": [val10],
-                    "fasting blood sugar": [val11],
-                    "systolic": [val12],
-                    "AST": [val13],
-                    "relaxation": [val14],
-                    "weight(kg)": [val15],
-                    "age": [val16],
-                    "serum creatinine": [val17],
-                    "eyesight(left)": [val18],
-                    "eyesight(right)": [val19],
-                    "tartar": [tartar_value],
-                    "dental caries": [dental_caries_value],
-                    "Urine protein": [val20],
-                    "hearing(left)": [hearing_left_value],
-                    "hearing(right)": [hearing_right_value]
-                }
-                df_scaled = pd.DataFrame(data, columns=num_variables)
+def batch_prediction(db, model, scaler, calibration=None):
+    """Scoring de ficheros CSV/Parquet completos subidos desde la página de predicción."""
+    from batch_scoring import score_file  # Import diferido: solo se usa al puntuar un fichero
 
+    with st.expander("Batch scoring (CSV / Parquet)"):
+        st.write(f"Upload a file with the {len(NUM_VARIABLES)} encoded biomarker columns.")
+        uploaded = st.file_uploader("Patients file", type=["csv", "parquet"])
+        if uploaded is not None and st.button("Score file"):
+            suffix = os.path.splitext(uploaded.name)[1]
+            with tempfile.TemporaryDirectory() as tmpdir:
+                input_path = os.path.join(tmpdir, f"input{suffix}")
+                output_path = os.path.join(tmpdir, f"scored{suffix}")
+                with open(input_path, 'wb') as f:
+                    f.write(uploaded.getbuffer())
                 try:
-                    if hasattr(model, 'feature_names_in_'):
-                        if not all(col in model.feature_names_in_ for col in df_scaled.columns):
-                            st.warning("Feature names may not match the trained model.")
-                    data_normalized = scaler.transform(df_scaled)
-                    prediction_result = model.predict(data_normalized)[0]
-                    result_text = class_dict[str(prediction_result)]
-                    st.success(f"Prediction: **{result_text}**")
-                    db.save_prediction(gender, val3, result_text, is_aws)
-                    st.session_state.predictions = st.session_state.get('predictions', 0) + 1
-                    st.metric("Total Predictions", st.session_state.predictions)
+                    stats = score_file(input_path, output_path, model, scaler, db=db, calibration=calibration)
                 except Exception as e:
-                    st.error(f"Prediction Error: {e}")
\ No newline at end of file
+                    st.error(f"Batch Prediction Error: {e}")
+                    return
+                with open(output_path, 'rb') as f:
+                    scored = f.read()
+            st.success(f"Scored {stats['rows']} rows ({stats['rows_per_sec']:.0f} rows/s)")
+            if stats['invalid_rows']:
+                st.warning(f"{stats['invalid_rows']} rows failed validation; see the 'errors' column.")
+            st.download_button("Download results", scored, file_name=f"scored_{uploaded.name}")
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Paso por defecto de los st.slider con valores float
+SLIDER_STEP = 0.01
+
+class PredictionCache:
+    def __init__(self, maxsize=1024, ttl=3600.0, step=SLIDER_STEP, watch_paths=()):
+        """Caché LRU/TTL de resultados de scoring indexada por el vector de variables cuantizado.
+
+        Se vacía sola cuando cambia cualquiera de los ficheros de `watch_paths` (modelo y scaler).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.step = step
+        self.watch_paths = tuple(watch_paths)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._fingerprint = self._current_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _current_fingerprint(self):
+        fingerprint = []
+        for path in self.watch_paths:
+            try:
+                st = os.stat(path)
+                fingerprint.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                fingerprint.append(None)
+        return tuple(fingerprint)
+
+    def make_key(self, values):
+        """Cuantiza las variables al paso del slider para que entradas casi iguales compartan entrada."""
+        return tuple(int(round(float(v) / self.step)) for v in values)
+
+    def _check_model(self):
+        fingerprint = self._current_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._entries.clear()
+            self._fingerprint = fingerprint
+            self.invalidations += 1
+
+    def get(self, key):
+        with self._lock:
+            self._check_model()
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, values, compute):
+        """Devuelve el resultado en caché para `values` o lo calcula con `compute()` y lo guarda."""
+        key = self.make_key(values)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
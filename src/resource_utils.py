@@ -0,0 +1,169 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from data_utils import ensure_files, load_model_and_scaler
+from db_utils import open_prediction_store
+
+# COMPILED_FOREST=1 sirve el bosque aplanado de forest_engine (mapeado desde <modelo>.forest/) en lugar de sklearn
+USE_COMPILED_FOREST = os.environ.get('COMPILED_FOREST', '0') == '1'
+# Imágenes de get_file_paths que muestran las páginas Home y Relevant Data
+IMAGE_KEYS = ('body_image', 'gender_smoke', 'gtp', 'hemo', 'trigly')
+
+class ResourceCache:
+    def __init__(self):
+        """Caché de recursos compartida por todas las sesiones del proceso."""
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._entries = {}
+        self._on_evict = {}
+        self._stats = {}
+
+    def _stat(self, kind):
+        return self._stats.setdefault(kind, {'hits': 0, 'misses': 0, 'loads': 0, 'load_seconds': 0.0})
+
+    def get(self, key, loader, on_evict=None):
+        """Devuelve el recurso de `key`, cargándolo con `loader` solo la primera vez."""
+        kind = key[0]
+        with self._lock:
+            if key in self._entries:
+                self._stat(kind)['hits'] += 1
+                return self._entries[key]
+            self._stat(kind)['misses'] += 1
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Un solo hilo carga el recurso; el resto espera y reutiliza el resultado
+        with load_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key]
+            start = time.perf_counter()
+            value = loader()
+            elapsed = time.perf_counter() - start
+            if value is None:
+                return None
+            with self._lock:
+                self._entries[key] = value
+                if on_evict is not None:
+                    self._on_evict[key] = on_evict
+                stats = self._stat(kind)
+                stats['loads'] += 1
+                stats['load_seconds'] += elapsed
+            logging.info(f"Loaded {kind} in {elapsed:.3f}s")
+            return value
+
+    def invalidate(self, kind=None):
+        """Descarta los recursos de un tipo (o todos) para forzar su recarga."""
+        with self._lock:
+            keys = [key for key in self._entries if kind is None or key[0] == kind]
+            evicted = [(self._entries.pop(key), self._on_evict.pop(key, None)) for key in keys]
+        for value, on_evict in evicted:
+            if on_evict is not None:
+                try:
+                    on_evict(value)
+                except Exception as e:
+                    logging.error(f"Error releasing cached resource: {e}")
+        return len(evicted)
+
+    def get_stats(self):
+        with self._lock:
+            return {kind: dict(stats) for kind, stats in self._stats.items()}
+
+_cache = ResourceCache()
+atexit.register(_cache.invalidate)
+
+def ensure_assets(base_path, is_aws, is_lambda):
+    """Comprueba/descarga los ficheros del modelo e imágenes una vez por proceso."""
+    def load():
+        ensure_files(base_path, is_aws, is_lambda)
+        return True
+    return _cache.get(('assets', base_path, is_aws, is_lambda), load)
+
+def get_image_assets(base_path):
+    """Renditions de las imágenes de la app (image_assets.ImageAssets), generadas al arrancar."""
+    from data_utils import get_file_paths
+    from image_assets import ImageAssets
+    paths = get_file_paths(base_path)
+    return _cache.get(('images', base_path), lambda: ImageAssets().warm(paths[key] for key in IMAGE_KEYS))
+
+def get_model_and_scaler(model_path, scaler_path, compiled=None):
+    """Modelo y scaler compartidos; se deserializan (o se mapean, si compiled) una sola vez por proceso."""
+    compiled = USE_COMPILED_FOREST if compiled is None else compiled
+
+    def load():
+        if not compiled:
+            return load_model_and_scaler(model_path, scaler_path)
+        from forest_engine import load_compiled
+        return load_compiled(model_path, scaler_path)
+
+    resources = _cache.get(('model', model_path, scaler_path, compiled), load)
+    return resources if resources is not None else (None, None)
+
+def get_feature_order(model_path, scaler_path, compiled=None):
+    """Orden de columnas del modelo compartido (feature_order), calculado una vez al cargarlo."""
+    from feature_schema import feature_order
+    compiled = USE_COMPILED_FOREST if compiled is None else compiled
+    model, scaler = get_model_and_scaler(model_path, scaler_path, compiled)
+    return _cache.get(('feature_order', model_path, scaler_path, compiled), lambda: feature_order(scaler, model))
+
+def get_explainer(model_path, scaler_path, model=None, scaler=None):
+    """CompiledForest para las explicaciones (contributions); el modelo servido si ya está compilado.
+
+    Con un modelo sklearn se abre (o se compila) el bosque mapeado de load_compiled, así
+    que la línea base y los arrays se comparten entre sesiones y procesos.
+    """
+    from forest_engine import CompiledForest, load_compiled
+
+    def load():
+        if isinstance(model, CompiledForest):
+            return model
+        resources = load_compiled(model_path, scaler_path)
+        return resources[0] if resources is not None else None
+    return _cache.get(('explainer', model_path, scaler_path), load)
+
+def get_calibration(model_path):
+    """Calibración y umbral del modelo (calibration.json a su lado), leídos una vez por proceso."""
+    from calibration import load_calibration
+    return _cache.get(('calibration', model_path), lambda: load_calibration(model_path))
+
+def get_prediction_cache(model_path, scaler_path, maxsize=1024, ttl=3600.0):
+    """Caché de predicciones compartida; se vacía si cambian el modelo, el scaler o la calibración en disco."""
+    from calibration import calibration_path
+    from prediction_cache import PredictionCache
+    watch_paths = (model_path, scaler_path, calibration_path(model_path))
+    return _cache.get(('prediction_cache', model_path, scaler_path),
+                      lambda: PredictionCache(maxsize=maxsize, ttl=ttl, watch_paths=watch_paths))
+
+def get_model_server(location, poll_interval=None):
+    """ModelServer del registro `location` (directorio o s3://bucket/prefijo), ya sondeando."""
+    from model_registry import ModelRegistry, ModelServer
+    poll_interval = float(os.environ.get('MODEL_POLL_SECONDS', '30')) if poll_interval is None else poll_interval
+    return _cache.get(('model_server', location),
+                      lambda: ModelServer(ModelRegistry(location), poll_interval=poll_interval).start(),
+                      on_evict=lambda server: server.stop())
+
+def get_database(is_aws, is_lambda):
+    """Registro de predicciones compartido (PREDICTION_STORE); al invalidarlo se cierra (y sincroniza con S3)."""
+    return _cache.get(('database', is_aws, is_lambda),
+                      lambda: open_prediction_store(is_aws, is_lambda),
+                      on_evict=lambda db: db.close())
+
+def get_startup(base_path, is_aws, is_lambda, model_registry=None):
+    """Fase de arranque (startup.run_app_startup), una vez por proceso; devuelve su Startup con los tiempos."""
+    from startup import run_app_startup
+    return _cache.get(('startup', base_path, is_aws, is_lambda, model_registry),
+                      lambda: run_app_startup(base_path, is_aws, is_lambda, model_registry))
+
+def invalidate(kind=None):
+    """Invalida 'assets', 'model', 'model_server', 'database' o, sin argumento, todos los recursos."""
+    if kind == 'model':
+        # Los resultados en caché, el orden de columnas, la calibración y el explicador pertenecen al modelo descartado
+        _cache.invalidate('prediction_cache')
+        _cache.invalidate('explainer')
+        _cache.invalidate('feature_order')
+        _cache.invalidate('calibration')
+    return _cache.invalidate(kind)
+
+def get_stats():
+    return _cache.get_stats()
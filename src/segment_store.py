@@ -0,0 +1,620 @@
+"""Registro de predicciones solo-anexar con compactación a segmentos Parquet por día.
+
+Alternativa a predictions.db (PREDICTION_STORE=segments) con la misma interfaz que
+DatabaseManager. Cada escritura se añade como líneas JSON al WAL del proceso
+(current-<escritor>.log) y se guarda también en memoria. La compactación sella el WAL al
+llegar a `max_rows` filas o `max_delay` segundos, y también al cerrar. Lo reescribe como
+segmentos Parquet inmutables en
+segments/day=AAAA-MM-DD/part-<primer id>-<último id>-<escritor>.parquet.
+
+Varios procesos (réplicas de Streamlit) pueden compartir `root`: cada uno tiene su WAL y
+mantiene un flock sobre writers/<escritor>.lock mientras está abierto. Al abrir, el WAL de
+un escritor cuyo cerrojo ya nadie tiene (caída) se pasa a segmentos. Los segmentos de los
+demás procesos se ven al leer; sus filas aún en el WAL, cuando las compactan.
+
+A S3 solo se suben los segmentos nuevos, nunca el historial completo. Un proceso nuevo
+solo descarga los segmentos que le faltan, y en Lambda no se descarga nada.
+
+El id de cada fila es su instante de escritura en microsegundos (monótono por proceso) por
+WRITER_SLOTS más el slot del escritor (sus tres primeras cifras), así que el orden por id
+coincide con el de día y timestamp. En un mismo `root` los slots no se repiten; entre
+máquinas o contenedores de Lambda el slot es aleatorio y dos ids solo coinciden si dos
+escritores con el mismo slot (1 entre 1000) escriben en el mismo microsegundo. Con el
+escritor en el nombre, dos procesos nunca escriben (ni suben) el mismo segmento. Las lecturas con rango de tiempo
+solo abren los segmentos de los días del rango. El resto de filtros se evalúa con
+pyarrow.dataset, que salta los row groups cuyas estadísticas no pueden cumplirlos.
+"""
+import contextlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+import numpy as np
+from db_utils import COLUMNS, EXTRA_COLUMNS, _sql_time, arrow_schema, export_pages, prediction_row
+from metrics_utils import inc, timed, timer
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin cerrojo entre procesos sobre `root`
+    fcntl = None
+
+WAL_NAME = 'current.log'
+SEALED_NAME = 'sealed.log'
+SEGMENTS_DIR = 'segments'
+WRITERS_DIR = 'writers'
+LOCK_NAME = '.lock'
+WRITER_SLOTS = 1000
+UPLOADED_NAME = '.uploaded.json'
+S3_BUCKET = 'smoking-body-signals-data-dev'
+S3_PREFIX = 'src/predictions'
+ROLLUP_KEYS = ['day', 'gender', 'prediction']
+ROLLUP_COLUMNS = ROLLUP_KEYS + ['count', 'hemoglobin_count', 'hemoglobin_sum', 'hemoglobin_sumsq',
+                                'hemoglobin_min', 'hemoglobin_max']
+ROW_WIDTH = 3 + len(EXTRA_COLUMNS)
+
+def _timestamps(micros):
+    """'AAAA-MM-DD HH:MM:SS' en UTC (como CURRENT_TIMESTAMP de SQLite) de instantes en microsegundos."""
+    stamps = np.datetime_as_string(np.asarray(micros, dtype=np.int64).astype('datetime64[us]'), unit='s')
+    return np.char.replace(stamps, 'T', ' ').tolist()
+
+def _to_table(records):
+    """Tabla Arrow (arrow_schema) de tuplas en orden COLUMNS."""
+    import pyarrow as pa
+    schema = arrow_schema()
+    columns = list(zip(*records)) if records else [()] * len(schema)
+    arrays = [pa.array(values, type=pa.float64()).cast(field.type) if pa.types.is_int8(field.type)
+              else pa.array(values, type=field.type)
+              for field, values in zip(schema, columns)]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+def _expression(gender=None, label=None, start=None, end=None, after_id=None):
+    """Filtro de pyarrow.dataset equivalente a db_utils._where, o None sin filtros."""
+    import pyarrow.dataset as ds
+    conditions = []
+    if gender is not None:
+        conditions.append(ds.field('gender') == gender)
+    if label is not None:
+        conditions.append(ds.field('prediction') == label)
+    if start is not None:
+        conditions.append(ds.field('timestamp') >= _sql_time(start))
+    if end is not None:
+        conditions.append(ds.field('timestamp') < _sql_time(end))
+    if after_id:
+        conditions.append(ds.field('id') > after_id)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def _log_name(name, writer):
+    """current.log -> current-<escritor>.log; sin escritor, el nombre de versiones anteriores."""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-{writer}{ext}" if writer else name
+
+def _try_lock(path):
+    """Descriptor con flock exclusivo sobre `path`, o None si otro proceso lo tiene."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return fd
+    except BlockingIOError:
+        os.close(fd)
+        return None
+
+def _rollup(df):
+    """Resumen por día, género y etiqueta con las columnas de prediction_rollup."""
+    import pandas as pd
+    if df.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    df = df.assign(day=df['timestamp'].str[:10], gender=df['gender'].fillna(''),
+                   prediction=df['prediction'].fillna(''), hemoglobin_sq=df['hemoglobin'] ** 2)
+    return df.groupby(ROLLUP_KEYS, as_index=False).agg(
+        count=('timestamp', 'size'), hemoglobin_count=('hemoglobin', 'count'), hemoglobin_sum=('hemoglobin', 'sum'),
+        hemoglobin_sumsq=('hemoglobin_sq', 'sum'), hemoglobin_min=('hemoglobin', 'min'),
+        hemoglobin_max=('hemoglobin', 'max'))
+
+def _merge_rollups(parts):
+    import pandas as pd
+    parts = [part for part in parts if not part.empty]
+    if not parts:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    merged = pd.concat(parts, ignore_index=True).groupby(ROLLUP_KEYS, as_index=False).agg(
+        count=('count', 'sum'), hemoglobin_count=('hemoglobin_count', 'sum'), hemoglobin_sum=('hemoglobin_sum', 'sum'),
+        hemoglobin_sumsq=('hemoglobin_sumsq', 'sum'), hemoglobin_min=('hemoglobin_min', 'min'),
+        hemoglobin_max=('hemoglobin_max', 'max'))
+    return merged.sort_values(ROLLUP_KEYS, ignore_index=True)
+
+class SegmentStore:
+    def __init__(self, root, s3_client=None, bucket=None, prefix=S3_PREFIX, max_rows=50_000, max_delay=300.0,
+                 background=True, restore=None, clock=time.time):
+        """Registro en `root`; con `bucket` los segmentos se suben a s3://bucket/prefix/day=.../.
+
+        `restore` (por defecto, si hay bucket) descarga al abrir los segmentos que falten en
+        local. Sin `background` la compactación se hace en la escritura que llega a `max_rows`
+        y en flush()/close().
+        """
+        self.root = root
+        self.local_db_path = root  # Clave de las figuras en caché de dashboard, como en DatabaseManager
+        self.segments_dir = os.path.join(root, SEGMENTS_DIR)
+        self.writers_dir = os.path.join(root, WRITERS_DIR)
+        os.makedirs(self.segments_dir, exist_ok=True)
+        os.makedirs(self.writers_dir, exist_ok=True)
+        self._s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._compact_lock = threading.Lock()
+        self._tail = []       # Filas de current.log, también en memoria para las lecturas
+        self._sealed = []     # Filas selladas que se están escribiendo como segmentos
+        self._tail_since = None
+        self._segments = {}   # ruta relativa -> (día, primer id, último id)
+        self._own = set()     # Segmentos que sube este proceso: los suyos y los que heredó al abrir
+        self._day_mtimes = {}
+        self._rollups = {}    # ruta relativa -> resumen del segmento (inmutable, se calcula una vez)
+        self._last_id = 0
+        self._stopping = False
+        self._thread = None
+        self.segments_written = 0
+        self.uploads = 0
+        self.failures = 0
+        self.bytes_uploaded = 0
+        self.last_sync = None
+
+        with self._root_lock():
+            self._new_writer()
+            self._uploaded = set(self._read_uploaded())
+            self._scan_segments()
+            self._own.update(rel for rel in self._segments if rel not in self._uploaded)
+            self._adopt_orphans()
+        if self.bucket and (restore if restore is not None else True):
+            self.restore()
+        self._wal = open(self.wal_path, 'a')
+        if background:
+            self._thread = threading.Thread(target=self._run, name='segment-compaction', daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def for_environment(cls, is_aws, is_lambda):
+        """Registro en las mismas rutas que predictions.db; en Lambda sin descarga ni hilo de fondo."""
+        root = ('/home/ubuntu/Body_Signals_of_Smoking---AWS-Terraform-testing/src/predictions' if is_aws and not is_lambda
+                else '/tmp/predictions' if is_aws and is_lambda else 'predictions')
+        return cls(root, bucket=S3_BUCKET if is_aws else None, background=not is_lambda, restore=not is_lambda)
+
+    def _new_writer(self):
+        """Con _root_lock: escritor '<slot><aleatorio>' con un slot que no use otro escritor de `root`."""
+        taken = {name[:3] for name in os.listdir(self.writers_dir)}
+        free = [slot for slot in range(WRITER_SLOTS) if f"{slot:03d}" not in taken] or range(WRITER_SLOTS)
+        self.slot = random.choice(free)
+        self.writer = f"{self.slot:03d}{uuid.uuid4().hex[:9]}"
+        self.wal_path = os.path.join(self.root, _log_name(WAL_NAME, self.writer))
+        self.sealed_path = os.path.join(self.root, _log_name(SEALED_NAME, self.writer))
+        self._writer_fd = _try_lock(os.path.join(self.writers_dir, self.writer + '.lock')) if fcntl else None
+
+    @contextlib.contextmanager
+    def _root_lock(self):
+        """flock exclusivo sobre <root>/.lock: apertura, descargas y .uploaded.json, entre procesos."""
+        fd = os.open(os.path.join(self.root, LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    @property
+    def s3_client(self):
+        if self._s3 is None:
+            import boto3
+            self._s3 = boto3.client('s3')
+        return self._s3
+
+    # --- Escritura ---
+
+    def _append(self, rows):
+        """Asigna id y timestamp a tuplas de INSERT_ROW_SQL y las añade al WAL."""
+        if not rows:
+            return 0
+        with self._cond:
+            first = max(self._last_id // WRITER_SLOTS + 1, int(self.clock() * 1_000_000))
+            micros = range(first, first + len(rows))
+            ids = [m * WRITER_SLOTS + self.slot for m in micros]
+            self._last_id = ids[-1]
+            records = [(i,) + tuple(row[:3]) + (stamp,) + tuple(row[3:]) for i, row, stamp in zip(ids, rows, _timestamps(micros))]
+            self._wal.write(''.join(json.dumps(record, default=float) + '\n' for record in records))
+            self._wal.flush()
+            self._tail.extend(records)
+            if self._tail_since is None:
+                self._tail_since = time.monotonic()
+            due = len(self._tail) >= self.max_rows
+            self._cond.notify()
+        inc('db_writes', len(rows))
+        if due and self._thread is None:
+            self.compact()
+        return len(rows)
+
+    @timed('save_prediction')
+    def save_prediction(self, gender, hemoglobin, prediction, is_aws, probability=None, features=None):
+        """Añade una predicción al WAL (misma firma que DatabaseManager.save_prediction)."""
+        self._append([prediction_row(gender, hemoglobin, prediction, probability, features)])
+
+    def save_predictions_bulk(self, rows):
+        """Añade muchas predicciones (tuplas de prediction_rows o (gender, hemoglobin, prediction)) de una vez."""
+        return self._append([row if len(row) == ROW_WIDTH else tuple(row) + (None,) * (ROW_WIDTH - len(row))
+                             for row in rows])
+
+    # --- Compactación y S3 ---
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if not self._tail:
+                        self._cond.wait()
+                        continue
+                    remaining = self._tail_since + self.max_delay - time.monotonic()
+                    if len(self._tail) >= self.max_rows or remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+                if self._stopping:
+                    return
+            try:
+                self.compact()
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Segment compaction failed: {e}")
+                with self._cond:
+                    self._cond.wait(timeout=min(self.max_delay, 30.0))  # Sin reintentos en bucle
+
+    @timed('compact_segments')
+    def compact(self):
+        """Sella el WAL, lo escribe como segmentos y sube los pendientes; devuelve las filas compactadas."""
+        with self._compact_lock:
+            with self._cond:
+                if self._tail:
+                    self._wal.close()
+                    os.replace(self.wal_path, self.sealed_path)
+                    self._wal = open(self.wal_path, 'a')
+                    self._sealed, self._tail, self._tail_since = self._tail, [], None
+                records = self._sealed
+            if records:
+                self._write_segments(records, self.writer, self.sealed_path)
+            if self.bucket:
+                self._upload_pending()
+            return len(records)
+
+    def flush(self):
+        """Compacta y sube ya lo pendiente (p. ej. al final de una invocación de Lambda)."""
+        self.compact()
+
+    def _write_segments(self, records, writer, sealed_path=None):
+        """Un segmento por día; los nombres dependen solo de las filas y de su `writer` (idempotente).
+
+        Con `sealed_path` (compactación propia) las filas selladas dejan de estar en memoria
+        y se borra el WAL sellado en cuanto los segmentos son visibles.
+        """
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        table = _to_table(records).sort_by('id')
+        days = pc.utf8_slice_codeunits(table['timestamp'], 0, 10)
+        written = []
+        for day in pc.unique(days).to_pylist():
+            part = table.filter(pc.equal(days, day))
+            name = f"part-{part['id'][0].as_py()}-{part['id'][-1].as_py()}" + (f"-{writer}" if writer else '')
+            rel = os.path.join(f'day={day}', name + '.parquet')
+            path = os.path.join(self.segments_dir, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pq.write_table(part, self._tmp_path(path), compression='zstd')
+            written.append(rel)
+        # Los lectores ven las filas o en memoria o en segmentos, nunca en los dos sitios
+        with self._cond:
+            for rel in written:
+                path = os.path.join(self.segments_dir, rel)
+                os.replace(self._tmp_path(path), path)
+                self._register(rel)
+                self._own.add(rel)
+            if sealed_path is not None:
+                self._sealed = []
+                if os.path.exists(sealed_path):
+                    os.remove(sealed_path)
+        self.segments_written += len(written)
+        logging.info(f"Compacted {len(records)} predictions into {len(written)} segments")
+        return written
+
+    def _tmp_path(self, path):
+        # Con el escritor en el nombre, quien herede un WAL sabe qué temporales son suyos
+        return f"{path}.{self.writer}.tmp"
+
+    def _upload_pending(self):
+        with self._cond:
+            pending = sorted(rel for rel in self._own if rel not in self._uploaded)
+        for rel in pending:
+            path = os.path.join(self.segments_dir, rel)
+            try:
+                with timer('s3_sync'):
+                    self.s3_client.upload_file(path, self.bucket, self._key(rel))
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Failed to upload segment {rel}: {e}")
+                break  # Se reintenta en la siguiente compactación
+            size = os.path.getsize(path)
+            self.uploads += 1
+            self.bytes_uploaded += size
+            self.last_sync = time.time()
+            inc('s3_bytes', size, direction='upload')
+            self._uploaded.add(rel)
+        with self._root_lock():
+            self._write_uploaded()
+
+    def restore(self):
+        """Descarga los segmentos de S3 que no están en local; devuelve cuántos."""
+        with self._root_lock():
+            self._scan_segments()  # Lo que otro proceso ya descargó no se vuelve a bajar
+            downloaded = self._restore()
+        logging.info(f"Restored {downloaded} prediction segments from s3://{self.bucket}/{self.prefix}")
+        return downloaded
+
+    def _restore(self):
+        downloaded = 0
+        paginator_args = {'Bucket': self.bucket, 'Prefix': self.prefix + '/'}
+        while True:
+            page = self.s3_client.list_objects_v2(**paginator_args)
+            for obj in page.get('Contents', []):
+                rel = obj['Key'][len(self.prefix) + 1:]
+                if not rel.endswith('.parquet') or rel in self._segments:
+                    continue
+                path = os.path.join(self.segments_dir, rel)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.s3_client.download_file(self.bucket, obj['Key'], self._tmp_path(path))
+                os.replace(self._tmp_path(path), path)
+                inc('s3_bytes', os.path.getsize(path), direction='download')
+                with self._cond:
+                    self._register(rel)
+                self._uploaded.add(rel)
+                downloaded += 1
+            if not page.get('IsTruncated'):
+                break
+            paginator_args['ContinuationToken'] = page['NextContinuationToken']
+        self._write_uploaded()
+        return downloaded
+
+    def _key(self, rel):
+        return f"{self.prefix}/{rel.replace(os.sep, '/')}"
+
+    def _read_uploaded(self):
+        try:
+            with open(os.path.join(self.root, UPLOADED_NAME)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _write_uploaded(self):
+        """Con _root_lock: añade a .uploaded.json lo subido por este proceso sin perder lo de los demás."""
+        from data_utils import _atomic_write_json
+        self._uploaded.update(self._read_uploaded())
+        _atomic_write_json(os.path.join(self.root, UPLOADED_NAME), sorted(self._uploaded))
+
+    def _register(self, rel):
+        day_dir, name = os.path.split(rel)
+        _, first, last = name[:-len('.parquet')].split('-')[:3]  # part-<primer id>-<último id>[-<escritor>]
+        self._segments[rel] = (day_dir[len('day='):], int(first), int(last))
+        self._last_id = max(self._last_id, int(last))
+
+    def _scan_segments(self):
+        """Registra los segmentos nuevos, también los de otros procesos; solo relista los días que cambiaron."""
+        for day_dir in sorted(os.listdir(self.segments_dir)):
+            path = os.path.join(self.segments_dir, day_dir)
+            mtime = os.stat(path).st_mtime_ns
+            # Un directorio modificado hace menos de 1 s se relista: el mtime puede no haber cambiado aún
+            if self._day_mtimes.get(day_dir) == mtime and time.time_ns() - mtime > 1_000_000_000:
+                continue
+            names = sorted(os.listdir(path))
+            with self._cond:
+                for name in names:
+                    rel = os.path.join(day_dir, name)
+                    if name.endswith('.parquet') and rel not in self._segments:
+                        self._register(rel)
+            self._day_mtimes[day_dir] = mtime
+
+    def _adopt_orphans(self):
+        """Con _root_lock: pasa a segmentos los WAL de escritores que ya no existen y borra sus temporales."""
+        orphans = {'': None}  # WAL de versiones anteriores, sin escritor
+        if fcntl is not None:
+            for name in os.listdir(self.writers_dir):
+                writer = name[:-len('.lock')]
+                if name.endswith('.lock') and writer != self.writer:
+                    fd = _try_lock(os.path.join(self.writers_dir, name))
+                    if fd is not None:
+                        orphans[writer] = fd
+        for writer, fd in orphans.items():
+            for name in (SEALED_NAME, WAL_NAME):
+                path = os.path.join(self.root, _log_name(name, writer))
+                if os.path.exists(path):
+                    records = self._read_log(path)
+                    if records:
+                        self._write_segments(records, writer)
+                        logging.warning(f"Recovered {len(records)} predictions from {path}")
+                    os.remove(path)
+            if fd is not None:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(self.writers_dir, writer + '.lock'))
+                os.close(fd)
+        for day_dir in os.listdir(self.segments_dir):
+            for name in os.listdir(os.path.join(self.segments_dir, day_dir)):
+                # part-...parquet.tmp (sin escritor) o part-...parquet.<escritor>.tmp
+                if name.endswith('.tmp') and name[:-len('.tmp')].rsplit('.', 1)[-1] in (set(orphans) | {'parquet'}):
+                    os.remove(os.path.join(self.segments_dir, day_dir, name))  # Compactación interrumpida
+
+    @staticmethod
+    def _read_log(path):
+        records = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logging.warning(f"Skipping truncated WAL line in {path}")
+                    continue
+                if len(record) == len(COLUMNS):
+                    records.append(tuple(record))
+        return records
+
+    def sync_stats(self):
+        with self._cond:
+            pending_uploads = sum(rel not in self._uploaded for rel in self._own) if self.bucket else 0
+            return {
+                'wal_rows': len(self._tail) + len(self._sealed),
+                'wal_age_seconds': time.monotonic() - self._tail_since if self._tail_since is not None else 0.0,
+                'segments': len(self._segments),
+                'segments_written': self.segments_written,
+                'pending_uploads': pending_uploads,
+                'last_sync': self.last_sync,
+                'uploads': self.uploads,
+                'failures': self.failures,
+                'bytes_uploaded': self.bytes_uploaded,
+            }
+
+    def close(self):
+        """Detiene la compactación en segundo plano, compacta lo pendiente y lo sube."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.compact()
+        finally:
+            self._wal.close()
+            with self._cond:
+                done = not self._tail and not self._sealed
+            if done and os.path.exists(self.wal_path):
+                os.remove(self.wal_path)
+            if self._writer_fd is not None:
+                # Con filas sin compactar el cerrojo queda libre pero el fichero no: otro proceso las hereda
+                if done:
+                    os.remove(os.path.join(self.writers_dir, self.writer + '.lock'))
+                os.close(self._writer_fd)
+                self._writer_fd = None
+
+    # --- Lectura ---
+
+    def _snapshot(self, start=None, end=None):
+        """Segmentos por día dentro de [start, end) y copia de las filas aún en memoria."""
+        start_day = _sql_time(start)[:10] if start is not None else None
+        end_day = _sql_time(end)[:10] if end is not None else None
+        self._scan_segments()
+        days = {}
+        with self._cond:
+            for rel, (day, first, _) in self._segments.items():
+                if (start_day is None or day >= start_day) and (end_day is None or day <= end_day):
+                    days.setdefault(day, []).append((first, os.path.join(self.segments_dir, rel)))
+            records = self._sealed + self._tail
+        return {day: [path for _, path in sorted(files)] for day, files in sorted(days.items())}, records
+
+    def _day_tables(self, columns=None, **filters):
+        """Una tabla por día con las filas que cumplen `filters`, ordenada por id."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        days, records = self._snapshot(filters.get('start'), filters.get('end'))
+        expression = _expression(**filters)
+        memory = _to_table(records)
+        if expression is not None:
+            memory = memory.filter(expression)
+        memory_days = pc.utf8_slice_codeunits(memory['timestamp'], 0, 10)
+        for day in sorted(set(days) | set(memory_days.to_pylist())):
+            parts = [memory.filter(pc.equal(memory_days, day))]
+            if day in days:
+                parts.insert(0, ds.dataset(days[day], schema=arrow_schema(), format='parquet').to_table(filter=expression))
+            table = pa.concat_tables(parts).sort_by('id')
+            if table.num_rows:
+                yield table.select(columns) if columns else table
+
+    def _table(self, columns=None, **filters):
+        import pyarrow as pa
+        tables = list(self._day_tables(columns, **filters))
+        if not tables:
+            return _to_table([]).select(columns) if columns else _to_table([])
+        return pa.concat_tables(tables)
+
+    def get_predictions(self, limit=None, **filters):
+        """DataFrame con las predicciones que cumplen `filters`, en orden de id."""
+        table = self._table(**filters)
+        return (table.slice(0, limit) if limit is not None else table).to_pandas()
+
+    def iter_predictions(self, batch_size=10_000, after_id=0, **filters):
+        """Páginas de `batch_size` tuplas (COLUMNS) en orden de id; lee un día cada vez."""
+        buffer = []
+        for table in self._day_tables(after_id=after_id, **filters):
+            buffer.extend(zip(*(table.column(name).to_pylist() for name in COLUMNS)))
+            while len(buffer) >= batch_size:
+                yield buffer[:batch_size]
+                buffer = buffer[batch_size:]
+        if buffer:
+            yield buffer
+
+    def query_predictions(self, limit=100, after_id=0, **filters):
+        """Una página de resultados y el cursor (`after_id`) de la siguiente, o None si no hay más."""
+        page = next(self.iter_predictions(batch_size=limit, after_id=after_id, **filters), [])
+        next_after_id = page[-1][0] if len(page) == limit else None
+        return [dict(zip(COLUMNS, row)) for row in page], next_after_id
+
+    def export_predictions(self, path, batch_size=50_000, **filters):
+        """Vuelca las predicciones a CSV o Parquet página a página; devuelve las filas escritas."""
+        return export_pages(self.iter_predictions(batch_size=batch_size, **filters), path)
+
+    def rollup_version(self):
+        """Último id asignado, descargado o de otro proceso: cambia si y solo si cambian los datos."""
+        self._scan_segments()
+        with self._cond:
+            return self._last_id
+
+    def get_rollup(self):
+        """Resumen diario (día, género, etiqueta); el de cada segmento se calcula una sola vez."""
+        import pyarrow.parquet as pq
+        columns = ['timestamp', 'gender', 'prediction', 'hemoglobin']
+        self._scan_segments()
+        with self._cond:
+            segments = list(self._segments)
+            records = self._sealed + self._tail
+        for rel in segments:
+            if rel not in self._rollups:
+                table = pq.read_table(os.path.join(self.segments_dir, rel), columns=columns)
+                self._rollups[rel] = _rollup(table.to_pandas())
+        memory = _rollup(_to_table(records).select(columns).to_pandas())
+        return _merge_rollups([self._rollups[rel] for rel in segments] + [memory])
+
+    def _filtered_rollup(self, **filters):
+        """Resumen de las filas de `filters`: del resumen acumulado si no hay rango de tiempo."""
+        if filters.get('start') is None and filters.get('end') is None:
+            rollup = self.get_rollup()
+            if filters.get('gender') is not None:
+                rollup = rollup[rollup['gender'] == filters['gender']]
+            if filters.get('label') is not None:
+                rollup = rollup[rollup['prediction'] == filters['label']]
+            return rollup
+        table = self._table(['timestamp', 'gender', 'prediction', 'hemoglobin'], **filters)
+        return _rollup(table.to_pandas())
+
+    def daily_label_counts(self, **filters):
+        """Número de predicciones por día y etiqueta."""
+        rollup = self._filtered_rollup(**filters)
+        counts = rollup.groupby(['day', 'prediction'], as_index=False)['count'].sum()
+        return counts.sort_values(['day', 'prediction'], ignore_index=True)
+
+    def hemoglobin_stats_by_gender(self, **filters):
+        """count/mean/std/min/max de hemoglobina por género, como DatabaseManager."""
+        rollup = self._filtered_rollup(**filters)
+        stats = rollup.groupby('gender', as_index=False).agg(
+            count=('hemoglobin_count', 'sum'), total=('hemoglobin_sum', 'sum'), total_sq=('hemoglobin_sumsq', 'sum'),
+            min=('hemoglobin_min', 'min'), max=('hemoglobin_max', 'max'))
+        total, total_sq = stats.pop('total'), stats.pop('total_sq')
+        stats.insert(2, 'mean', total / stats['count'])
+        stats.insert(3, 'std', (total_sq / stats['count'] - stats['mean'] ** 2).clip(lower=0) ** 0.5)
+        return stats
@@ -0,0 +1,163 @@
+"""Fase de arranque previa a servir peticiones, con el tiempo de cada etapa.
+
+Sin ella, la primera petición tras un despliegue paga los imports diferidos de
+sklearn/joblib, la primera pasada por scaler.transform y el bosque (fallos de página
+incluidos) y la descarga de predictions.db desde S3. run_app_startup hace todo eso antes,
+por este orden:
+    assets    ficheros del modelo e imágenes (S3 en AWS) y sus renditions
+    model     modelo, scaler, orden de columnas, calibración y explicador
+    warm_up   fila por defecto del formulario (queda en la PredictionCache) y un lote sintético
+    database  registro de predicciones abierto (setup_aws_db) y primera consulta
+y solo entonces marca la instancia como lista.
+
+`python startup.py [opciones de streamlit]` ejecuta el arranque y, en el mismo proceso,
+inicia el servidor de Streamlit con app.py: la caché de resource_utils ya está llena y el
+health check (/_stcore/health) no responde hasta que la instancia está lista. Con
+`streamlit run app.py` el arranque se ejecuta en el primer rerun.
+
+Uso (desde src/):
+    python startup.py --server.port=8501 --server.address=0.0.0.0
+    python startup.py --check    # solo el arranque, con los tiempos por etapa
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from calibration import Calibration
+from feature_schema import FEATURE_SPECS, default_features, encode_features
+from metrics_utils import timer
+
+WARM_UP_ROWS = 256
+
+class Startup:
+    def __init__(self):
+        """Tiempos por etapa (en orden de ejecución) y estado de la fase de arranque."""
+        self.timings = {}
+        self.ready = False
+        self.warm_up_rows = 0
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Cronometra una etapa; también queda en el histograma startup_stage de metrics_utils."""
+        start = time.perf_counter()
+        try:
+            with timer('startup_stage', stage=name):
+                yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            logging.info(f"Startup stage {name} took {self.timings[name]:.3f}s")
+
+    def mark_ready(self):
+        self.ready = True
+        logging.info(f"Instance ready after {self.total_seconds:.3f}s: "
+                     + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.timings.items()))
+        return self
+
+    @property
+    def total_seconds(self):
+        return sum(self.timings.values())
+
+    def report(self):
+        return {'ready': self.ready, 'total_seconds': self.total_seconds, 'stages': dict(self.timings),
+                'warm_up_rows': self.warm_up_rows}
+
+def synthetic_batch(n, seed=0):
+    """Lote de `n` filas válidas: la primera con los valores por defecto del formulario y el
+    resto repartidas entre los límites de cada slider, para recorrer ramas de todos los árboles."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for name, spec in FEATURE_SPECS.items():
+        if spec['dtype'] == 'category':
+            data[name] = rng.choice(np.asarray(sorted(set(spec['encoding'].values())), dtype=float), n)
+        else:
+            low, high, _ = spec['slider']
+            values = rng.uniform(low, high, n)
+            data[name] = np.round(values) if spec['dtype'] == 'int' else values
+    batch = pd.DataFrame(data)
+    batch.iloc[0] = pd.Series(default_features())
+    return batch
+
+def warm_up(model, scaler, columns, calibration=None, explainer=None, cache=None, rows=WARM_UP_ROWS):
+    """Primera inferencia fuera de las peticiones de usuario; devuelve las filas puntuadas.
+
+    Se puntúa (y explica, con `explainer`) un lote sintético con score_chunk, cuya primera
+    fila son los valores por defecto del formulario. Con `cache`, esa fila recorre además el
+    camino del botón "Predict" (score_features) y su resultado queda en la PredictionCache.
+    Nada se guarda en la DB.
+    """
+    from batch_scoring import score_chunk
+    from forest_engine import CompiledForest
+    calibration = calibration or Calibration()
+    for forest in (model, explainer):
+        if isinstance(forest, CompiledForest):
+            forest.prefault()
+    score_chunk(synthetic_batch(rows), model, scaler, columns, calibration, explainer)
+    if cache is not None:
+        from prediction import score_features  # Import diferido: la API no carga Streamlit
+        X, _ = encode_features({name: [value] for name, value in default_features().items()}, columns)
+        df = pd.DataFrame(X, columns=columns)
+        cache.get_or_compute(X[0].tolist(), lambda: score_features(model, scaler, df, calibration))
+        if explainer is not None:
+            from forest_engine import explain
+            explain(explainer, X, columns)
+    return rows
+
+def run_app_startup(base_path, is_aws, is_lambda, model_registry=None):
+    """Arranque de la app de Streamlit sobre las mismas entradas de resource_utils que usa app.main."""
+    from resource_utils import (ensure_assets, get_calibration, get_database, get_explainer, get_feature_order,
+                                get_image_assets, get_model_and_scaler, get_model_server, get_prediction_cache)
+    from data_utils import get_file_paths
+    startup = Startup()
+    paths = get_file_paths(base_path)
+    with startup.stage('assets'):
+        ensure_assets(base_path, is_aws, is_lambda)
+        get_image_assets(base_path)
+    with startup.stage('model'):
+        if model_registry:
+            handle = get_model_server(model_registry).current
+            model, scaler, model_paths = handle.model, handle.scaler, handle.paths
+            columns, calibration = handle.columns, handle.calibration
+        else:
+            model, scaler = get_model_and_scaler(paths['model'], paths['scaler'])
+            model_paths = (paths['model'], paths['scaler'])
+            if model is None:
+                raise RuntimeError(f"Model could not be loaded from {base_path}")
+            columns, calibration = get_feature_order(*model_paths), get_calibration(paths['model'])
+        explainer = get_explainer(*model_paths, model, scaler)
+    with startup.stage('warm_up'):
+        startup.warm_up_rows = warm_up(model, scaler, columns, calibration, explainer,
+                                       cache=get_prediction_cache(*model_paths))
+    with startup.stage('database'):
+        get_database(is_aws, is_lambda).rollup_version()
+    return startup.mark_ready()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='solo ejecuta el arranque e imprime los tiempos')
+    args, streamlit_args = parser.parse_known_args()
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from app import BASE_PATH, IS_AWS, IS_LAMBDA, MODEL_REGISTRY
+    from resource_utils import get_startup
+    try:
+        startup = get_startup(BASE_PATH, IS_AWS, IS_LAMBDA, MODEL_REGISTRY)
+    except Exception as e:
+        # Sin arranque completo no se sirve: el orquestador verá el proceso terminar
+        logging.error(f"Startup failed: {e}")
+        sys.exit(1)
+    if args.check:
+        print(json.dumps(startup.report(), indent=2))
+        return
+
+    from streamlit.web import cli
+    sys.argv = ['streamlit', 'run', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'),
+                *streamlit_args]
+    cli.main()
+
+if __name__ == '__main__':
+    main()
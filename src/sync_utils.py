@@ -0,0 +1,170 @@
+import os
+import tempfile
+import threading
+import time
+import logging
+from botocore.exceptions import ClientError
+from metrics_utils import inc, timer
+
+GENERATION_KEY = 'generation'
+# Espera máxima entre reintentos mientras S3 siga fallando
+MAX_BACKOFF = 300.0
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+def key_lock(bucket, key):
+    """Cerrojo del proceso para un objeto de S3: quien lo tiene es el único que lo lee y reemplaza."""
+    with _key_locks_guard:
+        return _key_locks.setdefault((bucket, key), threading.Lock())
+
+def remote_generation(s3, bucket, key):
+    """Generación (metadato 'generation') del objeto en S3; None si no existe y -1 si no la tiene."""
+    try:
+        head = s3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    value = head.get('Metadata', {}).get(GENERATION_KEY)
+    return int(value) if value is not None else -1
+
+def put_versioned(s3, bucket, key, path, generation):
+    """Sube `path` con su generación en los metadatos.
+
+    No comprueba nada: quien llama debe tener key_lock(bucket, key) y haber incorporado ya
+    la copia remota actual (ver DatabaseManager._sync_to_s3).
+    """
+    s3.upload_file(path, bucket, key, ExtraArgs={'Metadata': {GENERATION_KEY: str(generation)}})
+
+class S3SyncWorker:
+    def __init__(self, snapshot_fn, s3_client, bucket, key, max_pending=25, max_delay=30.0, upload_fn=None):
+        """Sincroniza en segundo plano una copia local con S3 (write-behind).
+
+        Las escrituras solo marcan la copia como sucia con `mark_dirty()`; un único hilo
+        sube un snapshot cuando hay `max_pending` escrituras sin subir o cuando la más
+        antigua supera `max_delay` segundos. Con `upload_fn(path) -> bool` el snapshot y la
+        subida los hace el dueño de la copia (DatabaseManager._sync_to_s3, que primero
+        incorpora lo que haya en S3); False significa que no había nada que subir.
+        """
+        self.snapshot_fn = snapshot_fn
+        self.upload_fn = upload_fn
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._upload_lock = threading.Lock()
+        self._pending = 0
+        self._oldest_pending = None
+        self._stopping = False
+        self._thread = None
+        self.last_sync = None
+        self.uploads = 0
+        self.failures = 0
+        self.bytes_uploaded = 0
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='s3-sync', daemon=True)
+                self._thread.start()
+
+    def mark_dirty(self, count=1):
+        """Registra `count` escrituras locales pendientes de subir."""
+        with self._cond:
+            self._pending += count
+            if self._oldest_pending is None:
+                self._oldest_pending = time.time()
+            self._cond.notify()
+        self.start()
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._pending == 0:
+                        self._cond.wait()
+                        continue
+                    remaining = self._oldest_pending + self.max_delay - time.time()
+                    if self._pending >= self.max_pending or remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+                if self._stopping:
+                    return
+            failures = self.failures
+            self.flush()
+            if self.failures == failures:
+                backoff = 0.0
+                continue
+            # Sin reintentos en bucle: la espera se duplica (hasta MAX_BACKOFF) mientras S3 siga fallando;
+            # las escrituras nuevas no la acortan, solo stop()
+            backoff = min(backoff * 2 if backoff else (min(self.max_delay, 30.0) or 1.0), MAX_BACKOFF)
+            deadline = time.monotonic() + backoff
+            with self._cond:
+                while not self._stopping and deadline > time.monotonic():
+                    self._cond.wait(timeout=deadline - time.monotonic())
+
+    def flush(self, force=False):
+        """Sube ya un snapshot si hay escrituras pendientes (o siempre, con `force`). True si subió algo."""
+        with self._upload_lock:
+            with self._cond:
+                pending, oldest = self._pending, self._oldest_pending
+                self._pending, self._oldest_pending = 0, None
+            if pending == 0 and not force:
+                return False
+            fd, tmp_path = tempfile.mkstemp(suffix='.snapshot')
+            os.close(fd)
+            try:
+                with timer('s3_sync'):
+                    if self.upload_fn is not None:
+                        if not self.upload_fn(tmp_path):
+                            return False  # S3 ya tenía todas las filas
+                    else:
+                        self.snapshot_fn(tmp_path)
+                        self.s3.upload_file(tmp_path, self.bucket, self.key)
+                size = os.path.getsize(tmp_path)
+                self.uploads += 1
+                self.bytes_uploaded += size
+                inc('s3_bytes', size, direction='upload')
+                self.last_sync = time.time()
+                logging.info(f"Synced {pending} pending writes to s3://{self.bucket}/{self.key}")
+                return True
+            except Exception as e:
+                # Se reintenta en el siguiente ciclo sin perder el recuento pendiente
+                self.failures += 1
+                with self._cond:
+                    self._pending += pending
+                    # Con force puede no haber habido nada pendiente (oldest None)
+                    if oldest is not None and (self._oldest_pending is None or oldest < self._oldest_pending):
+                        self._oldest_pending = oldest
+                logging.error(f"Failed to sync to S3: {e}")
+                return False
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def stop(self, flush=True):
+        """Detiene el hilo y, por defecto, hace una última subida."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if flush:
+            self.flush()
+
+    def stats(self):
+        with self._cond:
+            pending, oldest = self._pending, self._oldest_pending
+        return {
+            'queue_depth': pending,
+            'sync_lag_seconds': time.time() - oldest if oldest is not None else 0.0,
+            'last_sync': self.last_sync,
+            'uploads': self.uploads,
+            'failures': self.failures,
+            'bytes_uploaded': self.bytes_uploaded,
+        }
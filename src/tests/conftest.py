@@ -1,11 +1,18 @@
+import io
+import time
+import hashlib
+import numpy as np
 import pytest
 from unittest.mock import Mock
 from typing import Any
+from botocore.exceptions import ClientError
 
 @pytest.fixture
 def mock_model():
     model = Mock()
     model.predict.return_value = [1]  # Simula una predicción de "Smoker"
+    model.predict_proba.return_value = np.array([[0.2, 0.8]])
+    model.classes_ = np.array([0, 1])
     model.feature_names_in_ = ['gender', 'Gtp', 'hemoglobin', 'height(cm)', 'triglyceride', 'waist(cm)', 'LDL', 'HDL',
                                'Cholesterol', 'ALT', 'fasting blood sugar', 'systolic', 'AST', 'relaxation', 'weight(kg)',
                                'age', 'serum creatinine', 'eyesight(left)', 'eyesight(right)', 'tartar', 'dental caries',
@@ -22,4 +29,106 @@ def mock_scaler():
 def mock_s3_client():
     s3_client = Mock()
     s3_client.download_file = Mock()
-    return s3_client
\ No newline at end of file
+    return s3_client
+
+class FakeS3Client:
+    """Cliente S3 en memoria con la misma interfaz que usa el código (boto3)."""
+    def __init__(self, latency=0.0):
+        self.objects = {}
+        self.metadata = {}
+        self.latency = latency
+        self.calls = []
+
+    def _wait(self, op):
+        self.calls.append(op)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, **kwargs):
+        self._wait('upload_file')
+        with open(filename, 'rb') as f:
+            self.objects[(bucket, key)] = f.read()
+        self.metadata[(bucket, key)] = dict((ExtraArgs or {}).get('Metadata', {}))
+
+    def put(self, bucket, key, data):
+        self.objects[(bucket, key)] = data
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._wait('head_object')
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'head_object')
+        data = self.objects[(Bucket, Key)]
+        return {'ETag': '"%s"' % hashlib.md5(data).hexdigest(), 'ContentLength': len(data),
+                'Metadata': self.metadata.get((Bucket, Key), {})}
+
+    def put_object(self, Bucket, Key, Body, Metadata=None, **kwargs):
+        self._wait('put_object')
+        self.objects[(Bucket, Key)] = Body
+        self.metadata[(Bucket, Key)] = dict(Metadata or {})
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._wait('get_object')
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'get_object')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, **kwargs):
+        self._wait('list_objects_v2')
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        if Delimiter is None:
+            return {'Contents': [{'Key': key} for key in keys]}
+        prefixes = sorted({Prefix + key[len(Prefix):].split(Delimiter)[0] + Delimiter
+                           for key in keys if Delimiter in key[len(Prefix):]})
+        return {'Contents': [{'Key': key} for key in keys if Delimiter not in key[len(Prefix):]],
+                'CommonPrefixes': [{'Prefix': p} for p in prefixes]}
+
+    def download_file(self, bucket, key, filename, **kwargs):
+        self._wait('download_file')
+        if (bucket, key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'download_file')
+        with open(filename, 'wb') as f:
+            f.write(self.objects[(bucket, key)])
+
+
+@pytest.fixture
+def fake_s3():
+    return FakeS3Client()
+
+
+def _within_schema(df):
+    """Recorta las variables numéricas al rango válido de FEATURE_SPECS (enteras redondeadas)."""
+    from feature_schema import FEATURE_SPECS
+    for name, spec in FEATURE_SPECS.items():
+        if spec['dtype'] != 'category':
+            df[name] = df[name].clip(spec['min'], spec['max'])
+            if spec['dtype'] == 'int':
+                df[name] = df[name].round()
+    return df
+
+
+def make_patients(n, seed=0):
+    """Pacientes sintéticos con las 24 columnas codificadas de NUM_VARIABLES."""
+    import pandas as pd
+    from prediction import NUM_VARIABLES
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(100.0, 30.0, size=(n, len(NUM_VARIABLES))), columns=NUM_VARIABLES)
+    df['gender'] = rng.integers(0, 2, n)
+    df['hemoglobin'] = rng.uniform(7.4, 18.7, n)
+    df['tartar'] = rng.integers(0, 2, n)
+    df['dental caries'] = rng.integers(0, 2, n)
+    df['hearing(left)'] = rng.integers(1, 3, n)
+    df['hearing(right)'] = rng.integers(1, 3, n)
+    return _within_schema(df)
+
+
+@pytest.fixture(scope='session')
+def trained_model():
+    """Random forest y StandardScaler reales entrenados sobre datos sintéticos (como el notebook)."""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    X = make_patients(600)
+    y = ((X['hemoglobin'] > 14) & (X['gender'] == 1)).astype(int) | (X['Gtp'] > 130).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=20, max_depth=8, random_state=42)
+    model.fit(scaler.transform(X), y)
+    return model, scaler
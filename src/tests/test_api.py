@@ -0,0 +1,89 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import Mock
+from api import InferenceAPI, MicroBatcher, validate_features
+from prediction import NUM_VARIABLES
+from tests.conftest import make_patients
+
+async def _request(app, method, path, body=None):
+    messages = [{'type': 'http.request', 'body': json.dumps(body).encode() if body is not None else b'', 'more_body': False}]
+    sent = []
+    async def receive():
+        return messages.pop(0)
+    async def send(message):
+        sent.append(message)
+    await app({'type': 'http', 'method': method, 'path': path}, receive, send)
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+def _features(n=1, seed=0):
+    return make_patients(n, seed=seed).to_dict(orient='records')
+
+def test_validate_features_orders_and_rejects():
+    row = validate_features(_features()[0])
+    assert len(row) == len(NUM_VARIABLES)
+    bad = dict(_features()[0], Gtp='high')
+    with pytest.raises(ValueError, match='Gtp must be a number'):
+        validate_features(bad)
+    with pytest.raises(ValueError, match='missing features'):
+        validate_features({'gender': 1})
+
+def test_readiness_and_predict_endpoints(trained_model):
+    model, scaler = trained_model
+    db = Mock()
+    app = InferenceAPI(lambda: (model, scaler, db))
+
+    async def scenario():
+        assert (await _request(app, 'GET', '/readyz'))[0] == 503
+        assert (await _request(app, 'POST', '/predict', {'features': _features()[0]}))[0] == 503
+        await app.startup()
+        assert await _request(app, 'GET', '/readyz') == (200, {'status': 'ready'})
+        status, body = await _request(app, 'POST', '/predict', {'features': _features()[0]})
+        assert status == 200 and body['prediction'] in ('Smoker', 'Non-Smoker')
+        assert (body['probability'] > 0.5) == (body['prediction'] == 'Smoker') and body['threshold'] == 0.5
+        status, body = await _request(app, 'POST', '/predict/batch', {'instances': _features(10, seed=4)})
+        assert status == 200 and len(body['predictions']) == 10
+        status, body = await _request(app, 'POST', '/predict', {'features': {'gender': 1}})
+        assert status == 422
+        await app.shutdown()
+
+    asyncio.run(scenario())
+    assert db.save_predictions_bulk.call_count == 2
+
+def test_micro_batcher_groups_concurrent_requests():
+    calls = []
+    def predict(rows):
+        calls.append(len(rows))
+        return [sum(row) for row in rows]
+    batcher = MicroBatcher(predict, max_batch_size=64, max_wait_ms=50)
+
+    async def scenario():
+        results = await asyncio.gather(*[batcher.submit([[i, 1]]) for i in range(20)])
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results == [[i + 1] for i in range(20)]
+    assert sum(calls) == 20
+    assert len(calls) < 20
+
+def test_metrics_endpoint_serves_prometheus_text(trained_model):
+    model, scaler = trained_model
+    app = InferenceAPI(lambda: (model, scaler, None))
+    sent = []
+
+    async def scenario():
+        await app.startup()
+        await _request(app, 'POST', '/predict', {'features': _features()[0]})
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        async def send(message):
+            sent.append(message)
+        await app({'type': 'http', 'method': 'GET', 'path': '/metrics'}, receive, send)
+        await app.shutdown()
+
+    asyncio.run(scenario())
+    assert dict(sent[0]['headers'])[b'content-type'].startswith(b'text/plain')
+    text = sent[1]['body'].decode()
+    assert 'smoking_predictions_total{source="api"}' in text
+    assert 'smoking_model_predict_seconds_count' in text
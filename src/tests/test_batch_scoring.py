@@ -0,0 +1,88 @@
+import pytest
+import pandas as pd
+from batch_scoring import score_file, score_chunk
+from db_utils import DatabaseManager
+from prediction import NUM_VARIABLES
+from tests.conftest import make_patients
+
+def test_score_chunk_matches_single_row_path(trained_model):
+    model, scaler = trained_model
+    df = make_patients(50, seed=1)
+    scored = score_chunk(df, model, scaler)
+    expected = [{"0": "Non-Smoker", "1": "Smoker"}[str(p)] for p in model.predict(scaler.transform(df[NUM_VARIABLES]))]
+    assert scored['prediction'].tolist() == expected
+
+def test_score_chunk_rejects_missing_columns(trained_model):
+    model, scaler = trained_model
+    with pytest.raises(ValueError):
+        score_chunk(make_patients(5).drop(columns=['Gtp']), model, scaler)
+
+@pytest.mark.parametrize('suffix', ['.csv', '.parquet'])
+def test_score_file_in_chunks_writes_output_and_db(tmp_path, trained_model, suffix):
+    model, scaler = trained_model
+    df = make_patients(1000, seed=2)
+    input_path = str(tmp_path / f'input{suffix}')
+    output_path = str(tmp_path / f'output{suffix}')
+    if suffix == '.csv':
+        df.to_csv(input_path, index=False)
+    else:
+        df.to_parquet(input_path, index=False)
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'predictions.db'))
+    stats = score_file(input_path, output_path, model, scaler, db=db, chunksize=128)
+    assert stats['rows'] == 1000
+    assert stats['rows_per_sec'] > 0
+    result = pd.read_csv(output_path) if suffix == '.csv' else pd.read_parquet(output_path)
+    assert len(result) == 1000
+    assert set(result['prediction']) <= {'Smoker', 'Non-Smoker'}
+    assert ((result['probability'] > 0.5) == (result['prediction'] == 'Smoker')).all()
+    stored = db.get_predictions()
+    assert len(stored) == 1000
+    assert stored['probability'].tolist() == pytest.approx(result['probability'].tolist())
+    assert stored['gtp'].tolist() == pytest.approx(df['Gtp'].tolist())
+    db.close()
+
+def test_score_chunk_uses_calibration_threshold(trained_model):
+    from calibration import Calibration
+    model, scaler = trained_model
+    df = make_patients(200, seed=6)
+    default = score_chunk(df, model, scaler)
+    strict = score_chunk(df, model, scaler, calibration=Calibration(threshold=0.9))
+    assert (strict['probability'] == default['probability']).all()
+    assert (strict['prediction'] == 'Smoker').sum() == (default['probability'] > 0.9).sum()
+
+def test_score_file_with_process_workers(tmp_path, trained_model):
+    model, scaler = trained_model
+    df = make_patients(400, seed=3)
+    input_path = str(tmp_path / 'input.csv')
+    df.to_csv(input_path, index=False)
+    serial = score_file(input_path, str(tmp_path / 'serial.csv'), model, scaler, chunksize=50)
+    parallel = score_file(input_path, str(tmp_path / 'parallel.csv'), model, scaler, chunksize=50, n_jobs=2)
+    assert serial['rows'] == parallel['rows'] == 400
+    # El orden de salida se conserva aunque los bloques se procesen en paralelo
+    assert pd.read_csv(tmp_path / 'serial.csv')['prediction'].tolist() == \
+        pd.read_csv(tmp_path / 'parallel.csv')['prediction'].tolist()
+
+def test_score_chunk_flags_invalid_rows_and_reorders_columns(trained_model):
+    model, scaler = trained_model
+    df = make_patients(20, seed=4)[list(reversed(NUM_VARIABLES))]  # columnas en otro orden
+    df.loc[5, 'hemoglobin'] = 99.0
+    scored = score_chunk(df, model, scaler)
+    assert scored.loc[5, 'errors'] == 'hemoglobin' and pd.isna(scored.loc[5, 'prediction'])
+    valid = scored.drop(index=5)
+    expected = [{"0": "Non-Smoker", "1": "Smoker"}[str(p)]
+                for p in model.predict(scaler.transform(valid[NUM_VARIABLES]))]
+    assert valid['prediction'].tolist() == expected
+    assert (valid['errors'] == '').all()
+
+def test_score_chunk_with_explainer_adds_contributions(trained_model):
+    from forest_engine import explainer_for
+    model, scaler = trained_model
+    explainer = explainer_for(model, scaler)
+    df = make_patients(100, seed=12)
+    df.loc[3, 'hemoglobin'] = 100.0  # Fuera de rango: sin contribuciones
+    scored = score_chunk(df, model, scaler, explainer=explainer)
+    contributions = scored[[f'contribution_{name}' for name in NUM_VARIABLES]]
+    assert contributions.iloc[3].isna().all()
+    valid = scored['errors'] == ''
+    raw = model.predict_proba(scaler.transform(df.loc[valid, NUM_VARIABLES]))[:, 1]
+    assert (explainer.expected_value() + contributions[valid].sum(axis=1)).tolist() == pytest.approx(raw.tolist())
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from calibration import Calibration, fit_calibration, load_calibration, save_calibration, threshold_table
+from tests.conftest import make_patients
+
+def test_identity_calibration_matches_predict(trained_model):
+    model, scaler = trained_model
+    X = scaler.transform(make_patients(300, seed=5))
+    labels, probabilities = Calibration().predict(model, X)
+    expected = [{"0": "Non-Smoker", "1": "Smoker"}[str(p)] for p in model.predict(X)]
+    assert labels.tolist() == expected
+    assert np.allclose(probabilities, model.predict_proba(X)[:, 1])
+
+def test_fit_calibration_is_monotone_and_tabulates_thresholds():
+    rng = np.random.default_rng(0)
+    raw = rng.uniform(0, 1, 5000)
+    y = rng.uniform(0, 1, 5000) < raw ** 2  # el modelo sobreestima la probabilidad
+    calibration = fit_calibration(raw[:4000], y[:4000], raw[4000:], y[4000:], threshold='f1')
+    grid = calibration.transform(np.linspace(0, 1, 101))
+    assert np.all(np.diff(grid) >= 0) and grid[0] >= 0 and grid[-1] <= 1
+    assert abs(calibration.transform(0.5) - 0.25) < 0.1
+    assert calibration.info['brier_calibrated'] < calibration.info['brier_raw']
+    assert [row['threshold'] for row in calibration.table] == sorted(row['threshold'] for row in calibration.table)
+    assert calibration.threshold in [row['threshold'] for row in calibration.table]
+    assert sum(row['count'] for row in calibration.curve) == 1000
+
+def test_threshold_table_counts():
+    table = threshold_table([0.1, 0.4, 0.6, 0.9], [0, 1, 0, 1], thresholds=(0.5,))
+    assert table == [{'threshold': 0.5, 'precision': 0.5, 'recall': 0.5, 'f1': 0.5, 'accuracy': 0.5,
+                      'positive_rate': 0.5}]
+
+def test_load_calibration_next_to_model_and_threshold_override(tmp_path, monkeypatch):
+    model_path = str(tmp_path / 'random_forest_model_Default.pkl')
+    assert not load_calibration(model_path).calibrated
+    save_calibration(Calibration([0.0, 1.0], [0.2, 0.6], threshold=0.3), str(tmp_path / 'calibration.json'))
+    calibration = load_calibration(model_path)
+    assert calibration.calibrated and calibration.threshold == 0.3
+    assert calibration.transform(0.5) == pytest.approx(0.4)
+    monkeypatch.setenv('DECISION_THRESHOLD', '0.45')
+    assert load_calibration(model_path).threshold == 0.45
+    assert load_calibration(model_path, threshold=0.7).threshold == 0.7
+    with pytest.raises(ValueError):
+        load_calibration(model_path, threshold=1.5)
+    (tmp_path / 'calibration.json').write_text('{not json')
+    assert not load_calibration(model_path, threshold=0.5).calibrated
@@ -0,0 +1,25 @@
+from unittest.mock import patch
+import dashboard
+from db_utils import DatabaseManager
+
+def test_figures_are_cached_until_the_rollup_changes(tmp_path):
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'predictions.db'))
+    db.save_predictions_bulk([('M', 15.0, 'Smoker'), ('F', 12.0, 'Non-Smoker'), ('F', 13.0, 'Smoker')])
+    with patch('dashboard.build_figures', wraps=dashboard.build_figures) as build:
+        figures = dashboard.get_figures(db)
+        assert dashboard.get_figures(db) is figures
+        assert build.call_count == 1
+        db.save_prediction('M', 16.0, 'Smoker', False)
+        figures = dashboard.get_figures(db)
+        assert build.call_count == 2
+    assert figures['total'] == 4
+    assert figures['smoker_rate'] == 0.75
+    assert figures['daily'].to_dict()['mark']['type'] == 'bar'
+    db.close()
+
+def test_live_dashboard_handles_empty_table(tmp_path):
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'empty.db'))
+    with patch('streamlit.info') as info:
+        dashboard.live_dashboard(db)
+    info.assert_called_once()
+    db.close()
@@ -1,6 +1,9 @@
+import os
+import time
 import pytest
 from unittest.mock import Mock, patch, mock_open
-from data_utils import load_model_and_scaler, ensure_files, get_file_paths
+from data_utils import load_model_and_scaler, ensure_files, get_file_paths, fetch_assets, S3_ASSETS
+from tests.conftest import FakeS3Client
 
 def test_get_file_paths():
     base_path = '/test/path'
@@ -17,12 +20,43 @@ def test_load_model_and_scaler(mock_open, mock_load):
     assert model == mock_model
     assert scaler == mock_scaler
 
-@patch('data_utils.boto3.client')
-@patch('data_utils.os.path.exists', return_value=False)
-@patch('data_utils.os.makedirs')
-def test_ensure_files_aws(mock_makedirs, mock_exists, mock_s3_client):
-    mock_s3 = Mock()
-    mock_s3.download_file = Mock()
-    mock_s3_client.return_value = mock_s3
-    ensure_files('/base', True, False)
-    assert mock_s3.download_file.call_count == 7
\ No newline at end of file
+def _fill_bucket(fake_s3, content=b'data'):
+    for _, s3_key in S3_ASSETS:
+        fake_s3.put('smoking-body-signals-data-dev', s3_key, content + s3_key.encode())
+
+def test_ensure_files_aws(tmp_path, fake_s3):
+    _fill_bucket(fake_s3)
+    ensure_files(str(tmp_path), True, False, s3_client=fake_s3)
+    assert fake_s3.calls.count('download_file') == 7
+    paths = get_file_paths(str(tmp_path))
+    assert open(paths['model'], 'rb').read() == b'datasrc/random_forest_model_Default.pkl'
+    # Ningún temporal .part queda en el directorio
+    assert not [f for f in os.listdir(tmp_path) if '.part-' in f]
+
+def test_ensure_files_only_fetches_changed_assets(tmp_path, fake_s3):
+    _fill_bucket(fake_s3)
+    ensure_files(str(tmp_path), True, False, s3_client=fake_s3)
+    fake_s3.put('smoking-body-signals-data-dev', 'src/random_forest_model_Default.pkl', b'new model')
+    result = fetch_assets(fake_s3, str(tmp_path))
+    assert result['downloaded'] == ['src/random_forest_model_Default.pkl']
+    assert open(get_file_paths(str(tmp_path))['model'], 'rb').read() == b'new model'
+    assert fetch_assets(fake_s3, str(tmp_path))['downloaded'] == []
+
+def test_existing_files_without_manifest_are_verified_by_hash(tmp_path, fake_s3):
+    _fill_bucket(fake_s3)
+    paths = get_file_paths(str(tmp_path))
+    for key, s3_key in S3_ASSETS:
+        with open(paths[key], 'wb') as f:
+            f.write(b'data' + s3_key.encode())
+    with open(paths['scaler'], 'wb') as f:
+        f.write(b'stale scaler, same len!')
+    assert fetch_assets(fake_s3, str(tmp_path))['downloaded'] == ['src/scaler.pkl']
+
+def test_parallel_fetch_beats_serial_latency(tmp_path):
+    fake_s3 = FakeS3Client(latency=0.2)
+    _fill_bucket(fake_s3)
+    start = time.perf_counter()
+    fetch_assets(fake_s3, str(tmp_path))
+    elapsed = time.perf_counter() - start
+    # En serie serían 7 * (head + download) * 0.2s = 2.8s
+    assert elapsed < 1.4
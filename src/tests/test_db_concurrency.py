@@ -0,0 +1,122 @@
+import shutil
+import sqlite3
+import threading
+import pytest
+from db_utils import DatabaseManager, last_row_id
+from sync_utils import put_versioned
+from tests.conftest import FakeS3Client
+
+BUCKET, KEY = 'smoking-body-signals-data-dev', 'src/predictions.db'
+
+class RecordingS3(FakeS3Client):
+    """FakeS3Client que apunta la generación de cada subida, en orden."""
+    def __init__(self):
+        super().__init__(latency=0.001)
+        self.generations = []
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, **kwargs):
+        super().upload_file(filename, bucket, key, ExtraArgs=ExtraArgs, **kwargs)
+        self.generations.append(int(ExtraArgs['Metadata']['generation']))
+
+def _remote_rows(s3, tmp_path):
+    path = tmp_path / 'remote.db'
+    s3.download_file(BUCKET, KEY, str(path))
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    finally:
+        conn.close()
+
+def _seeded_db(path, rows):
+    db = DatabaseManager(False, False, local_db_path=str(path))
+    db.save_predictions_bulk([('M', 15.0, 'Smoker')] * rows)
+    db.close()
+
+def test_concurrent_sessions_lose_no_rows_and_never_upload_stale_snapshots(tmp_path):
+    s3 = RecordingS3()
+    path = str(tmp_path / 'predictions.db')
+    db = DatabaseManager(True, False, s3_client=s3, local_db_path=path, sync_max_pending=5, sync_max_delay=0.01)
+    sessions, writes = 16, 40
+    errors = []
+    late = []
+
+    def session(i):
+        try:
+            for j in range(writes):
+                if j % 10 == 0:
+                    db.save_predictions_bulk([('F', 12.0, 'Non-Smoker')] * 5)
+                else:
+                    db.save_prediction('M', 15.0, 'Smoker', True)
+                if i == 0 and j == writes // 2:
+                    # Una sesión nueva a mitad: no puede reemplazar la base que se está escribiendo
+                    late.append(DatabaseManager(True, False, s3_client=s3, local_db_path=path))
+                    late[0].save_prediction('F', 13.0, 'Smoker', True)
+        except Exception as e:
+            errors.append(e)
+
+    def uploader():
+        for _ in range(20):
+            db.upload_to_s3()
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    threads += [threading.Thread(target=uploader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    late[0].close()
+    db.close()
+
+    expected = sessions * (writes // 10 * 5 + writes - writes // 10) + 1
+    assert errors == []
+    assert last_row_id(path) == expected
+    assert len(DatabaseManager(False, False, local_db_path=path).get_predictions()) == expected
+    assert _remote_rows(s3, tmp_path) == expected
+    assert s3.generations == list(range(1, len(s3.generations) + 1))  # Cada subida es la siguiente generación
+    # Además de las sesiones, cada subida (antes y después) y cada rebase de `db` escriben su sync_state
+    stats = db.sync_stats()
+    assert db.writer.writes == sessions * writes + 2 * stats['uploads'] + stats['rebases']
+    assert db.writer.transactions <= db.writer.writes
+
+def test_open_database_is_not_replaced_by_newer_s3_copy(tmp_path, fake_s3):
+    path = str(tmp_path / 'predictions.db')
+    first = DatabaseManager(True, False, s3_client=fake_s3, local_db_path=path, sync_max_delay=60)
+    first.save_predictions_bulk([('M', 15.0, 'Smoker')] * 3)
+    _seeded_db(tmp_path / 'remote.db', 10)
+    put_versioned(fake_s3, BUCKET, KEY, str(tmp_path / 'remote.db'), 5)  # Otro host subió una copia más nueva
+
+    second = DatabaseManager(True, False, s3_client=fake_s3, local_db_path=path, sync_max_delay=60)
+    assert len(second.get_predictions()) == 3  # En uso por `first`: no se toca
+    second.close()
+    first.close()
+    assert first.sync_stats()['rebases'] == 1  # Las 10 filas de S3 se incorporan antes de subir
+    assert _remote_rows(fake_s3, tmp_path) == 13
+
+    third = DatabaseManager(True, False, s3_client=fake_s3, local_db_path=path, sync_max_delay=60)
+    assert len(third.get_predictions()) == 13  # Ni las filas locales sin subir ni las remotas se pierden
+    assert third.get_rollup()['count'].sum() == 13
+    third.close()
+
+def test_local_rows_missing_from_s3_are_uploaded(tmp_path, fake_s3):
+    path = tmp_path / 'predictions.db'
+    _seeded_db(tmp_path / 'old.db', 2)
+    put_versioned(fake_s3, BUCKET, KEY, str(tmp_path / 'old.db'), 2)
+    # Copia local de la de S3 con filas que no llegaron a subirse antes de una caída
+    shutil.copy(tmp_path / 'old.db', path)
+    db = DatabaseManager(False, False, local_db_path=str(path))
+    db.save_predictions_bulk([('F', 12.0, 'Non-Smoker')] * 3)
+    db.close()
+
+    db = DatabaseManager(True, False, s3_client=fake_s3, local_db_path=str(path), sync_max_delay=60)
+    assert len(db.get_predictions()) == 5  # Las 2 filas comunes no se duplican
+    assert fake_s3.metadata[(BUCKET, KEY)]['generation'] == '3'
+    db.close()
+    assert _remote_rows(fake_s3, tmp_path) == 5
+
+def test_writer_reports_errors_to_their_caller_only(tmp_path):
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'predictions.db'))
+    with pytest.raises(sqlite3.OperationalError):
+        db.writer.submit(lambda conn: conn.execute("INSERT INTO missing VALUES (1)"))
+    db.save_prediction('M', 15.0, 'Smoker', False)
+    assert len(db.get_predictions()) == 1
+    db.close()
@@ -9,6 +9,7 @@ def test_database_manager_init_aws(mock_s3_client, mock_connect):
     mock_s3 = Mock()
     # Simula el error real de AWS (ClientError 404, como en db_utils.py)
     mock_s3.download_file.side_effect = ClientError({'Error': {'Code': '404'}}, 'download_file')
+    mock_s3.head_object.side_effect = ClientError({'Error': {'Code': '404'}}, 'head_object')
     mock_s3_client.return_value = mock_s3
     db = DatabaseManager(True, False)  # El código maneja el error y crea DB
     mock_connect.assert_called()  # Verifica que se llama create_db después del error
@@ -21,4 +22,135 @@ def test_save_prediction(mock_connect):
     mock_conn.cursor.return_value = mock_cursor
     mock_connect.return_value = mock_conn
     db.save_prediction('M', 15.0, 'Smoker', False)
-    mock_cursor.execute.assert_called()  # Verifica insert
\ No newline at end of file
+    mock_cursor.execute.assert_called()  # Verifica insert
+
+def test_save_predictions_bulk(tmp_path):
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'predictions.db'))
+    rows = [('M', 15.0, 'Smoker'), ('F', 12.0, 'Non-Smoker')] * 50
+    assert db.save_predictions_bulk(rows) == 100
+    assert len(db.get_predictions()) == 100
+    db.close()
+
+def test_concurrent_writers_use_wal_pool(tmp_path):
+    import threading
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'predictions.db'), pool_size=4)
+    def writer():
+        for _ in range(25):
+            db.save_prediction('F', 13.0, 'Non-Smoker', False)
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(db.get_predictions()) == 200
+    with db.pool.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    db.close()
+
+def _history_db(tmp_path, n=1000):
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'predictions.db'))
+    db.save_predictions_bulk(('M' if i % 2 else 'F', 10.0 + i % 7, 'Smoker' if i % 3 == 0 else 'Non-Smoker')
+                             for i in range(n))
+    return db
+
+def test_iter_predictions_keyset_pages_and_filters(tmp_path):
+    db = _history_db(tmp_path)
+    pages = list(db.iter_predictions(batch_size=300))
+    assert [len(p) for p in pages] == [300, 300, 300, 100]
+    ids = [row[0] for page in pages for row in page]
+    assert ids == sorted(set(ids)) and len(ids) == 1000
+    smokers = [row for page in db.iter_predictions(batch_size=50, gender='M', label='Smoker') for row in page]
+    assert len(smokers) == sum(1 for i in range(1000) if i % 2 and i % 3 == 0)
+    assert not list(db.iter_predictions(start='2999-01-01'))
+    rows, cursor = db.query_predictions(limit=10)
+    more, _ = db.query_predictions(limit=10, after_id=cursor)
+    assert rows[-1]['id'] < more[0]['id']
+    with db.pool.connection() as conn:
+        plan = ' '.join(r[-1] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM predictions WHERE prediction = ? AND timestamp >= ?", ('Smoker', '2000')))
+    assert 'idx_predictions_prediction_timestamp' in plan
+    db.close()
+
+def test_query_predictions_without_cursor_starts_from_the_beginning(tmp_path):
+    db = _history_db(tmp_path, n=20)
+    rows, cursor = db.query_predictions(limit=5, after_id=None)
+    assert [row['id'] for row in rows] == [1, 2, 3, 4, 5] and cursor == 5
+    males, _ = db.query_predictions(limit=100, after_id=None, gender='M')
+    assert len(males) == 10
+    assert len([row for page in db.iter_predictions(batch_size=3, after_id=None) for row in page]) == 20
+    db.close()
+
+def test_sql_aggregates(tmp_path):
+    db = _history_db(tmp_path, n=600)
+    counts = db.daily_label_counts()
+    assert counts['count'].sum() == 600
+    assert set(counts['prediction']) == {'Smoker', 'Non-Smoker'}
+    stats = db.hemoglobin_stats_by_gender().set_index('gender')
+    assert stats.loc['M', 'count'] == 300
+    expected = db.get_predictions(gender='F')['hemoglobin']
+    assert stats.loc['F', 'mean'] == pytest.approx(expected.mean())
+    assert stats.loc['F', 'std'] == pytest.approx(expected.std(ddof=0))
+    db.close()
+
+@pytest.mark.parametrize('name', ['export.csv', 'export.parquet'])
+def test_export_predictions_streams_every_row(tmp_path, name):
+    import pandas as pd
+    db = _history_db(tmp_path, n=2500)
+    path = str(tmp_path / name)
+    assert db.export_predictions(path, batch_size=1000, label='Smoker') == 834
+    exported = pd.read_parquet(path) if name.endswith('.parquet') else pd.read_csv(path)
+    from db_utils import COLUMNS
+    assert list(exported.columns) == list(COLUMNS)
+    assert list(COLUMNS[:5]) == ['id', 'gender', 'hemoglobin', 'prediction', 'timestamp']
+    assert len(exported) == 834 and (exported['prediction'] == 'Smoker').all()
+    db.close()
+
+def test_rollup_tracks_inserts_and_backfills_legacy_databases(tmp_path):
+    import sqlite3
+    from db_utils import CREATE_TABLE_SQL, INSERT_SQL
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_TABLE_SQL)
+    conn.executemany(INSERT_SQL, [('M', 15.0, 'Smoker'), ('F', 12.0, 'Non-Smoker'), ('M', 13.0, 'Smoker')])
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(False, False, local_db_path=path)
+    assert db.get_rollup()['count'].sum() == 3
+    version = db.rollup_version()
+    db.save_prediction('F', 11.0, 'Smoker', False)
+    db.save_predictions_bulk([('M', 17.0, 'Smoker')] * 5)
+    assert db.rollup_version() == version + 6
+    rollup = db.get_rollup().set_index(['gender', 'prediction'])
+    assert rollup.loc[('M', 'Smoker'), 'count'] == 7
+    assert rollup.loc[('M', 'Smoker'), 'hemoglobin_min'] == 13.0
+    assert rollup.loc[('M', 'Smoker'), 'hemoglobin_max'] == 17.0
+    raw = db.hemoglobin_stats_by_gender(start='2000-01-01')
+    assert db.hemoglobin_stats_by_gender().equals(raw)
+    db.close()
+
+def test_typed_feature_columns_and_legacy_migration(tmp_path):
+    import sqlite3
+    import numpy as np
+    from db_utils import CREATE_TABLE_SQL, INSERT_SQL, prediction_rows
+    from feature_schema import NUM_VARIABLES, default_features
+    path = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(path)
+    conn.execute(CREATE_TABLE_SQL)
+    conn.execute(INSERT_SQL, ('M', 15.0, 'Smoker'))
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(False, False, local_db_path=path)
+    features = default_features()
+    db.save_prediction('F', 12.0, 'Non-Smoker', False, probability=0.25, features=features)
+    X = np.array([[features[name] for name in NUM_VARIABLES]] * 3)
+    db.save_predictions_bulk(prediction_rows(X, ['Smoker'] * 3, [0.9] * 3))
+    rows = db.get_predictions()
+    assert len(rows) == 5 and rows['probability'].isna().tolist() == [True, False, False, False, False]
+    assert rows.loc[1, 'urine_protein'] == 1 and rows.loc[4, 'cholesterol'] == 200.0
+    assert rows.loc[4, 'gender'] == 'F' and rows.loc[4, 'probability'] == 0.9
+    with db.pool.connection() as conn:
+        types = conn.execute("SELECT typeof(tartar), typeof(ldl) FROM predictions WHERE id = 2").fetchone()
+    assert types == ('integer', 'real')
+    db.close()
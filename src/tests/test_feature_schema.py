@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+from feature_schema import (FEATURES_SCHEMA, FEATURE_SPECS, NUM_VARIABLES, default_features, encode_features,
+                            feature_order, validate_features, validate_instances)
+from tests.conftest import make_patients
+
+def test_specs_cover_every_feature():
+    assert list(FEATURE_SPECS) == NUM_VARIABLES
+    assert FEATURES_SCHEMA['properties']['gender'] == {'enum': [0, 1]}
+    for spec in FEATURE_SPECS.values():
+        if spec['dtype'] != 'category':
+            low, high, value = spec['slider']
+            assert spec['min'] <= low <= value <= high <= spec['max']
+    assert validate_features(default_features()) == [default_features()[name] for name in NUM_VARIABLES]
+
+def test_encode_features_masks_invalid_cells():
+    df = make_patients(6, seed=1)
+    df['gender'] = ['M', 'F', 1, 0, 'X', None]
+    df['tartar'] = df['tartar'].map({0: 'No', 1: 'Yes'})
+    df.loc[2, 'hemoglobin'] = 40.0
+    df.loc[3, 'Urine protein'] = 1.5
+    df.loc[1, 'age'] = np.nan
+    X, errors = encode_features(df)
+    assert X.shape == errors.shape == (6, len(NUM_VARIABLES))
+    assert X[:4, 0].tolist() == [1.0, 0.0, 1.0, 0.0]
+    assert set(X[:, NUM_VARIABLES.index('tartar')]) <= {0.0, 1.0}
+    assert errors.any(axis=1).tolist() == [False, True, True, True, True, True]
+    assert errors[2, NUM_VARIABLES.index('hemoglobin')] and errors[3, NUM_VARIABLES.index('Urine protein')]
+    assert np.isnan(X[2, NUM_VARIABLES.index('hemoglobin')])
+    with pytest.raises(ValueError, match='Missing columns'):
+        encode_features(df.drop(columns=['Gtp']))
+
+def test_encode_features_vectorised_on_large_frames():
+    df = pd.concat([make_patients(1000, seed=2)] * 200, ignore_index=True)
+    df.loc[::1000, 'systolic'] = -5.0
+    X, errors = encode_features(df, columns=list(reversed(NUM_VARIABLES)))
+    assert errors.any(axis=1).sum() == 200
+    assert np.array_equal(X[1:1000, 0], df['hearing(right)'].to_numpy()[1:1000])
+
+def test_validate_instances_reports_rows():
+    instances = make_patients(3, seed=3).to_dict(orient='records')
+    instances[1]['serum creatinine'] = 50.0
+    instances[2]['hearing(left)'] = True
+    with pytest.raises(ValueError) as e:
+        validate_instances(instances)
+    assert 'instance 1: serum creatinine must be between 0.1 and 12' in str(e.value)
+    assert 'instance 2: hearing(left) must be one of' in str(e.value)
+
+def test_feature_order_follows_fitted_names():
+    class Fitted:
+        feature_names_in_ = np.array(list(reversed(NUM_VARIABLES)), dtype=object)
+    assert feature_order(object(), Fitted()) == list(reversed(NUM_VARIABLES))
+    assert feature_order(object()) == NUM_VARIABLES
+    Fitted.feature_names_in_ = np.array(['a'] * 24, dtype=object)
+    with pytest.raises(ValueError):
+        feature_order(Fitted())
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+from forest_engine import CompiledForest, compile_model, fold_thresholds
+from prediction import NUM_VARIABLES
+from tests.conftest import make_patients
+
+def test_compiled_forest_matches_sklearn_on_held_out(trained_model):
+    model, scaler = trained_model
+    held_out = make_patients(2000, seed=7)
+    expected_proba = model.predict_proba(scaler.transform(held_out[NUM_VARIABLES]))
+    compiled, identity = compile_model(model, scaler)
+    X = identity.transform(held_out[NUM_VARIABLES])
+    assert np.array_equal(compiled.predict_proba(X), expected_proba)
+    assert np.array_equal(compiled.predict(X), model.predict(scaler.transform(held_out[NUM_VARIABLES])))
+
+def test_compiled_forest_without_scaler_folding(trained_model):
+    model, scaler = trained_model
+    X = scaler.transform(make_patients(300, seed=8)[NUM_VARIABLES])
+    compiled = CompiledForest.from_sklearn(model)
+    assert np.array_equal(compiled.predict_proba(X), model.predict_proba(X))
+
+def test_compiled_forest_single_row_and_shape_check(trained_model):
+    model, scaler = trained_model
+    compiled, _ = compile_model(model, scaler)
+    row = make_patients(1, seed=9)[NUM_VARIABLES].to_numpy()[0]
+    assert compiled.predict(row).shape == (1,)
+    with pytest.raises(ValueError):
+        compiled.predict(np.zeros((1, 3)))
+
+def test_fold_thresholds_is_exact_at_the_boundary():
+    threshold = np.array([0.1234, -1.5, 2.75])
+    mean = np.array([140.0, 12.0, 0.5])
+    scale = np.array([35.0, 1.7, 0.5])
+    folded = fold_thresholds(threshold, mean, scale)
+    inside = ((folded - mean) / scale).astype(np.float32) <= threshold
+    outside = ((np.nextafter(folded, np.inf) - mean) / scale).astype(np.float32) <= threshold
+    assert inside.all()
+    assert not outside.any()
+
+def test_saved_forest_is_memory_mapped(tmp_path, trained_model):
+    import pickle
+    model, scaler = trained_model
+    compiled, identity = compile_model(model, scaler)
+    compiled.save(str(tmp_path / 'model.forest'))
+    mapped = CompiledForest.load(str(tmp_path / 'model.forest'))
+    assert isinstance(mapped.threshold, np.memmap) and not mapped.threshold.flags.writeable
+    X = identity.transform(make_patients(500, seed=10)[NUM_VARIABLES])
+    assert np.array_equal(mapped.predict_proba(X), compiled.predict_proba(X))
+    # Entre procesos viaja la ruta, no los arrays
+    payload = pickle.dumps(mapped)
+    assert len(payload) < 1024
+    assert np.array_equal(pickle.loads(payload).predict(X), compiled.predict(X))
+
+def test_load_compiled_writes_once_and_follows_the_pickle(tmp_path, trained_model):
+    import os
+    import joblib
+    from unittest.mock import patch
+    from forest_engine import compiled_path, load_compiled
+    model, scaler = trained_model
+    model_path, scaler_path = str(tmp_path / 'random_forest_model_Default.pkl'), str(tmp_path / 'scaler.pkl')
+    joblib.dump(model, model_path)
+    joblib.dump(scaler, scaler_path)
+    forest, _ = load_compiled(model_path, scaler_path)
+    assert os.path.isdir(compiled_path(model_path)) and isinstance(forest.value, np.memmap)
+
+    with patch('data_utils.load_model_and_scaler') as unpickle:
+        load_compiled(model_path, scaler_path)
+    unpickle.assert_not_called()
+
+    joblib.dump(scaler, scaler_path)  # scaler nuevo: se recompila
+    os.utime(scaler_path, ns=(0, 0))
+    with patch('data_utils.load_model_and_scaler', return_value=(model, scaler)) as unpickle:
+        load_compiled(model_path, scaler_path)
+    unpickle.assert_called_once()
+
+def test_contributions_add_up_to_the_forest_probability(trained_model, monkeypatch):
+    import forest_engine
+    model, scaler = trained_model
+    compiled, _ = compile_model(model, scaler)
+    X = make_patients(500, seed=11)[NUM_VARIABLES].to_numpy(dtype=float)
+    k = compiled.class_index()
+    contributions = compiled.contributions(X)
+    assert contributions.shape == (500, len(NUM_VARIABLES))
+    assert compiled.expected_value() == pytest.approx(np.mean([t.tree_.value[0, 0, k] / t.tree_.value[0, 0].sum()
+                                                               for t in model.estimators_]))
+    np.testing.assert_allclose(compiled.expected_value() + contributions.sum(axis=1), compiled.predict_proba(X)[:, k],
+                               atol=1e-12)
+    monkeypatch.setattr(forest_engine, 'CHUNK_ROWS', 64)  # Varios bloques: mismo resultado
+    np.testing.assert_allclose(compiled.contributions(X), contributions, atol=1e-12)
+    assert forest_engine.explainer_for(compiled, None) is compiled
@@ -0,0 +1,62 @@
+import io
+import os
+import shutil
+from PIL import Image
+from image_assets import ImageAssets
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _chart(tmp_path, name='chart.png', size=(700, 400), color=(200, 30, 30, 255)):
+    path = tmp_path / name
+    Image.new('RGBA', size, color).save(path)
+    return str(path)
+
+def test_renditions_cover_widths_and_formats(tmp_path):
+    assets = ImageAssets(static_dir=str(tmp_path / 'static'))
+    renditions = assets.renditions(_chart(tmp_path))
+    assert [(r.width, r.format) for r in renditions] == [(320, 'WEBP'), (320, 'PNG'), (640, 'WEBP'), (640, 'PNG'),
+                                                         (700, 'WEBP'), (700, 'PNG')]
+    for r in renditions:
+        image = Image.open(io.BytesIO(r.data))
+        assert image.format == r.format and image.size == (r.width, r.height)
+    photo = assets.renditions(os.path.join(SRC, 'body.jpg'))
+    assert {r.format for r in photo} == {'WEBP', 'JPEG'}
+    assert max(len(r.data) for r in photo) < os.path.getsize(os.path.join(SRC, 'body.jpg'))
+
+def test_best_is_smallest_rendition_that_fits(tmp_path):
+    assets = ImageAssets(static_dir=str(tmp_path / 'static'))
+    path = _chart(tmp_path)
+    assert assets.best(path, 300).width == 320
+    assert assets.best(path, 500).width == 640
+    assert assets.best(path, 2000).width == 700  # Nunca por encima del original
+    assert assets.best(path, 500, formats=('WEBP',)).format == 'WEBP'
+
+def test_cache_is_keyed_by_content(tmp_path):
+    assets = ImageAssets(static_dir=str(tmp_path / 'static'))
+    path = _chart(tmp_path)
+    shutil.copy(path, tmp_path / 'copy.png')
+    first = assets.renditions(path)
+    assert assets.renditions(str(tmp_path / 'copy.png')) is first
+    assert assets.stats()['builds'] == 1
+    _chart(tmp_path, color=(30, 30, 200, 255))
+    os.utime(path, ns=(0, 0))  # Mismo tamaño: el cambio se detecta por mtime
+    assert assets.renditions(path) is not first
+    assert assets.stats()['builds'] == 2
+
+def test_picture_html_serves_static_webp(tmp_path):
+    static = tmp_path / 'static'
+    assets = ImageAssets(static_dir=str(static))
+    path = _chart(tmp_path)
+    markup = assets.picture_html(path, 500, caption="Men <Smoke> More")
+    names = sorted(os.listdir(static))
+    assert len(names) == 6 and all(name.split('-')[0] == names[0].split('-')[0] for name in names)
+    assert "type='image/webp'" in markup and ' 320w' in markup and ' 700w' in markup
+    assert f"app/static/renditions/{assets.best(path, 500).name}?v=" in markup
+    assert "Men &lt;Smoke&gt; More" in markup
+
+def test_streamlit_sends_renditions_unchanged(tmp_path):
+    from streamlit.elements.image import _ensure_image_size_and_format
+    assets = ImageAssets(static_dir=str(tmp_path / 'static'))
+    for path in (_chart(tmp_path), os.path.join(SRC, 'body.jpg')):
+        rendition = assets.best(path, 560)
+        assert _ensure_image_size_and_format(rendition.data, -1, rendition.format) is rendition.data
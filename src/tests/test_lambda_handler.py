@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import joblib
+import pytest
+import lambda_handler
+from tests.conftest import make_patients
+
+@pytest.fixture
+def lambda_env(trained_model, tmp_path, monkeypatch):
+    model, scaler = trained_model
+    joblib.dump(model, tmp_path / 'random_forest_model_Default.pkl')
+    joblib.dump(scaler, tmp_path / 'scaler.pkl')
+    monkeypatch.setenv('MODEL_BASE_PATH', str(tmp_path))
+    monkeypatch.setenv('SAVE_PREDICTIONS', '0')
+    lambda_handler._state.clear()
+    yield
+    lambda_handler._state.clear()
+
+def _features(n=1):
+    return make_patients(n).to_dict(orient='records')
+
+def test_cold_then_warm_invocation(lambda_env):
+    first = lambda_handler.handler({'features': _features()[0]})
+    assert first['statusCode'] == 200
+    body = json.loads(first['body'])
+    assert body['cold_start'] is True
+    assert body['prediction'] in ('Smoker', 'Non-Smoker')
+
+    second = json.loads(lambda_handler.handler({'features': _features()[0]})['body'])
+    assert second['cold_start'] is False
+    assert lambda_handler._state['init_seconds'] > 0
+
+def test_api_gateway_body_and_instances(lambda_env):
+    event = {'body': json.dumps({'instances': _features(5)})}
+    body = json.loads(lambda_handler.handler(event)['body'])
+    assert len(body['predictions']) == len(body['probabilities']) == 5
+
+def test_invalid_event_returns_400_without_loading_model(lambda_env):
+    response = lambda_handler.handler({'instances': []})
+    assert response['statusCode'] == 400
+    response = lambda_handler.handler({'features': {'gender': 1}})
+    assert response['statusCode'] == 400
+    assert 'missing features' in json.loads(response['body'])['error']
+    assert lambda_handler._state == {}
+
+def test_handler_imports_stay_light():
+    code = "import sys, lambda_handler, data_utils, db_utils; print('streamlit' in sys.modules, 'pandas' in sys.modules)"
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(lambda_handler.__file__)).stdout.split()
+    assert out == ['False', 'False']
+
+def test_load_errors_outside_streamlit_raise_without_importing_it(tmp_path):
+    code = ("import sys, data_utils\n"
+            "try:\n"
+            f"    data_utils.load_model_and_scaler({str(tmp_path / 'model.pkl')!r}, {str(tmp_path / 'scaler.pkl')!r})\n"
+            "except RuntimeError as e:\n"
+            "    print('RuntimeError', 'streamlit' in sys.modules)\n")
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(lambda_handler.__file__)).stdout.split()
+    assert out == ['RuntimeError', 'False']
+
+def test_segment_store_uploads_one_segment_per_invocation(lambda_env, tmp_path, monkeypatch):
+    # Limitación conocida: sin buffer entre invocaciones, cada petición es un objeto pequeño en S3
+    from segment_store import SegmentStore
+    from tests.conftest import FakeS3Client
+    s3 = FakeS3Client()
+    monkeypatch.setenv('SAVE_PREDICTIONS', '1')
+    monkeypatch.setenv('PREDICTION_STORE', 'segments')
+    monkeypatch.setattr(SegmentStore, 'for_environment', classmethod(
+        lambda cls, is_aws, is_lambda: cls(str(tmp_path / 'lambda'), s3_client=s3, bucket='bucket',
+                                           background=False, restore=False)))
+    for _ in range(3):
+        assert lambda_handler.handler({'features': _features()[0]})['statusCode'] == 200
+    assert len(s3.objects) == 3
+    restored = SegmentStore(str(tmp_path / 'ec2'), s3_client=s3, bucket='bucket', background=False)
+    assert restored.sync_stats()['segments'] == 3 and len(restored.get_predictions()) == 3
+    restored.close()
+    lambda_handler._state['db'].close()
+
+def test_default_store_is_not_flushed_on_lambda(lambda_env, tmp_path, monkeypatch):
+    import db_utils
+    from tests.conftest import FakeS3Client
+    s3 = FakeS3Client()
+    monkeypatch.setenv('SAVE_PREDICTIONS', '1')
+    monkeypatch.setattr(db_utils, 'open_prediction_store', lambda is_aws, is_lambda: db_utils.DatabaseManager(
+        True, True, s3_client=s3, local_db_path=str(tmp_path / 'predictions.db')))
+    assert lambda_handler.handler({'features': _features()[0]})['statusCode'] == 200
+    db = lambda_handler._state['db']
+    assert lambda_handler._state['flush'] is False  # predictions.db en Lambda no sube nada a S3
+    assert len(db.get_predictions()) == 1 and 'upload_file' not in s3.calls
+    db.close()
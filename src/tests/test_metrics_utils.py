@@ -0,0 +1,62 @@
+import os
+import pstats
+import pytest
+import metrics_utils
+from metrics_utils import MetricsRegistry, profile_request
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics_utils, 'registry', registry)
+    return registry
+
+def test_timer_and_counters_render_prometheus(registry):
+    with metrics_utils.timer('model_predict'):
+        pass
+    metrics_utils.inc('s3_bytes', 1024, direction='upload')
+    metrics_utils.inc('s3_bytes', 512, direction='upload')
+    text = registry.render_prometheus()
+    assert '# TYPE smoking_s3_bytes_total counter' in text
+    assert 'smoking_s3_bytes_total{direction="upload"} 1536' in text
+    assert 'smoking_model_predict_seconds_bucket{le="+Inf"} 1' in text
+    assert 'smoking_model_predict_seconds_count 1' in text
+
+def test_timed_decorator_and_snapshot(registry):
+    @metrics_utils.timed('ensure_files')
+    def work(x):
+        return x * 2
+
+    assert work(21) == 42
+    metrics_utils.inc('predictions', source='form')
+    snapshot = registry.snapshot()
+    assert snapshot['timings']['ensure_files']['count'] == 1
+    assert snapshot['counters']['predictions'] == 1
+    assert snapshot['rates']['predictions'] > 0
+
+def test_disabled_registry_records_nothing(registry):
+    registry.enabled = False
+    with metrics_utils.timer('model_predict'):
+        pass
+    metrics_utils.inc('predictions')
+    snapshot = registry.snapshot()
+    assert snapshot['counters'] == {} and snapshot['timings'] == {}
+
+def test_instrumented_db_writes(registry, tmp_path):
+    from db_utils import DatabaseManager
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'm.db'))
+    db.save_prediction('M', 15.0, 'Smoker', False)
+    db.save_predictions_bulk([('F', 12.0, 'Non-Smoker')] * 3)
+    db.close()
+    snapshot = registry.snapshot()
+    assert snapshot['counters']['db_writes'] == 4
+    assert snapshot['timings']['save_prediction']['count'] == 1
+
+def test_profile_request_writes_pstats(registry, tmp_path):
+    with profile_request('form', sample_rate=1.0, profile_dir=str(tmp_path)) as profiler:
+        sum(range(1000))
+    assert profiler is not None
+    [name] = os.listdir(tmp_path)
+    assert name.startswith('form-') and pstats.Stats(str(tmp_path / name))
+    with profile_request('form', sample_rate=0.0, profile_dir=str(tmp_path)) as profiler:
+        pass
+    assert profiler is None
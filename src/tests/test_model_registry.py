@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+import time
+import joblib
+import numpy as np
+import pytest
+from tests.conftest import make_patients
+from model_registry import ModelRegistry, ModelServer, ShadowScorer
+from train import file_sha256
+
+def _bundle(root, version, model, scaler):
+    """Bundle con el formato de train.py (modelo, scaler y bundle.json con los SHA-256)."""
+    path = os.path.join(root, version)
+    os.makedirs(path)
+    joblib.dump(model, os.path.join(path, 'random_forest_model_Default.pkl'))
+    joblib.dump(scaler, os.path.join(path, 'scaler.pkl'))
+    files = {name: file_sha256(os.path.join(path, name)) for name in ('random_forest_model_Default.pkl', 'scaler.pkl')}
+    with open(os.path.join(path, 'bundle.json'), 'w') as f:
+        json.dump({'version': version, 'files': files}, f)
+    return path
+
+class ConstantModel:
+    """Modelo que siempre predice `label`; `delay` simula un candidato lento."""
+    classes_ = np.array([0, 1])
+
+    def __init__(self, label, delay=0.0):
+        self.label = label
+        self.delay = delay
+
+    def predict(self, X):
+        time.sleep(self.delay)
+        return np.array([self.label] * len(X))
+
+    def predict_proba(self, X):
+        return np.eye(2)[self.predict(X)]
+
+class IdentityScaler:
+    def transform(self, X):
+        return np.asarray(X, dtype=float)
+
+@pytest.fixture
+def registry(tmp_path, trained_model):
+    model, scaler = trained_model
+    _bundle(tmp_path, 'v1', model, scaler)
+    _bundle(tmp_path, 'v2', ConstantModel(1), IdentityScaler())
+    return ModelRegistry(str(tmp_path))
+
+def test_pointer_and_versions(registry):
+    assert registry.list_versions() == ['v1', 'v2']
+    assert registry.read_pointer() == {}
+    registry.set_active('v1', shadow='v2')
+    assert registry.read_pointer()['active'] == 'v1'
+    assert registry.read_pointer()['shadow'] == 'v2'
+    with pytest.raises(ValueError):
+        registry.set_active('v3')
+
+def test_server_requires_active_version(registry):
+    with pytest.raises(RuntimeError):
+        ModelServer(registry).poll_once()
+
+def test_hot_swap_keeps_model_and_scaler_paired(registry):
+    registry.set_active('v1')
+    server = ModelServer(registry)
+    assert server.poll_once() is True
+    assert server.poll_once() is False
+    assert server.current.version == 'v1'
+
+    seen, stop = [], threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            handle = server.current
+            # Cada handle trae su propio scaler: nunca se mezclan versiones
+            seen.append((handle.version, type(handle.scaler).__name__))
+
+    threads = [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    registry.set_active('v2')
+    assert server.poll_once() is True
+    time.sleep(0.05)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    assert server.current.version == 'v2' and server.swaps == 2
+    assert set(seen) <= {('v1', 'StandardScaler'), ('v2', 'IdentityScaler')}
+    assert seen[-1][0] == 'v2'
+
+def test_corrupt_bundle_keeps_serving_previous_version(registry, tmp_path):
+    registry.set_active('v1')
+    server = ModelServer(registry, poll_interval=0.01).start()
+    try:
+        with open(tmp_path / 'v2' / 'scaler.pkl', 'ab') as f:
+            f.write(b'corrupt')
+        registry.set_active('v2')
+        deadline = time.monotonic() + 5
+        while not server.poll_errors and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert server.poll_errors >= 1
+        assert server.current.version == 'v1'
+    finally:
+        server.stop()
+
+def test_shadow_scoring_is_off_the_request_path(registry):
+    registry.set_active('v1', shadow='v2')
+    server = ModelServer(registry)
+    server.poll_once()
+    shadow = server.shadow
+    shadow.candidate.model.delay = 0.02  # candidato lento
+
+    rows = make_patients(20, seed=3)
+    start = time.perf_counter()
+    for i in range(len(rows)):
+        shadow.submit(rows.iloc[[i]], 'Non-Smoker')
+    assert time.perf_counter() - start < 0.02 * len(rows) / 2
+
+    shadow.drain()
+    stats = shadow.stats()
+    assert stats['version'] == 'v2'
+    assert stats['compared'] == 20 and stats['disagreements'] == 20
+    assert stats['disagreement_rate'] == 1.0
+
+    registry.set_active('v1')
+    server.poll_once()
+    assert server.shadow is None
+    server.stop()
+
+def test_shadow_drops_when_queue_is_full():
+    from model_registry import ModelHandle
+    shadow = ShadowScorer(ModelHandle('slow', ConstantModel(0, delay=0.2), IdentityScaler(), {}, ''), max_queue=2)
+    rows = make_patients(10)
+    for i in range(10):
+        shadow.submit(rows.iloc[[i]], 'Non-Smoker')
+    assert shadow.stats()['dropped'] >= 7
+    shadow.stop()
+
+def test_s3_registry(tmp_path, fake_s3, trained_model):
+    model, scaler = trained_model
+    bundle_dir = _bundle(tmp_path / 'build', 'v1', model, scaler)
+    registry = ModelRegistry('s3://models-bucket/smoking', s3_client=fake_s3, cache_dir=str(tmp_path / 'cache'))
+    assert registry.read_pointer() == {}
+    assert registry.publish(bundle_dir) == 'v1'
+    assert registry.list_versions() == ['v1']
+    registry.set_active('v1')
+
+    server = ModelServer(registry)
+    server.poll_once()
+    assert server.current.version == 'v1'
+    assert os.path.isfile(tmp_path / 'cache' / 'v1' / 'scaler.pkl')
+
+    downloads = fake_s3.calls.count('download_file')
+    registry.load('v1')
+    assert fake_s3.calls.count('download_file') == downloads  # sin cambios no se vuelve a descargar
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import Mock, patch
-from prediction import prediction
+from prediction import NUM_VARIABLES, prediction
 
 @patch('prediction.st.form_submit_button', return_value=True)  # Simula botón "Predict"
 @patch('prediction.st.success')  # Mock UI success
@@ -13,4 +13,33 @@ def test_prediction_function(mock_success, mock_submit, mock_model, mock_scaler)
         with patch('prediction.st.selectbox', side_effect=['M', 'Normal', 'Normal', 'Yes', 'Yes']):  # Mock selects
             prediction(mock_db, mock_model, mock_scaler, is_aws)
 
-    mock_success.assert_called_with("Prediction: **Smoker**")  # Verifica que se llama UI con 'Smoker'
\ No newline at end of file
+    mock_success.assert_called_with("Prediction: **Smoker**")  # Verifica que se llama UI con 'Smoker'
+
+@patch('prediction.st.form_submit_button', return_value=True)
+@patch('prediction.st.error')
+def test_prediction_rejects_out_of_range_input(mock_error, mock_submit, mock_model, mock_scaler):
+    mock_db = Mock()
+    with patch('prediction.st.slider', return_value=100.0):  # hemoglobina 100 fuera de rango
+        with patch('prediction.st.selectbox', side_effect=['M', 'Normal', 'Normal', 'Yes', 'Yes']):
+            prediction(mock_db, mock_model, mock_scaler, False)
+    assert 'hemoglobin must be between' in mock_error.call_args[0][0]
+    mock_model.predict_proba.assert_not_called()
+    mock_db.save_prediction.assert_not_called()
+
+@patch('prediction.st.form_submit_button', return_value=True)
+@patch('prediction.st.altair_chart')
+def test_prediction_shows_ranked_contributions(mock_chart, mock_submit, mock_model, mock_scaler):
+    import numpy as np
+    explainer = Mock(feature_names_in_=None)
+    contributions = np.zeros((1, len(NUM_VARIABLES)))
+    contributions[0, NUM_VARIABLES.index('Gtp')] = 0.2
+    contributions[0, NUM_VARIABLES.index('hemoglobin')] = -0.05
+    explainer.contributions.return_value = contributions
+    explainer.expected_value.return_value = 0.4
+    with patch('prediction.st.slider', side_effect=[100.0, 12.0, 170.0, 150.0, 90.0, 100.0, 50.0, 200.0, 20.0, 90.0, 120.0, 25.0, 80.0, 70.0, 30.0, 1.0, 1.0, 1.0, 1.0]):
+        with patch('prediction.st.selectbox', side_effect=['M', 'Normal', 'Normal', 'Yes', 'Yes']):
+            prediction(Mock(), mock_model, mock_scaler, False, columns=list(NUM_VARIABLES), explainer=explainer)
+    chart = mock_chart.call_args[0][0].to_dict()
+    values = next(iter(chart['datasets'].values()))
+    assert [v['feature'] for v in values[:2]] == ['Gtp', 'Hemoglobin']
+    assert [v['direction'] for v in values[:2]] == ['Towards Smoker', 'Towards Non-Smoker']
@@ -0,0 +1,55 @@
+import os
+import time
+import pytest
+from unittest.mock import Mock, patch
+from prediction import prediction
+from prediction_cache import PredictionCache
+
+def test_quantised_keys_share_entries():
+    cache = PredictionCache(step=0.01)
+    assert cache.make_key([12.001, 1]) == cache.make_key([11.999, 1.0])
+    assert cache.make_key([12.0, 1]) != cache.make_key([12.02, 1])
+
+def test_lru_eviction_and_hit_rate():
+    cache = PredictionCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'a' pasa a ser la más reciente
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 1 and stats['misses'] == 1
+    assert stats['hit_rate'] == 0.5
+
+def test_ttl_expiry():
+    cache = PredictionCache(ttl=0.01)
+    cache.put('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+def test_invalidated_when_model_file_changes(tmp_path):
+    model_path = tmp_path / 'model.pkl'
+    model_path.write_bytes(b'v1')
+    cache = PredictionCache(watch_paths=[str(model_path)])
+    cache.put('a', 1)
+    assert cache.get('a') == 1
+    model_path.write_bytes(b'version 2')
+    os.utime(model_path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    assert cache.get('a') is None
+    assert cache.stats()['invalidations'] == 1
+
+@patch('prediction.st.form_submit_button', return_value=True)
+@patch('prediction.st.success')
+def test_prediction_uses_cache_on_resubmit(mock_success, mock_submit, mock_model, mock_scaler):
+    cache = PredictionCache()
+    mock_db = Mock()
+    for _ in range(3):
+        # Cada slider devuelve su valor inicial (siempre dentro del rango válido)
+        with patch('prediction.st.slider', side_effect=lambda label, low, high, value, **kwargs: value):
+            with patch('prediction.st.selectbox', side_effect=['M', 'Normal', 'Normal', 'Yes', 'Yes']):
+                prediction(mock_db, mock_model, mock_scaler, False, cache=cache)
+    assert mock_model.predict_proba.call_count == 1
+    assert mock_db.save_prediction.call_count == 3  # Cada envío se sigue registrando
+    assert cache.stats()['hits'] == 2
+    mock_success.assert_called_with("Prediction: **Smoker**")
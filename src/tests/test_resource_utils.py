@@ -0,0 +1,43 @@
+import pytest
+from unittest.mock import Mock, patch
+import resource_utils
+from resource_utils import ResourceCache
+
+def test_resource_cache_loads_once():
+    cache = ResourceCache()
+    loader = Mock(return_value='model')
+    assert cache.get(('model', 'a'), loader) == 'model'
+    assert cache.get(('model', 'a'), loader) == 'model'
+    assert loader.call_count == 1
+    stats = cache.get_stats()['model']
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+    assert stats['loads'] == 1
+
+def test_resource_cache_invalidate_calls_on_evict():
+    cache = ResourceCache()
+    db = Mock()
+    cache.get(('database', False, False), lambda: db, on_evict=lambda d: d.close())
+    cache.get(('model', 'a'), lambda: 'model')
+    assert cache.invalidate('database') == 1
+    db.close.assert_called_once()
+    # El modelo sigue en caché
+    loader = Mock(return_value='other')
+    assert cache.get(('model', 'a'), loader) == 'model'
+    loader.assert_not_called()
+
+def test_resource_cache_does_not_store_failed_loads():
+    cache = ResourceCache()
+    loader = Mock(side_effect=[None, 'model'])
+    assert cache.get(('model', 'a'), loader) is None
+    assert cache.get(('model', 'a'), loader) == 'model'
+
+@patch('resource_utils.load_model_and_scaler')
+def test_get_model_and_scaler_shared_between_calls(mock_load):
+    resource_utils.invalidate('model')
+    mock_load.return_value = (Mock(), Mock())
+    first = resource_utils.get_model_and_scaler('model.pkl', 'scaler.pkl')
+    second = resource_utils.get_model_and_scaler('model.pkl', 'scaler.pkl')
+    assert first == second
+    mock_load.assert_called_once_with('model.pkl', 'scaler.pkl')
+    resource_utils.invalidate('model')
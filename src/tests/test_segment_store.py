@@ -0,0 +1,179 @@
+import os
+from datetime import datetime, timezone
+import pytest
+from db_utils import COLUMNS, DatabaseManager
+from segment_store import SegmentStore
+from tests.conftest import FakeS3Client
+
+DAY = 86_400
+
+class Clock:
+    """Reloj manual: los ids (y por tanto días) de las filas dependen de él."""
+    def __init__(self, start=datetime(2024, 3, 1, 12, tzinfo=timezone.utc).timestamp()):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+def _store(path, **kwargs):
+    kwargs.setdefault('background', False)
+    return SegmentStore(str(path), **kwargs)
+
+def _segment_files(store):
+    return sorted(os.path.relpath(os.path.join(d, f), store.segments_dir)
+                  for d, _, files in os.walk(store.segments_dir) for f in files)
+
+def test_reads_cover_wal_and_segments_with_day_partitions(tmp_path):
+    clock = Clock()
+    store = _store(tmp_path, clock=clock)
+    store.save_prediction('M', 15.0, 'Smoker', False, probability=0.8)
+    store.save_predictions_bulk([('F', 12.0, 'Non-Smoker')] * 3)
+    clock.now += DAY
+    assert store.compact() == 4
+    store.save_predictions_bulk([('M', 14.0, 'Smoker')] * 2)
+    clock.now += DAY
+    store.save_prediction('F', 13.0, 'Non-Smoker', False)
+    store.compact()
+    store.save_prediction('M', 16.0, 'Smoker', False)  # Sigue en el WAL
+
+    assert {f.split(os.sep)[0] for f in _segment_files(store)} == {'day=2024-03-01', 'day=2024-03-02', 'day=2024-03-03'}
+    df = store.get_predictions()
+    assert list(df.columns) == list(COLUMNS)
+    assert len(df) == 8 and df['id'].is_monotonic_increasing
+    assert df['probability'].iloc[0] == 0.8
+    assert len(store.get_predictions(start='2024-03-02', end='2024-03-03')) == 2
+    assert len(store.get_predictions(gender='M', label='Smoker', start='2024-03-03')) == 1
+
+    rows, after_id = store.query_predictions(limit=3)
+    assert len(rows) == 3 and after_id == rows[-1]['id']
+    rest, _ = store.query_predictions(limit=10, after_id=after_id)
+    assert [r['id'] for r in rows + rest] == df['id'].tolist()
+    assert [len(page) for page in store.iter_predictions(batch_size=3)] == [3, 3, 2]
+    store.close()
+
+def test_rollup_matches_sqlite(tmp_path):
+    clock = Clock()
+    store = _store(tmp_path / 'segments', clock=clock)
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'predictions.db'))
+    rows = [('M', 15.0, 'Smoker'), ('F', 12.5, 'Non-Smoker'), ('F', 13.5, 'Smoker'), ('M', 16.0, 'Non-Smoker')] * 5
+    store.save_predictions_bulk(rows)
+    db.save_predictions_bulk(rows)
+    store.compact()
+    store.save_predictions_bulk(rows[:3])
+    db.save_predictions_bulk(rows[:3])
+
+    ours, theirs = store.hemoglobin_stats_by_gender(), db.hemoglobin_stats_by_gender()
+    assert list(ours.columns) == list(theirs.columns)
+    assert ours['gender'].tolist() == theirs['gender'].tolist()
+    assert ours.drop(columns='gender').to_numpy().tolist() == [pytest.approx(r) for r in theirs.drop(columns='gender').to_numpy().tolist()]
+    ours, theirs = store.daily_label_counts(), db.daily_label_counts()  # Días distintos: reloj manual
+    assert list(ours.columns) == list(theirs.columns)
+    assert ours[['prediction', 'count']].values.tolist() == theirs[['prediction', 'count']].values.tolist()
+    assert store.get_rollup()['count'].sum() == len(rows) + 3
+    version = store.rollup_version()
+    store.save_prediction('M', 15.0, 'Smoker', False)
+    assert store.rollup_version() > version
+    store.close()
+    db.close()
+
+def test_only_new_segments_are_uploaded_and_restored(tmp_path):
+    s3 = FakeS3Client()
+    clock = Clock()
+    store = _store(tmp_path / 'a', s3_client=s3, bucket='bucket', prefix='preds', clock=clock)
+    store.save_predictions_bulk([('M', 15.0, 'Smoker')] * 10)
+    store.flush()
+    first = set(s3.objects)
+    assert len(first) == 1 and store.sync_stats()['pending_uploads'] == 0
+    clock.now += DAY
+    store.save_predictions_bulk([('F', 12.0, 'Non-Smoker')] * 10)
+    store.flush()
+    assert len(s3.objects) == 2 and first < set(s3.objects)
+    assert s3.calls.count('upload_file') == 2  # Nada se vuelve a subir
+    store.close()
+    assert s3.calls.count('upload_file') == 2
+
+    other = _store(tmp_path / 'b', s3_client=s3, bucket='bucket', prefix='preds', clock=clock)
+    assert len(other.get_predictions()) == 20
+    assert other.sync_stats()['pending_uploads'] == 0
+    other.save_prediction('F', 13.0, 'Smoker', False)
+    other.close()
+    assert s3.calls.count('upload_file') == 3
+
+def test_compaction_triggers_on_max_rows(tmp_path):
+    store = _store(tmp_path, max_rows=10)
+    store.save_predictions_bulk([('M', 15.0, 'Smoker')] * 12)
+    assert store.sync_stats()['wal_rows'] == 0 and store.sync_stats()['segments'] == 1
+    store.close()
+
+def test_background_compaction(tmp_path):
+    import time
+    store = _store(tmp_path, background=True, max_delay=0.05)
+    store.save_prediction('M', 15.0, 'Smoker', False)
+    deadline = time.monotonic() + 5
+    while store.sync_stats()['segments'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.sync_stats()['segments'] == 1
+    store.close()
+
+def test_recovers_wal_and_interrupted_compaction(tmp_path):
+    store = _store(tmp_path)
+    store.save_predictions_bulk([('M', 15.0, 'Smoker')] * 3)
+    store._wal.close()  # Simula una caída sin close(): el cerrojo del escritor queda libre
+    os.close(store._writer_fd)
+    os.replace(store.wal_path, store.sealed_path)  # ... a mitad de una compactación
+    with open(store.wal_path, 'w') as f:
+        f.write('[1, "F", 12.0, "Non-Smoker", "2024-03-01 12:00:00"')  # Línea truncada
+
+    reopened = _store(tmp_path)
+    assert len(reopened.get_predictions()) == 3
+    assert reopened.sync_stats()['segments'] == 1
+    assert not os.path.exists(store.sealed_path) and not os.path.exists(store.wal_path)
+    reopened.save_prediction('F', 12.0, 'Non-Smoker', False)
+    reopened.close()
+    assert len(_store(tmp_path).get_predictions()) == 4
+
+def test_replicas_sharing_root_keep_their_own_wal(tmp_path):
+    s3 = FakeS3Client()
+    first = _store(tmp_path, s3_client=s3, bucket='bucket', prefix='preds')
+    second = _store(tmp_path, s3_client=s3, bucket='bucket', prefix='preds')
+    assert first.wal_path != second.wal_path
+    first.save_predictions_bulk([('M', 15.0, 'Smoker')] * 3)
+    second.save_predictions_bulk([('F', 12.0, 'Non-Smoker')] * 2)
+    first.compact()
+    assert len(second.get_predictions()) == 5  # Segmentos de `first` y su propio WAL
+    second.close()
+    assert len(first.get_predictions()) == 5
+
+    first.save_prediction('M', 14.0, 'Smoker', False)
+    third = _store(tmp_path, s3_client=s3, bucket='bucket', prefix='preds')
+    assert len(third.get_predictions()) == 5  # El WAL de `first` sigue siendo suyo: no se hereda
+    first.close()
+    assert len(third.get_predictions()) == 6
+    third.close()
+    assert s3.calls.count('upload_file') == len(s3.objects) == 3  # Cada segmento lo sube solo quien lo escribió
+    assert os.listdir(os.path.join(tmp_path, 'writers')) == []
+
+def test_writers_sharing_a_prefix_never_collide(tmp_path):
+    s3 = FakeS3Client()
+    clock = Clock()  # Mismo instante en los dos escritores; en el mismo root sus slots no se repiten
+    stores = [_store(tmp_path / 'a', s3_client=s3, bucket='bucket', prefix='preds', clock=clock) for _ in range(2)]
+    for store in stores:
+        store.save_predictions_bulk([('M', 15.0, 'Smoker')] * 3)
+        store.flush()
+    assert len(s3.objects) == 2  # Ninguna subida pisa la del otro escritor
+    assert stores[0].slot != stores[1].slot
+    other = _store(tmp_path / 'c', s3_client=s3, bucket='bucket', prefix='preds', clock=clock)
+    ids = other.get_predictions()['id'].tolist()
+    assert len(ids) == 6 and len(set(ids)) == 6
+    for store in stores + [other]:
+        store.close()
+
+def test_export(tmp_path):
+    import pandas as pd
+    store = _store(tmp_path / 'store')
+    store.save_predictions_bulk([('M', 15.0, 'Smoker')] * 5)
+    store.compact()
+    store.save_prediction('F', 12.0, 'Non-Smoker', False)
+    assert store.export_predictions(str(tmp_path / 'out.parquet'), batch_size=2) == 6
+    assert pd.read_parquet(tmp_path / 'out.parquet')['gender'].tolist() == ['M'] * 5 + ['F']
+    store.close()
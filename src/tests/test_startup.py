@@ -0,0 +1,58 @@
+import os
+import shutil
+import joblib
+import pytest
+import resource_utils
+from data_utils import get_file_paths
+from feature_schema import NUM_VARIABLES, default_features, encode_features, validate_instances
+from forest_engine import compile_model
+from prediction_cache import PredictionCache
+from startup import Startup, synthetic_batch, warm_up
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_synthetic_batch_starts_with_form_defaults_and_validates():
+    batch = synthetic_batch(100)
+    assert batch.iloc[0].to_dict() == pytest.approx(default_features())
+    assert validate_instances(batch[NUM_VARIABLES].to_dict(orient='records')).shape == (100, len(NUM_VARIABLES))
+
+def test_warm_up_precomputes_the_default_form_row(trained_model):
+    model, scaler = trained_model
+    compiled, identity = compile_model(model, scaler)
+    cache = PredictionCache()
+    assert warm_up(compiled, identity, list(NUM_VARIABLES), explainer=compiled, cache=cache, rows=32) == 32
+    X, _ = encode_features({name: [value] for name, value in default_features().items()}, NUM_VARIABLES)
+    label, probability = cache.get_or_compute(X[0].tolist(), lambda: pytest.fail("default row was not cached"))
+    assert label in ('Smoker', 'Non-Smoker') and 0.0 <= probability <= 1.0
+
+def test_stage_timings_and_readiness():
+    startup = Startup()
+    with startup.stage('model'):
+        pass
+    with pytest.raises(RuntimeError):
+        with startup.stage('database'):
+            raise RuntimeError("S3 unavailable")
+    assert list(startup.timings) == ['model', 'database'] and not startup.ready
+    assert startup.mark_ready().report()['ready']
+
+def test_app_startup_primes_shared_resources(tmp_path, monkeypatch, trained_model):
+    monkeypatch.chdir(tmp_path)  # predictions.db local
+    paths = get_file_paths(str(tmp_path))
+    joblib.dump(trained_model[0], paths['model'])
+    joblib.dump(trained_model[1], paths['scaler'])
+    for key in resource_utils.IMAGE_KEYS:
+        shutil.copy(os.path.join(SRC, os.path.basename(paths[key])), paths[key])
+    resource_utils.invalidate()
+    try:
+        startup = resource_utils.get_startup(str(tmp_path), False, False)
+        assert startup.ready and list(startup.timings) == ['assets', 'model', 'warm_up', 'database']
+        assert resource_utils.get_startup(str(tmp_path), False, False) is startup
+        # Todo lo que necesita el primer rerun de app.main ya está en la caché
+        loads = resource_utils.get_stats()
+        resource_utils.get_model_and_scaler(paths['model'], paths['scaler'])
+        resource_utils.get_database(False, False)
+        assert resource_utils.get_prediction_cache(paths['model'], paths['scaler']).stats()['size'] == 1
+        assert resource_utils.get_stats()['model']['loads'] == loads['model']['loads']
+        assert resource_utils.get_stats()['database']['loads'] == loads['database']['loads']
+    finally:
+        resource_utils.invalidate()
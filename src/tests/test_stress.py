@@ -1,18 +1,49 @@
+import json
 import pytest
-from prediction import prediction
-from unittest.mock import Mock, patch
-import time
+from benchmarks import suite
+from benchmarks.load_generator import run_load, scoring_target
+from db_utils import DatabaseManager
+from prediction_cache import PredictionCache
 
-def test_stress_prediction(mock_model, mock_scaler):
-    mock_db = Mock()
-    is_aws = False
+def test_quick_suite_measures_every_case():
+    document = suite.run_suite(quick=True)
+    assert set(document['results']) == set(suite.CASES)
+    for name, result in document['results'].items():
+        assert result['value'] > 0, name
+        assert result['samples'] >= 1
+    assert document['results']['get_predictions']['params']['rows'] == 20_000
+    assert document['meta']['quick'] is True
+    json.dumps(document)
 
-    start_time = time.time()
-    for i in range(10):  # 10 predicciones rápidas
-        with patch('streamlit.form_submit_button', return_value=True):
-            with patch('streamlit.selectbox', return_value="M"):
-                with patch('streamlit.slider', return_value=100.0):
-                    prediction(mock_db, mock_model, mock_scaler, is_aws)
-    end_time = time.time()
-    assert end_time - start_time < 5  # Debe tomar menos de 5 seg
-    assert mock_db.save_prediction.call_count == 10  # 10 saves
\ No newline at end of file
+def test_compare_flags_regressions_in_both_directions():
+    base = {'results': {
+        'predict_single': {'value': 1.0, 'unit': 's', 'higher_is_better': False},
+        'save_prediction': {'value': 1000.0, 'unit': 'rows/s', 'higher_is_better': True},
+    }}
+    head = {'results': {
+        'predict_single': {'value': 1.05, 'unit': 's', 'higher_is_better': False},
+        'save_prediction': {'value': 800.0, 'unit': 'rows/s', 'higher_is_better': True},
+        'new_case': {'value': 1.0, 'unit': 's', 'higher_is_better': False},
+    }}
+    rows = {r['case']: r for r in suite.compare(base, head, threshold=0.10)}
+    assert set(rows) == {'predict_single', 'save_prediction'}
+    assert not rows['predict_single']['regression']
+    assert rows['save_prediction']['regression']
+
+def test_unknown_case_is_rejected():
+    with pytest.raises(ValueError, match='Unknown benchmark cases'):
+        suite.run_suite(['nope'])
+
+def test_load_generator_drives_real_scoring_path(trained_model, tmp_path):
+    model, scaler = trained_model
+    db = DatabaseManager(False, False, local_db_path=str(tmp_path / 'load.db'))
+    cache = PredictionCache()
+    try:
+        target = scoring_target(model, scaler, db, cache=cache, distinct=10)
+        r = run_load(target, rps=50, duration=1.0, users=4)
+        assert r['requests'] == 50
+        assert r['errors'] == 0
+        assert len(db.get_predictions()) == 50
+        assert cache.stats()['hits'] > 0
+    finally:
+        db.close()
@@ -0,0 +1,89 @@
+import pytest
+import time
+from sync_utils import S3SyncWorker
+from db_utils import DatabaseManager
+
+def _snapshot(content):
+    def snapshot(dest_path):
+        with open(dest_path, 'wb') as f:
+            f.write(content)
+    return snapshot
+
+def test_sync_worker_flushes_on_size_threshold(fake_s3):
+    worker = S3SyncWorker(_snapshot(b'db'), fake_s3, 'bucket', 'key', max_pending=3, max_delay=60)
+    worker.mark_dirty()
+    worker.mark_dirty()
+    assert worker.stats()['queue_depth'] == 2
+    worker.mark_dirty()
+    deadline = time.time() + 2
+    while worker.stats()['uploads'] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert fake_s3.objects[('bucket', 'key')] == b'db'
+    assert worker.stats()['queue_depth'] == 0
+    worker.stop()
+    assert fake_s3.calls.count('upload_file') == 1  # Nada pendiente al parar
+
+def test_sync_worker_flushes_on_time_threshold(fake_s3):
+    worker = S3SyncWorker(_snapshot(b'db'), fake_s3, 'bucket', 'key', max_pending=100, max_delay=0.05)
+    worker.mark_dirty()
+    time.sleep(0.3)
+    assert worker.stats()['uploads'] == 1
+    worker.stop()
+
+def test_sync_worker_keeps_pending_on_failure(fake_s3):
+    def failing(dest_path):
+        raise IOError("disk error")
+    worker = S3SyncWorker(failing, fake_s3, 'bucket', 'key', max_pending=100, max_delay=60)
+    worker.mark_dirty(5)
+    assert worker.flush() is False
+    stats = worker.stats()
+    assert stats['queue_depth'] == 5
+    assert stats['failures'] == 1
+    assert stats['sync_lag_seconds'] >= 0
+    worker.stop(flush=False)
+
+def test_forced_flush_failure_keeps_writes_made_during_the_upload(fake_s3):
+    def failing_upload(dest_path):
+        worker.mark_dirty()  # Una sesión escribe mientras se sube
+        raise IOError("S3 unavailable")
+    worker = S3SyncWorker(_snapshot(b'db'), fake_s3, 'bucket', 'key', max_pending=100, max_delay=60,
+                          upload_fn=failing_upload)
+    assert worker.flush(force=True) is False
+    stats = worker.stats()
+    assert stats['failures'] == 1 and stats['queue_depth'] == 1
+    assert 0 <= stats['sync_lag_seconds'] < 60
+    worker.stop(flush=False)
+
+def test_database_manager_batches_uploads(tmp_path, fake_s3):
+    db = DatabaseManager(True, False, s3_client=fake_s3, local_db_path=str(tmp_path / 'predictions.db'),
+                         sync_max_pending=1000, sync_max_delay=60)
+    uploads_after_init = fake_s3.calls.count('upload_file')
+    for _ in range(20):
+        db.save_prediction('M', 15.0, 'Smoker', True)
+    assert fake_s3.calls.count('upload_file') == uploads_after_init
+    assert db.sync_stats()['queue_depth'] == 20
+    db.close()
+    assert fake_s3.calls.count('upload_file') == uploads_after_init + 1
+    # La copia subida contiene todas las filas
+    restored = tmp_path / 'restored.db'
+    fake_s3.download_file('smoking-body-signals-data-dev', 'src/predictions.db', str(restored))
+    other = DatabaseManager(False, False, local_db_path=str(restored))
+    assert len(other.get_predictions()) == 20
+
+def test_sync_worker_backs_off_while_s3_fails():
+    class FailingS3:
+        attempts = 0
+        def upload_file(self, *args, **kwargs):
+            FailingS3.attempts += 1
+            raise IOError("S3 unavailable")
+    worker = S3SyncWorker(_snapshot(b'db'), FailingS3(), 'bucket', 'key', max_pending=100, max_delay=0.1)
+    worker.mark_dirty()
+    deadline = time.time() + 1.0
+    while time.time() < deadline:
+        worker.mark_dirty()  # Las escrituras nuevas no acortan la espera
+        time.sleep(0.01)
+    worker.stop(flush=False)
+    # 0.1 s hasta el primer intento y después esperas de 0.1, 0.2, 0.4... s
+    assert 2 <= FailingS3.attempts <= 5
+    assert worker.stats()['failures'] == FailingS3.attempts
+    assert worker.stats()['queue_depth'] > 0
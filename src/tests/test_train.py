@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import train
+from feature_schema import NUM_VARIABLES
+
+def _raw_csv(path, n=400, seed=0):
+    """smoking.csv sintético con el esquema de Kaggle: ID, oral, gender F/M, tartar Y/N."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'ID': np.arange(n), 'gender': rng.choice(['F', 'M'], n), 'age': rng.integers(20, 80, n),
+        'height(cm)': rng.integers(150, 185, n), 'weight(kg)': rng.integers(45, 110, n),
+        'waist(cm)': rng.uniform(60, 110, n).round(1), 'eyesight(left)': rng.uniform(0.5, 1.5, n).round(1),
+        'eyesight(right)': rng.uniform(0.5, 1.5, n).round(1), 'hearing(left)': rng.integers(1, 3, n),
+        'hearing(right)': rng.integers(1, 3, n), 'systolic': rng.integers(95, 160, n),
+        'relaxation': rng.integers(60, 100, n), 'fasting blood sugar': rng.integers(70, 140, n),
+        'Cholesterol': rng.integers(120, 300, n), 'triglyceride': rng.integers(50, 300, n),
+        'HDL': rng.integers(35, 90, n), 'LDL': rng.integers(60, 180, n), 'hemoglobin': rng.uniform(11, 18, n).round(1),
+        'Urine protein': rng.integers(1, 3, n), 'serum creatinine': rng.uniform(0.6, 1.3, n).round(1),
+        'AST': rng.integers(15, 60, n), 'ALT': rng.integers(10, 80, n), 'Gtp': rng.integers(10, 120, n),
+        'oral': 'Y', 'dental caries': rng.integers(0, 2, n), 'tartar': rng.choice(['N', 'Y'], n),
+    })
+    df['smoking'] = ((df['gender'] == 'M') & (df['hemoglobin'] > 14.5) | (df['Gtp'] > 90)).astype(int)
+    df.loc[0, 'Gtp'] = 900  # outlier del notebook (Gtp < 700)
+    df = pd.concat([df, df.iloc[:5]])  # duplicados
+    df.to_csv(path, index=False)
+
+@pytest.fixture
+def dirs(tmp_path):
+    raw = tmp_path / 'raw' / 'smoking.csv'
+    raw.parent.mkdir()
+    _raw_csv(raw)
+    return {'raw_path': str(raw), 'interim_dir': str(tmp_path / 'interim'),
+            'processed_dir': str(tmp_path / 'processed'), 'models_dir': str(tmp_path / 'models')}
+
+def test_clean_matches_notebook_rules(dirs):
+    df = train.clean(train.load_raw(dirs['raw_path']))
+    assert list(df.columns) == ['smoking'] + NUM_VARIABLES
+    assert len(df) == 399  # 5 duplicados y el outlier de Gtp fuera
+    assert set(df['gender']) == {0, 1} and set(df['tartar']) == {0, 1}
+
+def test_pipeline_writes_versioned_bundle_and_skips_unchanged_stages(dirs):
+    grid = {'n_estimators': [10], 'max_depth': [4, None]}
+    first = train.run_pipeline(grid=grid, cv=2, **dirs)
+    assert first['stages'] == {'load': 'built', 'clean': 'built', 'train': 'built'}
+    bundle = train.read_bundle(first['bundle_dir'])
+    assert bundle['features'] == NUM_VARIABLES
+    assert set(bundle['params']) == {'n_estimators', 'max_depth'}
+    assert 0.5 < bundle['metrics']['accuracy'] <= 1.0
+    for name, digest in bundle['files'].items():
+        assert train.file_sha256(os.path.join(first['bundle_dir'], name)) == digest
+
+    from data_utils import get_file_paths, load_model_and_scaler
+    paths = get_file_paths(first['bundle_dir'])
+    model, scaler = load_model_and_scaler(paths['model'], paths['scaler'])
+    assert list(model.feature_names_in_) == NUM_VARIABLES
+    from calibration import load_calibration
+    calibration = load_calibration(paths['model'])
+    assert calibration.calibrated and calibration.threshold == 0.5 and 'calibration.json' in bundle['files']
+    assert len(calibration.table) == 19 and bundle['metrics']['brier_calibrated'] >= 0
+
+    again = train.run_pipeline(grid=grid, cv=2, **dirs)
+    assert again['stages'] == {'load': 'cached', 'clean': 'cached', 'train': 'cached'}
+    assert again['version'] == first['version']
+
+    _raw_csv(dirs['raw_path'], seed=1)
+    changed = train.run_pipeline(grid=grid, cv=2, **dirs)
+    assert changed['stages']['load'] == 'built' and changed['version'] != first['version']
@@ -0,0 +1,285 @@
+"""Pipeline de entrenamiento reproducible: de data/raw/smoking.csv a un bundle versionado en models/.
+
+Etapas (cada una se salta si su entrada no cambió desde la última ejecución):
+    load    lee el CSV con tipos explícitos     -> data/interim/smoking.parquet
+    clean   duplicados, ID/oral, codificación y filtros de outliers del notebook
+                                                 -> data/processed/total_data_c2.parquet
+    train   split 80/20 (random_state=42), StandardScaler, GridSearchCV en paralelo
+            sobre RandomForestClassifier         -> models/<versión>/
+
+El bundle contiene random_forest_model_Default.pkl y scaler.pkl (se puede usar
+directamente como MODEL_BASE_PATH), calibration.json (curva isotónica ajustada con las
+probabilidades out-of-bag, umbral y tabla de umbrales evaluada en test; ver calibration.py)
+y bundle.json con el orden de variables, métricas, hiperparámetros y el SHA-256 de cada fichero.
+
+Uso (desde src/):
+    python train.py                       # grid por defecto, todos los núcleos
+    python train.py --no-search           # RandomForestClassifier(random_state=42) como el notebook
+    python train.py --export-to .         # copia además los .pkl y calibration.json para app.py
+    python train.py --threshold f1        # umbral de mayor F1 (out-of-bag) en lugar de 0.5
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+import pandas as pd
+from feature_schema import NUM_VARIABLES
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_PATH = os.path.join(REPO_ROOT, 'data', 'raw', 'smoking.csv')
+INTERIM_DIR = os.path.join(REPO_ROOT, 'data', 'interim')
+PROCESSED_DIR = os.path.join(REPO_ROOT, 'data', 'processed')
+MODELS_DIR = os.path.join(REPO_ROOT, 'models')
+
+# Se incrementa al cambiar la lógica de una etapa para invalidar su caché
+PIPELINE_VERSION = 2
+TARGET = 'smoking'
+RAW_DTYPES = {
+    'ID': 'int64', 'gender': 'category', 'age': 'int16', 'height(cm)': 'int16', 'weight(kg)': 'int16',
+    'waist(cm)': 'float32', 'eyesight(left)': 'float32', 'eyesight(right)': 'float32',
+    'hearing(left)': 'int8', 'hearing(right)': 'int8', 'systolic': 'int16', 'relaxation': 'int16',
+    'fasting blood sugar': 'int16', 'Cholesterol': 'int16', 'triglyceride': 'int16', 'HDL': 'int16',
+    'LDL': 'int16', 'hemoglobin': 'float32', 'Urine protein': 'int8', 'serum creatinine': 'float32',
+    'AST': 'int16', 'ALT': 'int16', 'Gtp': 'int16', 'oral': 'category', 'dental caries': 'int8',
+    'tartar': 'category', 'smoking': 'int8',
+}
+# Codificación fija, la misma que usa el formulario de prediction.py (el notebook usaba pd.factorize,
+# que depende del orden de aparición)
+ENCODINGS = {'gender': {'F': 0, 'M': 1}, 'tartar': {'N': 0, 'Y': 1}}
+# Filtros de outliers del notebook, en su orden: (columnas, límite inferior, límite superior).
+# 'iqr' es Q1 - 1.5 * IQR calculado sobre los datos ya filtrados por los pasos anteriores;
+# las columnas de un mismo paso se filtran a la vez, como en el notebook
+OUTLIER_FILTERS = (
+    ('Gtp', None, ('<', 700)),
+    ('ALT', None, ('<', 1000)),
+    ('height(cm)', 145, ('<=', 185)),
+    ('triglyceride', 'iqr', ('<', 500)),
+    ('HDL', 'iqr', ('<', 200)),
+    ('fasting blood sugar', None, ('<', 400)),
+    ('serum creatinine', 'iqr', ('<', 4)),
+    ('systolic', 'iqr', ('<=', 200)),
+    (('eyesight(left)', 'eyesight(right)'), 'iqr', ('<=', 2.1)),
+    ('AST', 'iqr', ('<=', 400)),
+    ('LDL', 'iqr', ('<=', 200)),
+    ('Cholesterol', 70, ('<=', 350)),
+)
+DEFAULT_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [None, 20],
+    'min_samples_leaf': [1, 2],
+}
+BUNDLE_FILES = ('random_forest_model_Default.pkl', 'scaler.pkl', 'calibration.json')
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+def _read_meta(path):
+    try:
+        with open(path + '.meta.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def run_stage(name, output, key, build):
+    """Ejecuta `build(output)` salvo que `output` exista y se generase con la misma `key`."""
+    meta = _read_meta(output)
+    if meta is not None and meta.get('key') == key and os.path.exists(output):
+        logging.info(f"Stage {name}: up to date ({output})")
+        return 'cached'
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    tmp = output + '.tmp'
+    build(tmp)
+    os.replace(tmp, output)
+    with open(output + '.meta.json', 'w') as f:
+        json.dump({'key': key, 'sha256': file_sha256(output), 'seconds': time.perf_counter() - start}, f)
+    logging.info(f"Stage {name}: built {output} in {time.perf_counter() - start:.1f}s")
+    return 'built'
+
+def load_raw(path):
+    df = pd.read_csv(path, dtype=RAW_DTYPES)
+    missing = [col for col in RAW_DTYPES if col not in df.columns]
+    if missing:
+        raise ValueError(f"{path} is missing columns: {missing}")
+    return df
+
+def clean(df):
+    """Limpieza del notebook: duplicados, ID/oral, codificación y filtros de outliers."""
+    df = df.drop_duplicates().reset_index(drop=True)
+    df = df.drop(columns=['ID', 'oral'])
+    for col, mapping in ENCODINGS.items():
+        encoded = df[col].astype(str).map(mapping)
+        if encoded.isna().any():
+            raise ValueError(f"Unexpected values in {col}: {sorted(df.loc[encoded.isna(), col].astype(str).unique())}")
+        df[col] = encoded.astype('int8')
+    for cols, lower, (op, upper) in OUTLIER_FILTERS:
+        mask = pd.Series(True, index=df.index)
+        for col in (cols if isinstance(cols, tuple) else (cols,)):
+            values = df[col]
+            mask &= values < upper if op == '<' else values <= upper
+            if lower == 'iqr':
+                q1, q3 = values.quantile(0.25), values.quantile(0.75)
+                mask &= values >= q1 - 1.5 * (q3 - q1)
+            elif lower is not None:
+                mask &= values >= lower
+        df = df[mask]
+    return df[[TARGET] + NUM_VARIABLES].reset_index(drop=True)
+
+def train_bundle(processed_path, bundle_dir, grid, n_jobs=-1, cv=3, threshold=0.5):
+    """Split, escalado, búsqueda de hiperparámetros, calibración y escritura del bundle en `bundle_dir`."""
+    import joblib
+    from calibration import fit_calibration, positive_proba, save_calibration
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, f1_score
+    from sklearn.model_selection import GridSearchCV, train_test_split
+    from sklearn.preprocessing import StandardScaler
+
+    df = pd.read_parquet(processed_path)
+    X, y = df[NUM_VARIABLES].astype('float64'), df[TARGET]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    scaler = StandardScaler().fit(X_train)
+    X_train_norm = pd.DataFrame(scaler.transform(X_train), columns=NUM_VARIABLES)
+    X_test_norm = pd.DataFrame(scaler.transform(X_test), columns=NUM_VARIABLES)
+
+    start = time.perf_counter()
+    # oob_score: probabilidades de cada fila de train con los árboles que no la vieron, para
+    # calibrar sin apartar datos ni entrenar bosques extra
+    if grid:
+        # Paralelismo en la búsqueda (un ajuste por núcleo); cada bosque entrena en un solo hilo
+        search = GridSearchCV(RandomForestClassifier(random_state=42, n_jobs=1, oob_score=True), grid, cv=cv,
+                              scoring='f1_macro', n_jobs=n_jobs)
+        search.fit(X_train_norm, y_train)
+        model, best_params, cv_score = search.best_estimator_, search.best_params_, float(search.best_score_)
+    else:
+        model = RandomForestClassifier(random_state=42, n_jobs=n_jobs, oob_score=True).fit(X_train_norm, y_train)
+        best_params, cv_score = {}, None
+    train_seconds = time.perf_counter() - start
+    model.n_jobs = None  # Al servir, una fila por llamada: sin pool de hilos
+
+    predicted_train, predicted_test = model.predict(X_train_norm), model.predict(X_test_norm)
+    oob_proba = model.oob_decision_function_[:, list(model.classes_).index(1)]
+    calibration = fit_calibration(oob_proba, y_train, positive_proba(model, X_test_norm), y_test, threshold=threshold)
+    metrics = {
+        'accuracy': float(accuracy_score(y_test, predicted_test)),
+        'f1_macro': float(f1_score(y_test, predicted_test, average='macro')),
+        'f1_macro_train': float(f1_score(y_train, predicted_train, average='macro')),
+        'cv_f1_macro': cv_score,
+        'train_rows': len(X_train),
+        'test_rows': len(X_test),
+        'train_seconds': train_seconds,
+        'brier_raw': calibration.info['brier_raw'],
+        'brier_calibrated': calibration.info['brier_calibrated'],
+        'threshold': calibration.threshold,
+    }
+
+    os.makedirs(bundle_dir, exist_ok=True)
+    joblib.dump(model, os.path.join(bundle_dir, 'random_forest_model_Default.pkl'))
+    joblib.dump(scaler, os.path.join(bundle_dir, 'scaler.pkl'))
+    save_calibration(calibration, os.path.join(bundle_dir, 'calibration.json'))
+    return model, best_params, metrics
+
+def run_pipeline(raw_path=RAW_PATH, interim_dir=INTERIM_DIR, processed_dir=PROCESSED_DIR, models_dir=MODELS_DIR,
+                 grid=None, n_jobs=-1, cv=3, threshold=0.5):
+    """Ejecuta las tres etapas y devuelve versión, ruta del bundle y estado de cada etapa."""
+    import sklearn
+    grid = DEFAULT_GRID if grid is None else grid
+    stages = {}
+
+    interim_path = os.path.join(interim_dir, 'smoking.parquet')
+    raw_key = fingerprint(PIPELINE_VERSION, RAW_DTYPES, file_sha256(raw_path))
+    stages['load'] = run_stage('load', interim_path, raw_key,
+                               lambda out: load_raw(raw_path).to_parquet(out, index=False))
+
+    processed_path = os.path.join(processed_dir, 'total_data_c2.parquet')
+    clean_key = fingerprint(PIPELINE_VERSION, ENCODINGS, OUTLIER_FILTERS, _read_meta(interim_path)['sha256'])
+    stages['clean'] = run_stage('clean', processed_path, clean_key,
+                                lambda out: clean(pd.read_parquet(interim_path)).to_parquet(out, index=False))
+
+    train_key = fingerprint(PIPELINE_VERSION, grid, cv, threshold, sklearn.__version__, _read_meta(processed_path)['sha256'])
+    existing = find_bundle(models_dir, train_key)
+    if existing is not None:
+        logging.info(f"Stage train: up to date ({existing['path']})")
+        stages['train'] = 'cached'
+        return {'version': existing['version'], 'bundle_dir': existing['path'], 'stages': stages}
+
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ') + '-' + train_key[:8]
+    bundle_dir = os.path.join(models_dir, version)
+    tmp_dir = bundle_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    _, best_params, metrics = train_bundle(processed_path, tmp_dir, grid, n_jobs=n_jobs, cv=cv, threshold=threshold)
+    bundle = {
+        'version': version,
+        'fingerprint': train_key,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'features': NUM_VARIABLES,
+        'target': TARGET,
+        'classes': {'0': 'Non-Smoker', '1': 'Smoker'},
+        'params': best_params,
+        'grid': grid,
+        'metrics': metrics,
+        'sklearn_version': sklearn.__version__,
+        'data_sha256': _read_meta(processed_path)['sha256'],
+        'files': {name: file_sha256(os.path.join(tmp_dir, name)) for name in BUNDLE_FILES},
+    }
+    with open(os.path.join(tmp_dir, 'bundle.json'), 'w') as f:
+        json.dump(bundle, f, indent=2)
+    os.replace(tmp_dir, bundle_dir)
+    stages['train'] = 'built'
+    logging.info(f"Model bundle {version}: accuracy {metrics['accuracy']:.4f}, f1 {metrics['f1_macro']:.4f}")
+    return {'version': version, 'bundle_dir': bundle_dir, 'stages': stages}
+
+def read_bundle(bundle_dir):
+    with open(os.path.join(bundle_dir, 'bundle.json')) as f:
+        return json.load(f)
+
+def find_bundle(models_dir, key):
+    """Bundle ya entrenado con el mismo fingerprint de datos, grid y versión de sklearn."""
+    if not os.path.isdir(models_dir):
+        return None
+    for name in sorted(os.listdir(models_dir), reverse=True):
+        path = os.path.join(models_dir, name)
+        if name.endswith('.tmp') or not os.path.isfile(os.path.join(path, 'bundle.json')):
+            continue
+        bundle = read_bundle(path)
+        if bundle.get('fingerprint') == key:
+            return {'version': bundle['version'], 'path': path}
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--raw', default=RAW_PATH, help='CSV original (smoking.csv)')
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    parser.add_argument('--grid', help='JSON con la rejilla de hiperparámetros de RandomForestClassifier')
+    parser.add_argument('--no-search', action='store_true', help='sin GridSearchCV: bosque por defecto')
+    parser.add_argument('--cv', type=int, default=3)
+    parser.add_argument('--n-jobs', type=int, default=-1, help='procesos de la búsqueda (-1 = todos los núcleos)')
+    parser.add_argument('--threshold', default='0.5', help="umbral de decisión guardado en el bundle, o 'f1'")
+    parser.add_argument('--export-to', help='directorio donde copiar los ficheros del bundle (modelo, scaler, calibración)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    grid = {} if args.no_search else (json.loads(args.grid) if args.grid else DEFAULT_GRID)
+    threshold = args.threshold if args.threshold == 'f1' else float(args.threshold)
+    result = run_pipeline(args.raw, models_dir=args.models_dir, grid=grid, n_jobs=args.n_jobs, cv=args.cv,
+                          threshold=threshold)
+    bundle = read_bundle(result['bundle_dir'])
+    if args.export_to:
+        for name in bundle['files']:
+            shutil.copyfile(os.path.join(result['bundle_dir'], name), os.path.join(args.export_to, name))
+    stages = ', '.join(f"{stage} {state}" for stage, state in result['stages'].items())
+    print(f"Bundle {result['version']} ({stages}): accuracy {bundle['metrics']['accuracy']:.4f}, "
+          f"f1_macro {bundle['metrics']['f1_macro']:.4f}, threshold {bundle['metrics']['threshold']:.2f}")
+
+if __name__ == '__main__':
+    main()
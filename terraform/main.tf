@@ -144,11 +144,11 @@ resource "aws_launch_template" "smoking_lt" {
     pip3 install -r requirements.txt --no-cache-dir >> "$LOG_FILE" 2>&1 || { echo "pip install failed"; exit 1; }
     export AWS_REGION=eu-central-1
     export AWS_DEFAULT_REGION=eu-central-1
-    nohup streamlit run app.py --server.port 8501 --server.address 0.0.0.0 --server.headless true --logger.level debug > /home/ubuntu/streamlit.log 2>&1 &
+    nohup python3 startup.py --server.port 8501 --server.address 0.0.0.0 --server.headless true --logger.level debug > /home/ubuntu/streamlit.log 2>&1 &
     sleep 5
-    if pgrep -f streamlit > /dev/null; then
+    if pgrep -f startup.py > /dev/null; then
       PUBLIC_IP=$(curl -s http://169.254.169.254/latest/meta-data/public-ipv4)
-      echo "Streamlit started at $(date) with PID $(pgrep -f streamlit) at http://$PUBLIC_IP:8501" >> "$LOG_FILE"
+      echo "Streamlit started at $(date) with PID $(pgrep -f startup.py) at http://$PUBLIC_IP:8501" >> "$LOG_FILE"
     else
       echo "Streamlit failed to start at $(date). Check logs." >> "$LOG_FILE"
       cat /home/ubuntu/streamlit.log >> "$LOG_FILE"